@@ -1,23 +1,41 @@
-import boto3
+import os
 import json
-from flask import Flask, render_template, redirect, url_for, request, flash, jsonify
+from flask import Flask, Response, render_template, redirect, url_for, request, flash, jsonify, stream_with_context
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
 import uuid
 import awsgi
 from flask_cors import CORS
 from flask.sessions import SessionInterface, SessionMixin
 import time
 import hashlib
+import hmac
+import logging
 
 from src.user_preferences_bp import user_preferences_bp  # Import the Blueprint from user_preferences
 from src.openai import recipe_blueprint  # Import the blueprint from gemini.py
 from src.openai import picture_blueprint
 from src.PushMealPreferencesFile_Tabled import food_preferences_bp  # Import the Blueprint from food_preferences
+from src.jobs import jobs_blueprint
+import src.jobs as jobs
+import src.aws_clients as aws_clients
+import src.tables as tables
+import src.session_cache as session_cache
+import src.openai_client as openai_client
+import src.meal_plan_cache as meal_plan_cache
+import src.image_cache as image_cache
+import src.fitbit as fitbit
+from src.password_policy import policy as password_policy
+import src.user_listing as user_listing
+import src.request_timing as request_timing
+import src.log_setup as log_setup
+import src.lifecycle as lifecycle
 
 
 
+log_setup.configure() #JSON logs written off the request thread
+
 app = Flask(__name__)
+logger = logging.getLogger(__name__)
 app.config['SECRET_KEY'] = 'your_secret_key' 
 CORS(app)
 
@@ -25,12 +43,18 @@ app.register_blueprint(user_preferences_bp) #reg bp for user preferences
 app.register_blueprint(recipe_blueprint) #register blueprint
 app.register_blueprint(picture_blueprint)
 app.register_blueprint(food_preferences_bp)
+app.register_blueprint(jobs_blueprint)
+request_timing.init_app(app) #Server-Timing header and per-request metrics
 
-dynamodb = boto3.resource('dynamodb', region_name='eu-west-1')  
-users_table = dynamodb.Table('Users')  
+#opt-in gzip/deflate/br for large text responses, e.g. meal plans, when the client accepts it
+RESPONSE_COMPRESSION = os.environ.get('RESPONSE_COMPRESSION', '0') == '1'
+compression = awsgi.Compression(
+    min_size=int(os.environ.get('RESPONSE_COMPRESSION_MIN_BYTES', 1024)),
+    on_compress=request_timing.record_compression,
+) if RESPONSE_COMPRESSION else None
 
-#table for user sessions 
-sessions_table = dynamodb.Table('UserSessions')
+def get_users_table():
+    return tables.get_table('Users', 'eu-west-1')
 
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -53,14 +77,14 @@ class User(UserMixin):
 @login_manager.user_loader
 def load_user(user_id):
     try:
-        response = users_table.get_item(Key={'username': user_id})
+        response = get_users_table().get_item(Key={'username': user_id})
         user_data = response.get('Item')
         if user_data:
             return User(user_data['username'], user_data['password'], user_data['id'])
         else:
             return None
     except Exception as e:
-        print(f"Error fetching user: {e}")
+        logger.error(f"Error fetching user: {e}")
         return None
 
 
@@ -71,6 +95,19 @@ def load_user(user_id):
 def home():
     return f'Hello, {current_user.username}! <a href="/logout">Logout</a>'
 
+# Replaces a hash made with an older policy, only if nobody changed it meanwhile
+def upgrade_password_hash(username, old_hash, new_hash):
+    try:
+        get_users_table().update_item(
+            Key={'username': username},
+            UpdateExpression="SET password = :new",
+            ConditionExpression="password = :old",
+            ExpressionAttributeValues={':new': new_hash, ':old': old_hash},
+        )
+    except Exception as e:
+        #the old hash still works, try again next login
+        logger.warning(f"Error upgrading password hash: {e}")
+
 @app.route('/login', methods=['POST'])
 def login():
     data = request.get_json()
@@ -78,10 +115,14 @@ def login():
     password = data['password']
 
     try:
-        response = users_table.get_item(Key={'username': username})
+        response = get_users_table().get_item(Key={'username': username})
         user_data = response.get('Item')
 
-        if user_data and check_password_hash(user_data['password'], password):
+        valid, upgraded_hash = (password_policy.verify_and_upgrade(user_data['password'], password)
+                                if user_data else (False, None))
+        if valid:
+            if upgraded_hash:
+                upgrade_password_hash(username, user_data['password'], upgraded_hash)
             user = User(user_data['username'], user_data['password'], user_data['id'])
             login_user(user)
 
@@ -94,7 +135,8 @@ def login():
                 'userId': user_data['username'],
                 'ttl': int(time.time()) + 3600
             }
-            sessions_table.put_item(Item=item)
+            session_cache.get_sessions_table().put_item(Item=item)
+            session_cache.remember_session(session_id, item['userId'], item['ttl'])
 
             return jsonify({'message': 'Login successful', 'session_id':session_id}), 200 
 
@@ -102,28 +144,31 @@ def login():
             return jsonify({'message': 'Invalid credentials'}), 401
 
     except Exception as e:
-        print(f"Error logging in user: {e}")
+        logger.error(f"Error logging in user: {e}")
         return jsonify({'message': 'Error occurred during login'}), 500
 
 
-@app.route('/logout')
+@app.route('/logout', methods=['GET', 'POST'])
 def logout():
     #end user session 
     logout_user()
     # Get session ID 
-    data = request.get_json()
-    session_id = data['sessionId']
+    data = request.get_json(silent=True) or {}
+    session_id = data.get('sessionId') or request.args.get('sessionId')
 
     if not session_id:
         return jsonify({'message': 'No session ID provided'}), 400
-        
-        # Remove the session from DynamoDB
-        sessions_table.delete_item(Key={'sessionId': session_id})
 
-    if session: 
-        finish_session(session.session_id)
+    # Remove the session from DynamoDB and from the warm session cache
+    try:
+        session_cache.get_sessions_table().delete_item(Key={'sessionId': session_id})
+    except Exception as e:
+        logger.error(f"Error removing session: {e}")
+        return jsonify({'message': 'Error occurred during logout'}), 500
+    finally:
+        session_cache.invalidate(session_id)
 
-    return redirect(url_for('login'))
+    return jsonify({'message': 'Logout successful'}), 200
 
 @app.route('/register', methods=['POST'])
 def register():
@@ -131,10 +176,10 @@ def register():
     username = data['username']
     password = data['password']
     name = data.get('name', '')
-    password_hash = generate_password_hash(password)
+    password_hash = password_policy.hash_password(password)
 
     try:
-        response = users_table.get_item(Key={'username': username})
+        response = get_users_table().get_item(Key={'username': username})
         if 'Item' in response:
             return jsonify({'message': 'User already exists'}), 400
         
@@ -148,13 +193,14 @@ def register():
                 'userId': username,
                 'ttl': int(time.time()) + 3600
             }
-        sessions_table.put_item(Item=item)
+        session_cache.get_sessions_table().put_item(Item=item)
+        session_cache.remember_session(session_id, username, item['ttl'])
 
 
         return jsonify({'message': 'Register successful', 'session_id':session_id}), 200
 
     except Exception as e:
-        print(f"Error registering user: {e}")
+        logger.error(f"Error registering user: {e}")
         return jsonify({'message': 'Error occurred during registration'}), 500
 
 
@@ -162,23 +208,114 @@ def register():
 @app.route('/users', methods=['GET'])
 def get_all_users():
     try:
-        response = users_table.scan()
+        users, cursor = user_listing.list_page(
+            get_users_table(), limit=request.args.get('limit', user_listing.USERS_PAGE_SIZE, type=int),
+            cursor=request.args.get('cursor'))
+        return jsonify({'users': users, 'cursor': cursor})
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error fetching users: {e}")
+        return jsonify({'error': 'Could not retrieve users'}), 500
 
-        if 'Items' in response:
-            return jsonify(response['Items']) 
 
-        else:
-            return jsonify({'message': 'No users found'}), 404
+def is_admin_request():
+    #no token configured means no admin access at all
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(user_listing.ADMIN_EXPORT_TOKEN) and hmac.compare_digest(token, user_listing.ADMIN_EXPORT_TOKEN)
+
+
+@app.route('/users/export', methods=['GET'])
+def export_users():
+    #admin only, streams one JSON object per line
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+
+    segments = request.args.get('segments', user_listing.EXPORT_SEGMENTS, type=int)
+    return Response(stream_with_context(user_listing.export_lines(get_users_table(), segments)),
+                    mimetype='application/x-ndjson')
 
+
+@app.route('/admin/password-policy/calibrate', methods=['POST'])
+def calibrate_password_policy():
+    #admin only, benchmarks scrypt on this function's hardware and records the cost for every container
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    try:
+        return jsonify(password_policy.calibrate())
     except Exception as e:
-        print(f"Error fetching users: {e}")
-        return jsonify({'error': 'Could not retrieve users'}), 500
+        logger.error(f"Error calibrating password policy: {e}")
+        return jsonify({'error': 'Could not calibrate the password policy'}), 500
+
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    #admin only, in-process counters for this container: cache hit rates and AWS call latency
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify({
+        'sessions': session_cache.stats(),
+        'openai_secret': openai_client.stats(),
+        'meal_plans': meal_plan_cache.stats(),
+        'image_analysis': image_cache.cache.stats(),
+        'fitbit': fitbit.client.stats(),
+        'password_policy': password_policy.stats(),
+        'aws_clients': aws_clients.stats(),
+        'logging': log_setup.stats(),
+        'lifecycle': lifecycle.stats(),
+    })
+
+
+#routes are all registered by now, build what the first request would otherwise pay for
+lifecycle.init_app(app)
 
-    
-    
 #handles incoming http requests from lambda   
 def lambda_handler(event, context):
-    return awsgi.response(app, event, context, base64_content_types={"image/png"})
+    #scheduled keep-warm pings never reach flask
+    if lifecycle.is_warmup_event(event):
+        return lifecycle.handle_warmup(event, context)
+    #async job invocations from src/jobs.py are not http requests
+    if jobs.is_job_event(event):
+        try:
+            return jobs.handle_job_event(event, app)
+        finally:
+            log_setup.flush(context=context)
+    request_timing.start(getattr(context, 'aws_request_id', None))
+    try:
+        response = awsgi.response(app, event, context, base64_content_types={"image/png"}, compression=compression)
+    except Exception:
+        request_timing.stop()
+        raise
+    finally:
+        # Lambda freezes the process once we return, write out queued logs while time is left
+        log_setup.flush(context=context)
+    return request_timing.finish(response)
+
+
+#same as lambda_handler for a response streaming function (url), the body goes out chunk by chunk.
+#The managed Python runtime never calls a handler like this, only Node.js streams natively. It needs a
+#custom runtime (provided.al2023) whose bootstrap posts the invocation response to the Runtime API with
+#"Lambda-Runtime-Function-Response-Mode: streaming" and passes that request body in as response_stream,
+#with the function URL's invoke mode set to RESPONSE_STREAM. response_stream needs write() and close().
+def lambda_stream_handler(event, response_stream, context):
+    #keep-warm pings and job events are not http requests, their result is the whole body
+    if lifecycle.is_warmup_event(event) or jobs.is_job_event(event):
+        try:
+            response_stream.write(json.dumps(lambda_handler(event, context)).encode())
+        finally:
+            response_stream.close()
+        return
+    request_timing.start(getattr(context, 'aws_request_id', None))
+    try:
+        awsgi.stream(app, event, context, response_stream)
+    except Exception:
+        request_timing.stop()
+        raise
+    finally:
+        log_setup.flush(context=context)
+    # headers are already sent, the timing only goes to the metrics
+    request_timing.finish(None)
 
 if __name__ == '__main__':
     app.run(debug=True)
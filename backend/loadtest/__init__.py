@@ -0,0 +1,7 @@
+# End-to-end load test for the Lambda entry point. API Gateway proxy events
+# for the app's real routes are fed through app.lambda_handler, with OpenAI,
+# Fitbit and DynamoDB swapped for local fakes that sleep like the real
+# services, so the numbers reflect our own handler path.
+#
+#   python -m loadtest --requests 500 --save-baseline loadtest/baseline.json
+#   python -m loadtest --requests 500 --baseline loadtest/baseline.json
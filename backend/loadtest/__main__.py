@@ -0,0 +1,53 @@
+import sys
+import json
+import argparse
+
+from loadtest import harness
+from loadtest.events import load_events, IMAGE_KB
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m loadtest', description='Load test app.lambda_handler')
+    parser.add_argument('--requests', type=int, default=200, help='generated events to send')
+    parser.add_argument('--users', type=int, default=20, help='seeded users the events are spread over')
+    parser.add_argument('--processes', type=int, default=0, help='worker processes, 0 runs in this process')
+    parser.add_argument('--latency-scale', type=float, default=None,
+                        help='multiplier on the fake services\' latency, 1 is production-like, 0 is none')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--image-kb', type=int, default=IMAGE_KB, help='size of each analyse-picture upload')
+    parser.add_argument('--payload-format', choices=['1.0', '2.0'], default='1.0',
+                        help='REST API (1.0) or HTTP API / Function URL (2.0) events')
+    parser.add_argument('--events', help='recorded gateway events (JSON list or one per line) instead of generated ones')
+    parser.add_argument('--output', help='write the report here')
+    parser.add_argument('--baseline', help='report to compare against, exits 1 on a regression')
+    parser.add_argument('--save-baseline', help='write the report here as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=harness.DEFAULT_TOLERANCE,
+                        help='allowed relative slowdown against the baseline')
+    args = parser.parse_args(argv)
+
+    events = load_events(args.events) if args.events else None
+    rv = harness.run(events=events, requests=args.requests, users=args.users, processes=args.processes,
+                     scale=args.latency_scale, seed=args.seed, image_kb=args.image_kb,
+                     payload_format=args.payload_format)
+    print(harness.format_report(rv))
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(rv, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = harness.compare(rv, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
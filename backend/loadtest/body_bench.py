@@ -0,0 +1,106 @@
+"""Peak memory and time per MB for awsgi on large bodies, such as an
+/analyse-picture upload. Each case sends one event with an N MB base64
+image through a small Flask app that parses it and echoes a body of the
+same size back. "copies" is the traced peak divided by the payload size,
+i.e. how many copies of the payload were alive at once.
+
+    python -m loadtest.body_bench --sizes 1 4 8
+"""
+import sys
+import json
+import time
+import base64
+import argparse
+import tracemalloc
+from loadtest import harness
+
+REPEATS = 5
+
+
+def _app():
+    from flask import Flask, request, jsonify
+
+    app = Flask('body_bench')
+
+    @app.route('/analyse-picture', methods=['POST'])
+    def analyse():
+        image = request.get_json()['image']
+        return jsonify({'image': image, 'length': len(image)})
+
+    return app
+
+
+def _event(size_mb, base64_body):
+    image = base64.b64encode(b'\xff' * (size_mb * 1024 * 1024 * 3 // 4)).decode()
+    body = json.dumps({'image': image})
+    if base64_body:
+        body = base64.b64encode(body.encode()).decode()
+    return {
+        'httpMethod': 'POST',
+        'path': '/analyse-picture',
+        'headers': {'Content-Type': 'application/json', 'Host': 'bench'},
+        'queryStringParameters': None,
+        'requestContext': {},
+        'body': body,
+        'isBase64Encoded': base64_body,
+    }
+
+
+def measure(awsgi, app, size_mb, base64_body=False, repeats=REPEATS):
+    event = _event(size_mb, base64_body)
+    payload = len(event['body'])
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        response = awsgi.response(app, event, None)
+        times.append(time.perf_counter() - start)
+        assert response['statusCode'] == '200', response['statusCode']
+        del response
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        response = awsgi.response(app, event, None)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+    del response
+
+    best = min(times)
+    return {
+        'size_mb': size_mb,
+        'base64_body': base64_body,
+        'ms_per_mb': round(best * 1000 / (payload / (1024 * 1024)), 2),
+        'peak_mb': round(peak / (1024 * 1024), 2),
+        'copies': round(peak / payload, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m loadtest.body_bench', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 4, 8], help='payload sizes in MB')
+    parser.add_argument('--repeats', type=int, default=REPEATS)
+    parser.add_argument('--output', help='write the results here as JSON')
+    args = parser.parse_args(argv)
+
+    harness._paths()
+    import awsgi
+    app = _app()
+    results = [measure(awsgi, app, size, base64_body, args.repeats)
+               for size in args.sizes for base64_body in (False, True)]
+
+    print(f"{'size':>6}{'base64':>8}{'ms/MB':>10}{'peak MB':>10}{'copies':>8}")
+    for r in results:
+        print(f"{r['size_mb']:>5}M{str(r['base64_body']):>8}{r['ms_per_mb']:>10}{r['peak_mb']:>10}{r['copies']:>8}")
+    print(f"peak RSS {harness.peak_rss_mb()}MB")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results, 'peak_rss_mb': harness.peak_rss_mb()}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
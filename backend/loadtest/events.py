@@ -0,0 +1,180 @@
+import os
+import json
+import uuid
+import base64
+import random
+from urllib.parse import urlencode
+
+# API Gateway (REST, proxy integration) events shaped like the ones the
+# mobile app produces, their HTTP API / Function URL (payload format 2.0)
+# equivalents, and loading of recorded events captured from the real gateway.
+
+GATEWAY_HOST = 'lazycook.execute-api.eu-west-1.amazonaws.com'
+STAGE = 'prod'
+# a phone photo, base64 encoded on the device
+IMAGE_KB = int(os.environ.get('LOADTEST_IMAGE_KB', 900))
+
+# relative share of each route in the generated mix
+ROUTE_WEIGHTS = {
+    'POST /login': 10,
+    'POST /add_food_preferences': 30,
+    'POST /add_food_preferences/batch': 10,
+    'POST /add_user_preferences': 5,
+    'POST /analyse-picture': 10,
+    'POST /generate-recipe': 20,
+    'GET /feedback': 5,
+}
+
+MEALS = [
+    ('Chicken Tikka Masala', 'Creamy spiced curry with basmati rice'),
+    ('Mushroom Risotto', 'Arborio rice slow cooked with porcini and parmesan'),
+    ('Beef Tacos', 'Soft tortillas with spiced mince, salsa and lime'),
+    ('Greek Salad', 'Tomato, cucumber, olives and feta'),
+    ('Pad Thai', 'Rice noodles with egg, peanuts and tamarind'),
+    ('Shakshuka', 'Eggs poached in a pepper and tomato sauce'),
+    ('Salmon Teriyaki', 'Glazed salmon with sticky rice and greens'),
+    ('Lentil Dahl', 'Red lentils with cumin, turmeric and coconut'),
+    ('Carbonara', 'Spaghetti with egg, pecorino and guanciale'),
+    ('Falafel Wrap', 'Chickpea fritters with tahini and pickles'),
+]
+
+
+def gateway_event(method, path, body=None, query=None, headers=None, source_ip='203.0.113.10'):
+    """One REST API proxy event, as API Gateway hands it to the Lambda"""
+    headers = {
+        'Accept': 'application/json',
+        'Accept-Encoding': 'gzip, deflate, br',
+        'Content-Type': 'application/json',
+        'Host': GATEWAY_HOST,
+        'User-Agent': 'LazyCook/1.4 CFNetwork/1492.0.1 Darwin/23.3.0',
+        'X-Amzn-Trace-Id': f'Root=1-{uuid.uuid4().hex[:8]}-{uuid.uuid4().hex[:24]}',
+        'X-Forwarded-For': source_ip,
+        'X-Forwarded-Port': '443',
+        'X-Forwarded-Proto': 'https',
+        **(headers or {}),
+    }
+    return {
+        'resource': '/{proxy+}',
+        'path': path,
+        'httpMethod': method,
+        'headers': headers,
+        'multiValueHeaders': {k: [v] for k, v in headers.items()},
+        'queryStringParameters': query,
+        'multiValueQueryStringParameters': {k: [v] for k, v in query.items()} if query else None,
+        'pathParameters': {'proxy': path.lstrip('/')},
+        'stageVariables': None,
+        'requestContext': {
+            'resourcePath': '/{proxy+}',
+            'httpMethod': method,
+            'path': f'/{STAGE}{path}',
+            'stage': STAGE,
+            'requestId': str(uuid.uuid4()),
+            'identity': {'sourceIp': source_ip, 'userAgent': headers['User-Agent']},
+        },
+        'body': json.dumps(body) if body is not None else None,
+        'isBase64Encoded': False,
+    }
+
+
+def http_api_event(event):
+    """The same request as an HTTP API (payload format 2.0) event, as HTTP APIs and Function URLs send"""
+    headers = {k.lower(): v for k, v in event['headers'].items()}
+    cookies = headers.pop('cookie', None)
+    query = event.get('queryStringParameters')
+    request_context = event['requestContext']
+    rv = {
+        'version': '2.0',
+        'routeKey': '$default',
+        'rawPath': event['path'],
+        'rawQueryString': urlencode(query) if query else '',
+        'headers': headers,
+        'queryStringParameters': query,
+        'requestContext': {
+            'domainName': GATEWAY_HOST,
+            'http': {'method': event['httpMethod'], 'path': event['path'], 'protocol': 'HTTP/1.1',
+                     'sourceIp': request_context['identity']['sourceIp'], 'userAgent': headers.get('user-agent')},
+            'requestId': request_context['requestId'],
+            'routeKey': '$default',
+            'stage': '$default',
+        },
+        'body': event['body'],
+        'isBase64Encoded': event['isBase64Encoded'],
+    }
+    if cookies:
+        rv['cookies'] = cookies.split('; ')
+    return rv
+
+
+def route_of(event):
+    if event.get('version') == '2.0':
+        http = event.get('requestContext', {}).get('http', {})
+        return f"{http.get('method', '?')} {http.get('path', '?')}"
+    return f"{event.get('httpMethod', '?')} {event.get('path', '?')}"
+
+
+def request_id_of(event):
+    return event.get('requestContext', {}).get('requestId')
+
+
+def _swipes(rng, count):
+    return [{'title': title, 'description': description,
+             'preference': rng.choice(['like', 'dislike'])}
+            for title, description in rng.sample(MEALS, count)]
+
+
+def _image(rng, size_kb):
+    # random bytes never repeat, so every upload misses the image cache like a new photo would
+    return 'data:image/jpeg;base64,' + base64.b64encode(rng.randbytes(size_kb * 1024)).decode()
+
+
+def build_event(route, user, rng, image_kb=IMAGE_KB):
+    """An event for `route` sent by `user` ({'username', 'password', 'session_id'})"""
+    session_id = user['session_id']
+    if route == 'POST /login':
+        return gateway_event('POST', '/login', {'username': user['username'], 'password': user['password']})
+    if route == 'POST /add_food_preferences':
+        return gateway_event('POST', '/add_food_preferences', {
+            'sessionId': session_id, 'food_id': f'meal-{rng.randrange(500)}', 'is_liked': rng.random() < 0.5})
+    if route == 'POST /add_food_preferences/batch':
+        events = [{'food_id': f'meal-{rng.randrange(500)}', 'is_liked': rng.random() < 0.5}
+                  for _ in range(rng.randint(5, 40))]
+        return gateway_event('POST', '/add_food_preferences/batch', {'sessionId': session_id, 'events': events},
+                             headers={'Idempotency-Key': str(uuid.UUID(int=rng.getrandbits(128)))})
+    if route == 'POST /add_user_preferences':
+        return gateway_event('POST', '/add_user_preferences', {
+            'sessionId': session_id,
+            'diet': rng.choice(['none', 'vegetarian', 'vegan', 'pescatarian']),
+            'budget': rng.choice(['low', 'medium', 'high']),
+            'cuisines': rng.sample(['italian', 'indian', 'mexican', 'thai', 'greek'], 2),
+            'allergens': ['peanuts'],
+            'kitchen_equipment': ['oven', 'hob', 'microwave'],
+            'number_of_people': str(rng.randint(1, 4)),
+            'notification_options': ['expiry'],
+            'fitbit_access_token': f"lazycook://fitbit?access_token=tok-{user['username']}&user_id=FB{user['username']}",
+        })
+    if route == 'POST /analyse-picture':
+        return gateway_event('POST', '/analyse-picture', {'sessionId': session_id, 'image': _image(rng, image_kb)})
+    if route == 'POST /generate-recipe':
+        return gateway_event('POST', '/generate-recipe', {'sessionId': session_id,
+                                                          'preferences': _swipes(rng, rng.randint(3, 8))})
+    if route == 'GET /feedback':
+        return gateway_event('GET', '/feedback', query={'sessionId': session_id, 'limit': '20'})
+    raise ValueError(f"Unknown route: {route}")
+
+
+def build_events(users, count, seed=0, weights=ROUTE_WEIGHTS, image_kb=IMAGE_KB, payload_format='1.0'):
+    """`count` events drawn from the route mix, each from a random seeded user"""
+    rng = random.Random(seed)
+    routes = list(weights)
+    picks = rng.choices(routes, weights=[weights[r] for r in routes], k=count)
+    events = [build_event(route, rng.choice(users), rng, image_kb) for route in picks]
+    return [http_api_event(e) for e in events] if payload_format == '2.0' else events
+
+
+def load_events(path):
+    """Recorded gateway events, either a JSON list or one event per line"""
+    with open(path) as f:
+        text = f.read().strip()
+    if text.startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
@@ -0,0 +1,345 @@
+import re
+import json
+import time
+import random
+import threading
+from types import SimpleNamespace
+from collections import Counter
+
+import src.tables as tables
+import src.fitbit as fitbit
+import src.inventory as inventory
+import src.openai_client as openai_client
+import src.request_timing as request_timing
+from src.password_policy import policy as password_policy
+
+# Local stand-ins for the services the handler calls. Each sleeps for a
+# latency drawn from a simple model of the real service (a base time with
+# log-normal spread, plus a per-token or per-item cost), multiplied by a
+# global scale: 1 is production-like, 0 measures only our own code.
+
+DEFAULT_SCALE = 0.05
+
+
+class Latency:
+    """Sleeps base_ms (with log-normal spread) plus per_unit_ms for each unit, times scale"""
+
+    def __init__(self, base_ms, per_unit_ms=0.0, sigma=0.25, scale=DEFAULT_SCALE, rng=None):
+        self.base_ms = base_ms
+        self.per_unit_ms = per_unit_ms
+        self.sigma = sigma
+        self.scale = scale
+        self.rng = rng or random.Random()
+
+    def ms(self, units=0):
+        return (self.base_ms * self.rng.lognormvariate(0, self.sigma) + self.per_unit_ms * units) * self.scale
+
+    def sleep(self, units=0):
+        delay = self.ms(units)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+
+# --- DynamoDB ------------------------------------------------------------
+
+DYNAMODB_LATENCY_MS = {
+    'get_item': 5, 'put_item': 7, 'update_item': 8, 'delete_item': 7,
+    'query': 9, 'scan': 15, 'batch_get_item': 9, 'batch_write': 12,
+}
+
+
+class LatencyTable:
+    """A LocalTable whose calls take about as long as DynamoDB's"""
+
+    def __init__(self, table, resource):
+        self._table = table
+        self._resource = resource
+
+    def __getattr__(self, name):
+        attr = getattr(self._table, name)
+        if name not in DYNAMODB_LATENCY_MS:
+            return attr
+
+        def call(*args, **kwargs):
+            return self._resource.timed(name, self._table.name, attr, *args, **kwargs)
+        return call
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        # one round trip per flush rather than per item
+        self._resource.wait('batch_write')
+        return self._table.batch_writer(overwrite_by_pkeys=overwrite_by_pkeys)
+
+
+class LatencyResource:
+    """tables.LocalResource in memory, with DynamoDB-like latency and a call count per operation"""
+
+    def __init__(self, scale=DEFAULT_SCALE, rng=None, storage=None):
+        self._local = tables.LocalResource(storage or tables.SQLiteStorage(':memory:'))
+        rng = rng or random.Random()
+        self._latency = {op: Latency(ms, scale=scale, rng=rng) for op, ms in DYNAMODB_LATENCY_MS.items()}
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def wait(self, operation):
+        with self._lock:
+            self.calls[operation] += 1
+        self._latency[operation].sleep()
+
+    def timed(self, operation, table, fn, *args, **kwargs):
+        # recorded like aws_clients records real calls, so Server-Timing shows DynamoDB
+        started = time.perf_counter()
+        try:
+            self.wait(operation)
+            return fn(*args, **kwargs)
+        finally:
+            request_timing.record('dynamodb', (time.perf_counter() - started) * 1000, table=table, region='local')
+            request_timing.count('dynamodb_calls')
+
+    def Table(self, name):
+        return LatencyTable(self._local.Table(name), self)
+
+    def batch_get_item(self, RequestItems):
+        return self.timed('batch_get_item', '+'.join(sorted(RequestItems)), self._local.batch_get_item,
+                          RequestItems=RequestItems)
+
+
+# --- OpenAI --------------------------------------------------------------
+
+INGREDIENTS = [
+    ('Chicken Breast', '2 days'), ('Spinach', '3 days'), ('Milk', '5 days'), ('Eggs', '2 weeks'),
+    ('Cheddar', '3 weeks'), ('Tomatoes', '4 days'), ('Onions', '3 weeks'), ('Greek Yogurt', '6 days'),
+    ('Bell Pepper', '5 days'), ('Mushrooms', '3 days'), ('Carrots', '2 weeks'), ('Rice', '1 year'),
+]
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def meal_plan(days=DAYS):
+    return {
+        'recipes': [{
+            'day_of_the_week': day,
+            'title': f'{day} Skillet with {INGREDIENTS[i % len(INGREDIENTS)][0]}',
+            'description': 'A quick one-pan dinner built around what is in the fridge.',
+            'difficulty': 'Easy',
+            'time_to_prepare': '30 minutes',
+            'servings': 2,
+            'ingredients': [name for name, _ in INGREDIENTS[i:i + 5]] + ['Olive Oil', 'Garlic'],
+            'instructions': ['Prep the vegetables.', 'Brown the protein.', 'Simmer everything together.',
+                             'Season and serve.'],
+        } for i, day in enumerate(days)],
+        'grocery_list': [
+            {'name': 'Olive Oil', 'quantity': '1 bottle', 'category': 'Pantry'},
+            {'name': 'Garlic', 'quantity': '1 bulb', 'category': 'Vegetables'},
+        ],
+    }
+
+
+def _prompt_text(messages):
+    text = []
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, str):
+            text.append(content)
+            continue
+        for part in content or []:
+            if part.get('type') == 'image_url':
+                return None
+            text.append(part.get('text', ''))
+    return '\n'.join(text)
+
+
+def _tokens(text):
+    return len(text) // 4
+
+
+class FakeCompletions:
+    """chat.completions with parse() and create(stream=True)"""
+
+    def __init__(self, first_token, per_token, rng, vision, prompt_per_token):
+        self.first_token = first_token
+        self.per_token = per_token
+        self.vision = vision
+        self.prompt_per_token = prompt_per_token
+        self.rng = rng
+        self.calls = Counter()
+
+    def _content(self, messages):
+        prompt = _prompt_text(messages)
+        if prompt is None:
+            foods = self.rng.sample(INGREDIENTS, self.rng.randint(6, len(INGREDIENTS)))
+            return None, json.dumps({'foods': [{'name': n, 'estimated_expiry': e} for n, e in foods]})
+        # fan-out prompts name their days, the single prompt wants the whole week
+        match = re.search(r'one for each of these days: ([^.]+)\.', prompt)
+        days = [day for day in DAYS if match and day in match.group(1)] or DAYS
+        return prompt, json.dumps(meal_plan(days))
+
+    def _response(self, prompt, content):
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content, role='assistant'))],
+            # an image costs about 765 prompt tokens at high detail
+            usage=SimpleNamespace(prompt_tokens=_tokens(prompt) if prompt is not None else 765,
+                                  completion_tokens=_tokens(content)),
+        )
+
+    def parse(self, model=None, messages=(), response_format=None, **kwargs):
+        prompt, content = self._content(messages)
+        self.calls['vision' if prompt is None else 'parse'] += 1
+        if prompt is None:
+            self.vision.sleep(_tokens(content))
+        else:
+            self.first_token.sleep(_tokens(prompt) * self.prompt_per_token)
+            self.per_token.sleep(_tokens(content))
+        return self._response(prompt, content)
+
+    def create(self, model=None, messages=(), stream=False, **kwargs):
+        prompt, content = self._content(messages)
+        if not stream:
+            return self.parse(model, messages, **kwargs)
+        self.calls['stream'] += 1
+        return self._stream(prompt or '', content)
+
+    def _stream(self, prompt, content):
+        self.first_token.sleep(_tokens(prompt) * self.prompt_per_token)
+        # about four characters per token, a few tokens per chunk
+        for i in range(0, len(content), 16):
+            piece = content[i:i + 16]
+            self.per_token.sleep(_tokens(piece))
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+
+
+class FakeOpenAI:
+    """Enough of openai.OpenAI for the calls src/openai.py makes"""
+
+    def __init__(self, api_key=None, scale=DEFAULT_SCALE, rng=None):
+        rng = rng or random.Random()
+        self.completions = FakeCompletions(
+            # gpt-4o: ~600ms to first token, ~12ms per output token, images ~3s
+            first_token=Latency(600, per_unit_ms=1.0, scale=scale, rng=rng),
+            per_token=Latency(0, per_unit_ms=12, scale=scale, rng=rng),
+            vision=Latency(3000, per_unit_ms=12, scale=scale, rng=rng),
+            prompt_per_token=0.05,
+            rng=rng,
+        )
+        self.chat = SimpleNamespace(completions=self.completions)
+        self.beta = SimpleNamespace(chat=self.chat)
+
+
+# --- Fitbit --------------------------------------------------------------
+
+class FakeFitbitResponse:
+
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class FakeFitbitSession:
+    """requests.Session stand-in answering the steps time series"""
+
+    def __init__(self, scale=DEFAULT_SCALE, rng=None):
+        self.rng = rng or random.Random()
+        self.latency = Latency(250, scale=scale, rng=self.rng)
+        self.calls = 0
+
+    def get(self, url, headers=None, timeout=None):
+        self.calls += 1
+        self.latency.sleep()
+        steps = [{'dateTime': f'day-{i}', 'value': str(self.rng.randint(2000, 14000))} for i in range(7)]
+        return FakeFitbitResponse(200, {'activities-steps': steps})
+
+
+# --- Lambda --------------------------------------------------------------
+
+class FakeLambdaContext:
+
+    function_name = 'lazycook-backend'
+    function_version = '$LATEST'
+    memory_limit_in_mb = 1024
+
+    def __init__(self, timeout_ms=30000):
+        self.aws_request_id = None
+        self._deadline = time.monotonic() + timeout_ms / 1000
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+class Fakes:
+    """Everything install() swapped in, kept for call counts"""
+
+    def __init__(self, resource, openai, fitbit_session, restore):
+        self.resource = resource
+        self.openai = openai
+        self.fitbit_session = fitbit_session
+        self.restore = restore
+
+    def calls(self):
+        return {
+            'dynamodb': dict(self.resource.calls),
+            'openai': dict(self.openai.completions.calls),
+            'fitbit': self.fitbit_session.calls,
+        }
+
+
+def install(scale=DEFAULT_SCALE, seed=0):
+    """Point the app's DynamoDB, OpenAI and Fitbit access at the fakes"""
+    rng = random.Random(seed)
+    previous = (tables.backend(), openai_client.provider, fitbit.client.session)
+
+    def restore():
+        tables.set_backend(previous[0])
+        openai_client.provider = previous[1]
+        fitbit.client.session = previous[2]
+        fitbit.client.clear()
+
+    resource = LatencyResource(scale=scale, rng=rng)
+    tables.set_backend('memory', resource=resource)
+
+    openai = FakeOpenAI(scale=scale, rng=rng)
+    secret = Latency(80, scale=scale, rng=rng)  # Secrets Manager, once per container
+
+    def fetch_secret():
+        secret.sleep()
+        return 'sk-loadtest'
+    openai_client.provider = openai_client.OpenAIClientProvider(fetch_secret=fetch_secret,
+                                                                client_factory=lambda api_key: openai)
+
+    session = FakeFitbitSession(scale=scale, rng=rng)
+    fitbit.client.session = session
+    fitbit.client.clear()
+    return Fakes(resource, openai, session, restore)
+
+
+PASSWORD = 'loadtest-password'
+
+
+def credentials(count):
+    """What the seeded users log in and call the API with"""
+    return [{'username': f'loadtest-user-{i}', 'password': PASSWORD, 'session_id': f'loadtest-session-{i}'}
+            for i in range(count)]
+
+
+def seed_users(count):
+    """Users with a session, a preference form and a stocked fridge; returns their credentials"""
+    # hashing once keeps seeding fast, every user shares the password
+    password_hash = password_policy.hash_password(PASSWORD)
+    users_table = tables.get_table('Users', 'eu-west-1')
+    sessions_table = tables.get_table('UserSessions', 'eu-west-1')
+    preferences_table = tables.get_table('user_preferences', 'eu-west-1')
+    users = credentials(count)
+    for i, user in enumerate(users):
+        username, session_id = user['username'], user['session_id']
+        users_table.put_item(Item={'username': username, 'password': password_hash, 'id': str(i),
+                                   'name': f'Load Test {i}'})
+        sessions_table.put_item(Item={'sessionId': session_id, 'userId': username,
+                                      'ttl': int(time.time()) + 24 * 3600})
+        preferences_table.put_item(Item={
+            'user_id': username, 'diet': 'none', 'budget': 'medium', 'cuisines': ['italian', 'indian'],
+            'allergens': ['peanuts'], 'kitchen_equipment': ['oven', 'hob'], 'number_of_people': 2,
+            'notification_options': ['expiry'],
+            'fitbit_access_token': f'lazycook://fitbit?access_token=tok-{i}&user_id=FB{i}',
+        })
+        inventory.merge_scan(username, {'foods': [{'name': n, 'estimated_expiry': e} for n, e in INGREDIENTS]})
+    return users
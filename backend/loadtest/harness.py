@@ -0,0 +1,312 @@
+import os
+import sys
+import json
+import time
+import logging
+import importlib
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from loadtest import events as gateway_events
+
+try:
+    import resource
+except ImportError:  # not on Windows, peak RSS is then left out
+    resource = None
+
+# Runs gateway events through app.lambda_handler, either in this process or
+# spread over worker processes that each stand in for one Lambda container,
+# and turns the timings into a report that can be checked against a saved
+# baseline. The first request per route in each container counts as cold
+# and is kept out of the warm percentiles.
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the lambda layer in /python ships awsgi, use it when it is not installed locally
+LAYER_DIR = os.path.join(os.path.dirname(BACKEND_DIR), 'python')
+
+PERCENTILES = (50, 95, 99)
+# relative slowdown allowed against the baseline before it counts as a regression
+DEFAULT_TOLERANCE = 0.2
+# differences below this are timer noise whatever the ratio
+NOISE_FLOOR_MS = 2.0
+# a p99 from fewer than 100 samples is just the maximum, so it is not compared
+MIN_SAMPLES = {50: 2, 95: 20, 99: 100}
+
+
+def _paths():
+    for path in (BACKEND_DIR, LAYER_DIR):
+        if path not in sys.path:
+            sys.path.append(path)
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # kilobytes on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+@contextlib.contextmanager
+def quiet():
+    """The handlers print whole completions; keep them off the terminal but still pay for them"""
+    root = logging.getLogger()
+    level = root.level
+    root.setLevel(logging.WARNING)
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            yield
+    finally:
+        root.setLevel(level)
+
+
+class Container:
+    """One warm Lambda container: the imported app, the fakes and the seeded users"""
+
+    def __init__(self, users=20, scale=None, seed=0):
+        _paths()
+        # per-stage times come back in the Server-Timing header, which is off by default
+        os.environ.setdefault('SERVER_TIMING_HEADER', '1')
+        with quiet():
+            start = time.perf_counter()
+            self.app = importlib.import_module('app')
+            self.import_ms = round((time.perf_counter() - start) * 1000, 2)
+
+        # again, importing the app resets the log level
+        with quiet():
+            from loadtest import fakes
+            self.fakes = fakes.install(scale=fakes.DEFAULT_SCALE if scale is None else scale, seed=seed)
+            self.users = fakes.seed_users(users)
+        self._context = fakes.FakeLambdaContext
+        self._seen = set()
+
+    def invoke(self, event):
+        """(route, ms, status, cold, stages) for one event"""
+        route = gateway_events.route_of(event)
+        context = self._context()
+        context.aws_request_id = gateway_events.request_id_of(event)
+        start = time.perf_counter()
+        stages = {}
+        try:
+            response = self.app.lambda_handler(event, context)
+            status = int(response.get('statusCode', 0))
+            stages = parse_server_timing((response.get('headers') or {}).get('Server-Timing', ''))
+        except Exception as e:
+            logging.error(f"Load test request to {route} raised: {e}")
+            status = 0
+        ms = (time.perf_counter() - start) * 1000
+        cold = route not in self._seen
+        self._seen.add(route)
+        return route, ms, status, cold, stages
+
+    def run(self, events):
+        with quiet():
+            return [self.invoke(event) for event in events]
+
+    def summary(self):
+        return {'import_ms': self.import_ms, 'peak_rss_mb': peak_rss_mb(), 'calls': self.fakes.calls()}
+
+    def close(self):
+        self.fakes.restore()
+
+
+# --- worker processes ----------------------------------------------------
+
+_container = None
+
+
+def _init_worker(users, scale, seed):
+    global _container
+    _container = Container(users=users, scale=scale, seed=seed)
+
+
+def _run_chunk(events):
+    return os.getpid(), _container.run(events), _container.summary()
+
+
+def run(events=None, requests=200, users=20, processes=0, scale=None, seed=0, image_kb=None, payload_format='1.0'):
+    """Run the load and return the report dict"""
+    if processes:
+        return _run_processes(events, requests, users, processes, scale, seed, image_kb, payload_format)
+
+    container = Container(users=users, scale=scale, seed=seed)
+    try:
+        events = events or gateway_events.build_events(container.users, requests, seed, payload_format=payload_format,
+                                                       image_kb=image_kb or gateway_events.IMAGE_KB)
+        start = time.perf_counter()
+        samples = container.run(events)
+        wall = time.perf_counter() - start
+        return report(samples, wall, [container.summary()], processes=0, scale=container_scale(scale))
+    finally:
+        container.close()
+
+
+def _run_processes(events, requests, users, processes, scale, seed, image_kb, payload_format):
+    _paths()
+    if events is None:
+        #the workers seed the same users, so events can be built up front
+        from loadtest.fakes import credentials
+        events = gateway_events.build_events(credentials(users), requests, seed, payload_format=payload_format,
+                                             image_kb=image_kb or gateway_events.IMAGE_KB)
+    chunk = max(1, len(events) // (processes * 4))
+    chunks = [events[i:i + chunk] for i in range(0, len(events), chunk)]
+
+    # spawn, so every worker pays its own import like a fresh container
+    with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(users, scale, seed)) as pool:
+        # start every container before the clock does
+        summaries = {pid: summary for pid, _, summary in pool.map(_run_chunk, [[]] * processes)}
+        start = time.perf_counter()
+        samples = []
+        for pid, result, summary in pool.map(_run_chunk, chunks):
+            samples += result
+            summaries[pid] = summary
+        wall = time.perf_counter() - start
+    return report(samples, wall, list(summaries.values()), processes=processes, scale=container_scale(scale))
+
+
+def container_scale(scale):
+    from loadtest.fakes import DEFAULT_SCALE
+    return DEFAULT_SCALE if scale is None else scale
+
+
+# --- report --------------------------------------------------------------
+
+def parse_server_timing(header):
+    """{stage: ms} from a Server-Timing header, per-table entries left out"""
+    stages = {}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        if not name or '.' in name or name == 'total':
+            continue
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip() == 'dur':
+                stages[name] = float(value)
+    return stages
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def _latency(values):
+    rv = {f'p{p}_ms': round(percentile(values, p), 2) for p in PERCENTILES}
+    rv['mean_ms'] = round(sum(values) / len(values), 2)
+    rv['max_ms'] = round(max(values), 2)
+    return rv
+
+
+def report(samples, wall, containers, processes=0, scale=None):
+    routes = {}
+    for route, ms, status, cold, stages in samples:
+        entry = routes.setdefault(route, {'count': 0, 'errors': 0, 'warm': [], 'cold': [], 'stages': {}})
+        entry['count'] += 1
+        entry['errors'] += status == 0 or status >= 500
+        entry['cold' if cold else 'warm'].append(ms)
+        if not cold:
+            for stage, stage_ms in stages.items():
+                entry['stages'][stage] = entry['stages'].get(stage, 0.0) + stage_ms
+
+    rv_routes = {}
+    for route, entry in sorted(routes.items()):
+        rv = {'count': entry['count'], 'errors': entry['errors']}
+        rv.update(_latency(entry['warm'] or entry['cold']))
+        rv['cold_ms'] = round(sum(entry['cold']) / len(entry['cold']), 2) if entry['cold'] else None
+        # mean warm time per stage, from the Server-Timing header
+        warm = max(1, len(entry['warm']))
+        rv['stages_ms'] = {stage: round(total / warm, 2) for stage, total in sorted(entry['stages'].items())}
+        rv_routes[route] = rv
+
+    calls = {}
+    for container in containers:
+        for service, counts in container['calls'].items():
+            if isinstance(counts, dict):
+                target = calls.setdefault(service, {})
+                for op, n in counts.items():
+                    target[op] = target.get(op, 0) + n
+            else:
+                calls[service] = calls.get(service, 0) + counts
+
+    rss = [c['peak_rss_mb'] for c in containers if c['peak_rss_mb'] is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(r['errors'] for r in rv_routes.values()),
+        'processes': processes,
+        'latency_scale': scale,
+        'wall_s': round(wall, 3),
+        'throughput_rps': round(len(samples) / wall, 2) if wall else None,
+        'routes': rv_routes,
+        'cold': {
+            'containers': len(containers),
+            'import_ms': round(max(c['import_ms'] for c in containers), 2),
+        },
+        'peak_rss_mb': max(rss) if rss else None,
+        'calls': calls,
+    }
+
+
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Human-readable regressions of `current` against `baseline`, empty when none"""
+    regressions = []
+
+    def slower(name, now, before):
+        if now is None or before is None:
+            return
+        if now > before * (1 + tolerance) and now - before > NOISE_FLOOR_MS:
+            regressions.append(f"{name}: {before:.1f} -> {now:.1f} (+{(now / before - 1) * 100 if before else 0:.0f}%)")
+
+    for route, now in current['routes'].items():
+        before = baseline.get('routes', {}).get(route)
+        if not before:
+            continue
+        found = len(regressions)
+        for p in PERCENTILES:
+            if min(now['count'], before['count']) < MIN_SAMPLES[p]:
+                continue
+            slower(f"{route} p{p}_ms", now[f'p{p}_ms'], before[f'p{p}_ms'])
+        if len(regressions) > found:
+            stage = _slowest_stage(now.get('stages_ms', {}), before.get('stages_ms', {}))
+            if stage:
+                regressions.append(f"{route} most of it in {stage}")
+        if now['errors'] > before['errors']:
+            regressions.append(f"{route} errors: {before['errors']} -> {now['errors']}")
+
+    slower('cold import_ms', current['cold']['import_ms'], baseline.get('cold', {}).get('import_ms'))
+    before_rss, now_rss = baseline.get('peak_rss_mb'), current.get('peak_rss_mb')
+    if before_rss and now_rss and now_rss > before_rss * (1 + tolerance):
+        regressions.append(f"peak_rss_mb: {before_rss} -> {now_rss}")
+    before_rps, now_rps = baseline.get('throughput_rps'), current.get('throughput_rps')
+    if before_rps and now_rps and now_rps < before_rps * (1 - tolerance):
+        regressions.append(f"throughput_rps: {before_rps} -> {now_rps}")
+    if baseline.get('latency_scale') != current.get('latency_scale'):
+        regressions.append(f"latency_scale differs from the baseline "
+                           f"({baseline.get('latency_scale')} vs {current.get('latency_scale')}), numbers are not comparable")
+    return regressions
+
+
+def _slowest_stage(now, before):
+    """'stage (+Nms)' for the stage whose mean grew the most"""
+    growth = {stage: ms - before.get(stage, 0.0) for stage, ms in now.items()}
+    if not growth or max(growth.values()) <= 0:
+        return None
+    stage = max(growth, key=growth.get)
+    return f"{stage} (+{growth[stage]:.1f}ms)"
+
+
+def format_report(rv):
+    lines = [f"{rv['requests']} requests, {rv['errors']} errors, {rv['throughput_rps']} req/s "
+             f"over {rv['wall_s']}s ({rv['processes'] or 'in-process'} workers, latency scale {rv['latency_scale']})",
+             f"cold import {rv['cold']['import_ms']}ms, peak RSS {rv['peak_rss_mb']}MB",
+             f"{'route':<34}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'cold':>10}"]
+    for route, r in rv['routes'].items():
+        lines.append(f"{route:<34}{r['count']:>7}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+                     f"{r['cold_ms'] if r['cold_ms'] is not None else '-':>10}")
+        if r.get('stages_ms'):
+            lines.append(' ' * 4 + ', '.join(f"{stage} {ms:.1f}" for stage, ms in r['stages_ms'].items()))
+    lines.append(f"calls: {json.dumps(rv['calls'], sort_keys=True)}")
+    return '\n'.join(lines)
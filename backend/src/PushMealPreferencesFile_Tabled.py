@@ -1,18 +1,29 @@
 from flask import Flask, request, jsonify, Blueprint
-import boto3
+import os
+import json
+import time
+import hashlib
 import logging
+from botocore.exceptions import ClientError
+import src.tables as tables
+import src.session_cache as session_cache
 
 food_preferences_bp = Blueprint('food_preferences', __name__)
-logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
 
-dynamodb = boto3.resource('dynamodb', region_name='eu-north-1')
 table_name = "food_preferences"
-
-dynamodb_w = boto3.resource('dynamodb', region_name='eu-west-1')
-session_table = dynamodb_w.Table('UserSessions')
+# remembers finished batches so a retried flush is not written twice
+idempotency_table_name = "food_preferences_batches"
+IDEMPOTENCY_TTL = 24 * 3600
+# a pending claim older than this was left by an invocation that died (timeout, crash), a retry may take it over
+IDEMPOTENCY_PENDING_TIMEOUT = int(os.environ.get('IDEMPOTENCY_PENDING_TIMEOUT', 60))
+MAX_BATCH_EVENTS = 500
 
 def get_table():
-    return dynamodb.Table(table_name)
+    return tables.get_table(table_name, 'eu-north-1')
+
+def get_idempotency_table():
+    return tables.get_table(idempotency_table_name, 'eu-north-1')
 
 @food_preferences_bp.route("/add_food_preferences", methods=["POST"])
 def add_food_preferences():
@@ -22,25 +33,24 @@ def add_food_preferences():
         food_id = data['food_id']
         is_liked = data['is_liked']
 
-        logging.info(f"Received data: food_id={food_id}, is_liked={is_liked}")
+        logger.debug(f"Received data: food_id={food_id}, is_liked={is_liked}")
 
         #validating session id for session management 
         if not session_id:
-            logging.error("Must provide session id")
+            logger.error("Must provide session id")
             return jsonify({"error":"Must provide session id"}), 400     
             
-        resp = session_table.get_item(Key = {'sessionId':session_id})
-        if 'Item' not in resp:
-            logging.error("Invalid session id")
-            return jsonify({"error":"Invalid session id"}), 400      
-        user_id = resp['Item'].get('userId')   
+        user_id = session_cache.resolve_user_id(session_id)
+        if not user_id:
+            logger.error("Invalid session id")
+            return jsonify({"error":"Invalid session id"}), 400
 
         # Check correct data inputted
         if not food_id or is_liked is None: #return error if wrong data put in
-            logging.error("Invalid input data")
+            logger.error("Invalid input data")
             return jsonify({"error":"Invalid input data"}), 400
 
-        table = dynamodb.Table(table_name)
+        table = get_table()
 
         response = table.put_item(Item={ #posts data to aws table
             'user_id': user_id,
@@ -48,11 +58,115 @@ def add_food_preferences():
             'is_liked': is_liked
         })
 
-        logging.info(f"DynamoDB Response: {response}")
+        logger.debug(f"DynamoDB Response: {response}")
         return jsonify({"output":"Food preference logged"}), 201 #confirm logged
 
     except Exception as e:
-        logging.error(f"Error adding food preference: {e}", exc_info=True) #error message for debugging
+        logger.error(f"Error adding food preference: {e}", exc_info=True) #error message for debugging
         return jsonify({"error"}), 500
 
 
+# Keeps the last event per food_id, in the order each food was first seen
+def dedupe_events(events):
+    latest = {}
+    for event in events:
+        latest[event['food_id']] = event['is_liked']
+    return [{'food_id': food_id, 'is_liked': is_liked} for food_id, is_liked in latest.items()]
+
+
+# Fingerprint of a batch, so a reused idempotency key with other events is caught
+def payload_hash(events):
+    return hashlib.sha256(json.dumps(events, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+# Claims an idempotency key; returns None when claimed, else the stored item
+# A pending claim whose pending_until has passed is taken over, its writer is gone
+def claim_idempotency_key(key, fingerprint=None):
+    now = int(time.time())
+    item = {'idempotency_key': key, 'status': 'pending', 'pending_until': now + IDEMPOTENCY_PENDING_TIMEOUT,
+            'ttl': now + IDEMPOTENCY_TTL}
+    if fingerprint:
+        item['payload_hash'] = fingerprint
+    try:
+        get_idempotency_table().put_item(
+            Item=item,
+            ConditionExpression="attribute_not_exists(idempotency_key) OR "
+                                "(#status = :pending AND pending_until < :now)",
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':pending': 'pending', ':now': now},
+        )
+        return None
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+    return get_idempotency_table().get_item(Key={'idempotency_key': key}).get('Item') or {'status': 'pending'}
+
+
+@food_preferences_bp.route("/add_food_preferences/batch", methods=["POST"])
+def add_food_preferences_batch():
+    try:
+        data = request.get_json()
+        session_id = data.get('sessionId')
+        events = data.get('events')
+        token = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+
+        if not session_id:
+            logger.error("Must provide session id")
+            return jsonify({"error":"Must provide session id"}), 400
+
+        user_id = session_cache.resolve_user_id(session_id)
+        if not user_id:
+            logger.error("Invalid session id")
+            return jsonify({"error":"Invalid session id"}), 400
+
+        if not isinstance(events, list) or not events or len(events) > MAX_BATCH_EVENTS:
+            return jsonify({"error":f"events must be a list of 1 to {MAX_BATCH_EVENTS} swipes"}), 400
+        for i, event in enumerate(events):
+            #food_id is a key attribute, anything but a non-empty string cannot be stored (or deduped)
+            if (not isinstance(event, dict) or not isinstance(event.get('food_id'), str) or not event['food_id']
+                    or event.get('is_liked') is None):
+                logger.error(f"Invalid event at index {i}")
+                return jsonify({"error":f"Invalid input data at index {i}"}), 400
+
+        key = f"{user_id}#{token}" if token else None
+        if key:
+            fingerprint = payload_hash(events)
+            existing = claim_idempotency_key(key, fingerprint)
+            if existing is not None:
+                if existing.get('payload_hash', fingerprint) != fingerprint:
+                    return jsonify({"error":"This idempotency key was already used for a different batch"}), 409
+                if existing.get('status') == 'done':
+                    return jsonify(json.loads(existing['response'])), 200
+                return jsonify({"error":"A batch with this idempotency key is still being written"}), 409
+
+        preferences = dedupe_events(events)
+        try:
+            # batch_writer sends 25 items per BatchWriteItem and resubmits UnprocessedItems
+            with get_table().batch_writer(overwrite_by_pkeys=['user_id', 'food_id']) as batch:
+                for preference in preferences:
+                    batch.put_item(Item={
+                        'user_id': user_id,
+                        'food_id': preference['food_id'],
+                        'is_liked': preference['is_liked'],
+                    })
+        except Exception:
+            if key:
+                #release the key so the client can retry the same batch
+                get_idempotency_table().delete_item(Key={'idempotency_key': key})
+            raise
+
+        result = {"output":"Food preferences logged", "received": len(events), "written": len(preferences)}
+        if key:
+            get_idempotency_table().update_item(
+                Key={'idempotency_key': key},
+                UpdateExpression="SET #status = :done, #response = :response",
+                ExpressionAttributeNames={'#status': 'status', '#response': 'response'},
+                ExpressionAttributeValues={':done': 'done', ':response': json.dumps(result)},
+            )
+
+        logger.info(f"Logged {len(preferences)} food preferences for {user_id}")
+        return jsonify(result), 201
+
+    except Exception as e:
+        logger.error(f"Error adding food preferences batch: {e}", exc_info=True)
+        return jsonify({"error": "Error adding food preferences"}), 500
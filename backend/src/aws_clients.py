@@ -0,0 +1,143 @@
+import os
+import time
+import threading
+import boto3
+from botocore.config import Config
+import src.request_timing as request_timing
+
+# One place that builds boto3 clients and resources. Each (service, region)
+# pair is created once per container, on first use, from a single shared
+# session, so the blueprints stop paying for duplicate loaders and
+# connection pools at import time.
+
+AWS_CONFIG = Config(
+    max_pool_connections=int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 20)),
+    tcp_keepalive=True,
+    connect_timeout=float(os.environ.get('AWS_CONNECT_TIMEOUT', 2)),
+    read_timeout=float(os.environ.get('AWS_READ_TIMEOUT', 10)),
+    retries={
+        'max_attempts': int(os.environ.get('AWS_MAX_ATTEMPTS', 4)),
+        'mode': 'adaptive',
+    },
+)
+
+_lock = threading.RLock()
+_session = None
+_clients = {}
+_resources = {}
+_tables = {}
+_stats = {}
+
+_START_KEY = 'aws_clients_start'
+_TABLE_KEY = 'aws_clients_table'
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        _session = boto3.session.Session()
+    return _session
+
+
+def _record(name, operation, started, failed, table=None):
+    if started is None:
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    service, _, region = name.partition(':')
+    if service == 'dynamodb':
+        request_timing.record('dynamodb', elapsed_ms, table=table or operation, region=region)
+        request_timing.count('dynamodb_calls')
+    with _lock:
+        client_stats = _stats.setdefault(name, {})
+        op = client_stats.setdefault(operation, {'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        op['calls'] += 1
+        op['errors'] += int(failed)
+        op['total_ms'] += elapsed_ms
+        op['max_ms'] = max(op['max_ms'], elapsed_ms)
+
+
+def _instrument(client, name):
+    #time every API call made through this client, retries included
+
+    def before_parameter_build(params, context, **kwargs):
+        #the table(s) a call touches, for the per-request breakdown
+        table = params.get('TableName') or '+'.join(sorted(params.get('RequestItems') or {}))
+        if table:
+            context[_TABLE_KEY] = table
+
+    def before_call(model, context, **kwargs):
+        context[_START_KEY] = time.perf_counter()
+
+    def after_call(http_response, parsed, model, context, **kwargs):
+        failed = bool(parsed.get('Error')) if isinstance(parsed, dict) else False
+        _record(name, model.name, context.get(_START_KEY), failed, context.get(_TABLE_KEY))
+
+    def after_call_error(model, context, **kwargs):
+        _record(name, model.name, context.get(_START_KEY), True, context.get(_TABLE_KEY))
+
+    client.meta.events.register('before-parameter-build', before_parameter_build)
+    client.meta.events.register('before-call', before_call)
+    client.meta.events.register('after-call', after_call)
+    client.meta.events.register('after-call-error', after_call_error)
+    return client
+
+
+def get_client(service, region):
+    key = (service, region)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _get_session().client(service, region_name=region, config=AWS_CONFIG)
+                client = _instrument(client, f"{service}:{region}")
+                _clients[key] = client
+    return client
+
+
+def get_resource(service, region):
+    key = (service, region)
+    resource = _resources.get(key)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(key)
+            if resource is None:
+                resource = _get_session().resource(service, region_name=region, config=AWS_CONFIG)
+                _instrument(resource.meta.client, f"{service}:{region}")
+                _resources[key] = resource
+    return resource
+
+
+def get_table(table_name, region):
+    key = (table_name, region)
+    table = _tables.get(key)
+    if table is None:
+        table = get_resource('dynamodb', region).Table(table_name)
+        _tables[key] = table
+    return table
+
+
+def stats():
+    with _lock:
+        rv = {}
+        for name, operations in _stats.items():
+            rv[name] = {}
+            for operation, op in operations.items():
+                rv[name][operation] = {
+                    'calls': op['calls'],
+                    'errors': op['errors'],
+                    'avg_ms': round(op['total_ms'] / op['calls'], 2) if op['calls'] else 0.0,
+                    'max_ms': round(op['max_ms'], 2),
+                }
+        return rv
+
+
+def reset():
+    """Drop every cached client, e.g. after a snapshot restore or between tests"""
+    global _session
+    with _lock:
+        _session = None
+        _clients.clear()
+        _resources.clear()
+        _tables.clear()
+        _stats.clear()
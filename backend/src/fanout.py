@@ -0,0 +1,121 @@
+import os
+import re
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from src.grocery_list import build_grocery_list
+import src.request_timing as request_timing
+
+# Optional fan-out mode for the weekly plan. One completion for 7 recipes
+# plus a grocery list is slow because latency grows with output tokens, so
+# here each day (or pair of days) is its own smaller completion, run
+# concurrently. Titles are deduplicated across days and the grocery list is
+# built on the server, so the response keeps the usual shape.
+
+logger = logging.getLogger(__name__)
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+FANOUT_CONCURRENCY = int(os.environ.get('FANOUT_CONCURRENCY', 4))
+FANOUT_DAYS_PER_CALL = int(os.environ.get('FANOUT_DAYS_PER_CALL', 1))
+# extra rounds for days whose recipe duplicated another day's
+FANOUT_RETRY_ROUNDS = int(os.environ.get('FANOUT_RETRY_ROUNDS', 2))
+
+DAY_INSTRUCTIONS = """
+    Generate {count} completely different meal(s), one for each of these days: {days}.
+    - Each meal must be **new** — do not repeat or slightly modify meals from preferences or past feedback.
+    - Do not suggest any of these meals, they are already planned: {avoid}
+    - Ensure to respect the user's preferences from the form and prioritize ingredients that will expire soon.
+    - Reflect their activity level and nutritional guidance in the portion size or energy level of meals if provided.
+    - Give every ingredient with its quantity, e.g. "200g chicken breast" or "2 onions".
+
+    **Respond ONLY in JSON format, following this exact schema:**
+    {{
+        "recipes": [
+            {{
+                "day_of_the_week": "Monday/Tuesday/...",
+                "title": "Recipe Title",
+                "description": "Short description",
+                "difficulty": "Easy/Medium/Hard",
+                "time_to_prepare": "Time in minutes",
+                "servings": Number,
+                "ingredients": ["Ingredient 1", "Ingredient 2"],
+                "instructions": ["Step 1", "Step 2"]
+            }}
+        ]
+    }}
+    """
+
+
+def title_key(title):
+    return re.sub(r'[^a-z0-9]', '', str(title).lower())
+
+
+def chunk_days(days, per_call):
+    per_call = max(1, per_call)
+    return [tuple(days[i:i + per_call]) for i in range(0, len(days), per_call)]
+
+
+def _generate_chunk(inputs, chunk, avoid, complete):
+    prompt = inputs + DAY_INSTRUCTIONS.format(
+        count=len(chunk),
+        days=", ".join(chunk),
+        avoid=", ".join(avoid) if avoid else "none",
+    )
+    menu = complete(prompt)
+    recipes = menu.get("recipes", []) if isinstance(menu, dict) else []
+    return [r for r in recipes if isinstance(r, dict) and r.get("title")]
+
+
+def generate_week(inputs, complete, available_ingredients, days=DAYS,
+                  per_call=FANOUT_DAYS_PER_CALL, concurrency=FANOUT_CONCURRENCY):
+    """complete(prompt) -> parsed JSON dict; returns {"recipes": [...], "grocery_list": [...]}"""
+    accepted = {}
+    fallback = {}
+    pending = chunk_days(list(days), per_call)
+    avoid = []
+
+    for attempt in range(FANOUT_RETRY_ROUNDS + 1):
+        workers = max(1, min(concurrency, len(pending)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fanout') as executor:
+            futures = [(chunk, executor.submit(request_timing.bind(_generate_chunk), inputs, chunk, avoid, complete)) for chunk in pending]
+
+        taken = {title_key(r["title"]) for r in accepted.values()}
+        retry_days = []
+        # walk in day order so the earlier day keeps a contested title
+        for chunk, future in futures:
+            try:
+                recipes = future.result()
+            except Exception as e:
+                logger.warning(f"Fan-out generation for {chunk} failed: {e}")
+                recipes = []
+
+            for i, day in enumerate(chunk):
+                if i >= len(recipes):
+                    retry_days.append(day)
+                    continue
+                recipe = dict(recipes[i], day_of_the_week=day)
+                key = title_key(recipe["title"])
+                if key in taken:
+                    fallback.setdefault(day, recipe)
+                    retry_days.append(day)
+                    continue
+                taken.add(key)
+                accepted[day] = recipe
+
+        if not retry_days:
+            break
+        avoid = [r["title"] for r in accepted.values()]
+        pending = chunk_days([d for d in days if d in retry_days], per_call)
+
+    for day in days:
+        if day not in accepted:
+            if day not in fallback:
+                raise RuntimeError(f"Could not generate a recipe for {day}")
+            #out of retries, a repeat beats an empty day
+            accepted[day] = fallback[day]
+
+    recipes = [accepted[day] for day in days]
+    return {
+        "recipes": recipes,
+        "grocery_list": build_grocery_list(recipes, available_ingredients),
+    }
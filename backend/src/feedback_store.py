@@ -0,0 +1,210 @@
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+import src.tables as tables
+from src.pagination import encode_cursor, decode_cursor
+
+# Recipe feedback in its own table instead of an ever-growing list on the
+# Users item. Every submission is one item keyed by user and time, and a
+# small PROFILE item in the same partition is updated as feedback arrives:
+# recent likes and dislikes plus counts of recurring complaints. Generation
+# only ever reads the profile.
+
+FEEDBACK_TABLE = 'RecipeFeedback'
+FEEDBACK_REGION = 'eu-west-1'
+PROFILE_KEY = 'PROFILE'
+ENTRY_PREFIX = 'FEEDBACK#'
+
+MAX_TITLES = 20
+MAX_NOTES = 5
+MAX_PAGE_SIZE = 100
+MAX_PROFILE_RETRIES = 3
+
+# recurring complaints and the phrases that count towards them
+COMPLAINTS = {
+    'too spicy': ['too spicy', 'too hot', 'spicy'],
+    'too bland': ['too bland', 'bland', 'no flavour', 'no flavor', 'tasteless'],
+    'too salty': ['too salty', 'salty'],
+    'too sweet': ['too sweet'],
+    'too oily': ['too oily', 'too greasy', 'greasy', 'oily'],
+    'took too long': ['too long', 'took ages', 'too slow', 'time consuming'],
+    'too complicated': ['too complicated', 'too hard', 'too difficult', 'complicated'],
+    'portion too small': ['too small', 'not enough', 'still hungry'],
+    'portion too big': ['too big', 'too much food', 'too large'],
+    'too expensive': ['too expensive', 'expensive'],
+}
+
+DISLIKE_WORDS = ['disliked', 'dislike', "didn't like", 'did not like', 'not good', 'hate', 'hated', 'awful',
+                 'bad', 'gross', 'horrible', 'terrible', 'not for me']
+LIKE_WORDS = ['liked', 'like', 'love', 'loved', 'great', 'good', 'tasty', 'delicious', 'amazing', 'yum']
+
+
+def get_table():
+    return tables.get_table(FEEDBACK_TABLE, FEEDBACK_REGION)
+
+
+def _contains(text, phrase):
+    return re.search(rf"(?<![a-z']){re.escape(phrase)}(?![a-z'])", text) is not None
+
+
+def classify(feedback):
+    """'Liked it but too spicy' -> ('liked', ['too spicy'])"""
+    text = ' '.join(str(feedback).lower().split())
+    complaints = [name for name, phrases in COMPLAINTS.items() if any(_contains(text, p) for p in phrases)]
+
+    sentiment = None
+    if any(_contains(text, word) for word in DISLIKE_WORDS):
+        sentiment = 'disliked'
+    elif any(_contains(text, word) for word in LIKE_WORDS):
+        sentiment = 'liked'
+    elif complaints:
+        sentiment = 'disliked'
+    return sentiment, complaints
+
+
+def _push(titles, title):
+    """Newest first, no duplicates, capped at MAX_TITLES"""
+    titles = [t for t in titles if t.lower() != title.lower()]
+    return ([title] + titles)[:MAX_TITLES]
+
+
+def apply_feedback(profile, recipe_title, feedback):
+    """Fold one piece of feedback into a profile dict, returning the new profile"""
+    profile = {
+        'likes': list(profile.get('likes', [])),
+        'dislikes': list(profile.get('dislikes', [])),
+        'complaints': dict(profile.get('complaints', {})),
+        'notes': list(profile.get('notes', [])),
+        'count': int(profile.get('count', 0)) + 1,
+    }
+    sentiment, complaints = classify(feedback)
+    title = str(recipe_title).strip()
+
+    if sentiment == 'liked':
+        profile['likes'] = _push(profile['likes'], title)
+        profile['dislikes'] = [t for t in profile['dislikes'] if t.lower() != title.lower()]
+    elif sentiment == 'disliked':
+        profile['dislikes'] = _push(profile['dislikes'], title)
+        profile['likes'] = [t for t in profile['likes'] if t.lower() != title.lower()]
+
+    for complaint in complaints:
+        profile['complaints'][complaint] = int(profile['complaints'].get(complaint, 0)) + 1
+
+    if not sentiment and not complaints:
+        #free text we could not classify, keep the latest few verbatim
+        profile['notes'] = ([f"{title}: {feedback}"] + profile['notes'])[:MAX_NOTES]
+    return profile
+
+
+def build_profile(feedbacks):
+    """Profile from a list of {"recipeTitle", "feedback"}, oldest first"""
+    profile = {}
+    for entry in feedbacks:
+        profile = apply_feedback(profile, entry.get('recipeTitle', ''), entry.get('feedback', ''))
+    return profile
+
+
+def prompt_profile(profile):
+    """Only the parts of a profile that shape generation"""
+    if not profile:
+        return {}
+    rv = {key: profile[key] for key in ('likes', 'dislikes', 'notes') if profile.get(key)}
+    complaints = {name: int(count) for name, count in (profile.get('complaints') or {}).items() if int(count)}
+    if complaints:
+        rv['complaints'] = dict(sorted(complaints.items(), key=lambda kv: (-kv[1], kv[0])))
+    return rv
+
+
+def describe_profile(profile):
+    parts = []
+    if profile.get('likes'):
+        parts.append(f"liked {', '.join(profile['likes'])}")
+    if profile.get('dislikes'):
+        parts.append(f"disliked {', '.join(profile['dislikes'])}")
+    if profile.get('complaints'):
+        parts.append("recurring complaints: " + ', '.join(f"{name} ({count}x)" for name, count in profile['complaints'].items()))
+    if profile.get('notes'):
+        parts.append(f"other comments: {'; '.join(profile['notes'])}")
+    return '; '.join(parts)
+
+
+def profile_key(user_id):
+    return {'user_id': user_id, 'sk': PROFILE_KEY}
+
+
+def _update_profile(user_id, fold):
+    """Read-modify-write of the profile item, guarded by its version"""
+    table = get_table()
+    for attempt in range(MAX_PROFILE_RETRIES):
+        item = table.get_item(Key=profile_key(user_id), ConsistentRead=True).get('Item') or {}
+        version = int(item.get('version', 0))
+        profile = fold(item)
+        try:
+            table.put_item(
+                Item={**profile_key(user_id), **profile, 'version': version + 1,
+                      'updated_at': datetime.now(timezone.utc).isoformat()},
+                ConditionExpression='attribute_not_exists(version) OR version = :version',
+                ExpressionAttributeValues={':version': version},
+            )
+            return profile
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            #someone else updated the profile first, fold into theirs
+            time.sleep(0.02 * (attempt + 1))
+    raise RuntimeError(f"Could not update feedback profile for {user_id}")
+
+
+def import_legacy(user_id, feedbacks):
+    """Copy the old list from the Users item into the store, sorted before any new entry"""
+    with get_table().batch_writer() as batch:
+        for i, entry in enumerate(feedbacks):
+            batch.put_item(Item={
+                'user_id': user_id,
+                'sk': f"{ENTRY_PREFIX}0000-legacy#{i:05d}",
+                'recipeTitle': entry.get('recipeTitle', ''),
+                'feedback': entry.get('feedback', ''),
+            })
+
+
+def add_feedback(user_id, recipe_title, feedback, legacy_feedbacks=None):
+    """Store one submission and fold it into the user's profile.
+
+    legacy_feedbacks, the old list from the Users item, is folded in first
+    when the profile does not exist yet."""
+    created_at = datetime.now(timezone.utc).isoformat()
+    get_table().put_item(Item={
+        'user_id': user_id,
+        'sk': f"{ENTRY_PREFIX}{created_at}#{uuid.uuid4().hex[:8]}",
+        'created_at': created_at,
+        'recipeTitle': recipe_title,
+        'feedback': feedback,
+    })
+
+    def fold(item):
+        profile = item if item else build_profile(legacy_feedbacks or [])
+        return apply_feedback(profile, recipe_title, feedback)
+
+    return _update_profile(user_id, fold)
+
+
+def list_feedback(user_id, limit=20, cursor=None):
+    """One page of a user's feedback, newest first; returns (items, next cursor)"""
+    query = {
+        'KeyConditionExpression': Key('user_id').eq(user_id) & Key('sk').begins_with(ENTRY_PREFIX),
+        'ScanIndexForward': False,
+        'Limit': max(1, min(int(limit), MAX_PAGE_SIZE)),
+    }
+    if cursor:
+        start_key = decode_cursor(cursor)
+        if start_key.get('user_id') != user_id:
+            raise ValueError("Invalid cursor")
+        query['ExclusiveStartKey'] = start_key
+
+    response = get_table().query(**query)
+    items = [{'recipeTitle': item.get('recipeTitle'), 'feedback': item.get('feedback'),
+              'created_at': item.get('created_at')} for item in response.get('Items', [])]
+    return items, encode_cursor(response.get('LastEvaluatedKey'))
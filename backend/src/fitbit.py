@@ -0,0 +1,204 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import src.tables as tables
+import src.request_timing as request_timing
+from src.ttl_cache import TTLCache
+
+# Fitbit activity for recipe generation. One pooled session with strict
+# timeouts, a circuit breaker so a Fitbit outage does not slow every
+# generation down, and a per-user daily cache of the step average so the
+# external call happens at most once a day per user.
+
+logger = logging.getLogger(__name__)
+
+FITBIT_API = 'https://api.fitbit.com'
+FITBIT_CONNECT_TIMEOUT = float(os.environ.get('FITBIT_CONNECT_TIMEOUT', 2))
+FITBIT_READ_TIMEOUT = float(os.environ.get('FITBIT_READ_TIMEOUT', 4))
+FITBIT_WINDOW_DAYS = 7
+FITBIT_BREAKER_FAILURES = int(os.environ.get('FITBIT_BREAKER_FAILURES', 3))
+FITBIT_BREAKER_RESET = float(os.environ.get('FITBIT_BREAKER_RESET', 60))
+
+# the aggregate is also kept on the user's user_preferences item, which
+# UserContext already loads, so other containers can reuse it for free
+PREFERENCES_TABLE = 'user_preferences'
+PREFERENCES_REGION = 'eu-north-1'
+STEPS_ATTRIBUTE = 'fitbit_steps'
+
+
+class CircuitBreaker:
+    """Opens after repeated failures and lets one trial call through after reset_after seconds"""
+
+    def __init__(self, max_failures=FITBIT_BREAKER_FAILURES, reset_after=FITBIT_BREAKER_RESET, clock=time.monotonic):
+        self.max_failures = max_failures
+        self.reset_after = reset_after
+        self._clock = clock
+        self._failures = 0
+        self._opened_at = None
+        #when the half-open trial call was let through, None when there is none in flight
+        self._trial_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if self._clock() - self._opened_at >= self.reset_after:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = self._clock()
+            if now - self._opened_at < self.reset_after:
+                return False
+            #everyone else waits for the trial, unless it never reported back
+            if self._trial_started is not None and now - self._trial_started < self.reset_after:
+                return False
+            self._trial_started = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.max_failures or self._opened_at is not None:
+                #a failed trial call re-opens straight away
+                self._opened_at = self._clock()
+            self._trial_started = None
+
+
+def _build_session():
+    session = requests.Session()
+    retry = Retry(total=1, backoff_factor=0.2, status_forcelist=[502, 503, 504], allowed_methods=['GET'])
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=10, max_retries=retry)
+    session.mount('https://', adapter)
+    return session
+
+
+def date_window(today=None, days=FITBIT_WINDOW_DAYS):
+    """The last `days` days ending today, as ISO dates"""
+    today = today or datetime.now(timezone.utc).date()
+    return (today - timedelta(days=days - 1)).isoformat(), today.isoformat()
+
+
+def _seconds_until_tomorrow():
+    now = datetime.now(timezone.utc)
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+    return max(60, (tomorrow - now).total_seconds())
+
+
+class FitbitClient:
+
+    def __init__(self, session=None, breaker=None, cache=None):
+        self.session = session or _build_session()
+        self.breaker = breaker or CircuitBreaker()
+        self.cache = cache or TTLCache(maxsize=4096, ttl=24 * 3600)
+        self._stats = {'requests': 0, 'failures': 0, 'short_circuited': 0, 'stored_hits': 0}
+
+    def fetch_average_steps(self, access_token, fitbit_user_id, start, end):
+        """One API call; None when Fitbit is unavailable or the token is rejected"""
+        if not self.breaker.allow():
+            self._stats['short_circuited'] += 1
+            return None
+
+        self._stats['requests'] += 1
+        try:
+            with request_timing.measure('fitbit'):
+                response = self.session.get(
+                    f'{FITBIT_API}/1/user/{fitbit_user_id or "-"}/activities/steps/date/{start}/{end}.json',
+                    headers={'Authorization': f'Bearer {access_token}'},
+                    timeout=(FITBIT_CONNECT_TIMEOUT, FITBIT_READ_TIMEOUT),
+                )
+        except requests.exceptions.RequestException as e:
+            self._stats['failures'] += 1
+            self.breaker.record_failure()
+            logger.warning(f"Fitbit request failed: {e}")
+            return None
+
+        if response.status_code in (401, 403):
+            # the user's token is bad, Fitbit itself is fine
+            self.breaker.record_success()
+            logger.info("Fitbit token rejected")
+            return None
+        if response.status_code >= 400:
+            self._stats['failures'] += 1
+            if response.status_code >= 500 or response.status_code == 429:
+                self.breaker.record_failure()
+            else:
+                #Fitbit answered, the request was wrong; this also ends a half-open trial
+                self.breaker.record_success()
+            logger.warning(f"Fitbit API error: {response.status_code}")
+            return None
+
+        self.breaker.record_success()
+        steps_data = response.json().get('activities-steps', [])
+        total_steps = sum(int(day['value']) for day in steps_data)
+        return round(total_steps / len(steps_data)) if steps_data else 0
+
+    def get_average_steps(self, access_token, fitbit_user_id, user_id=None, stored=None, today=None):
+        """Average daily steps over the last week, computed at most once a day per user"""
+        start, end = date_window(today)
+        window = f"{start}/{end}"
+        key = (fitbit_user_id, window)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        if stored and stored.get('window') == window:
+            self._stats['stored_hits'] += 1
+            avg_steps = int(stored['avg_steps'])
+            self.cache.set(key, avg_steps, ttl=_seconds_until_tomorrow())
+            return avg_steps
+
+        avg_steps = self.fetch_average_steps(access_token, fitbit_user_id, start, end)
+        if avg_steps is None:
+            return None
+
+        self.cache.set(key, avg_steps, ttl=_seconds_until_tomorrow())
+        if user_id:
+            self._store(user_id, window, avg_steps)
+        return avg_steps
+
+    def _store(self, user_id, window, avg_steps):
+        try:
+            tables.get_table(PREFERENCES_TABLE, PREFERENCES_REGION).update_item(
+                Key={'user_id': user_id},
+                UpdateExpression="SET #steps = :steps",
+                ExpressionAttributeNames={'#steps': STEPS_ATTRIBUTE},
+                ExpressionAttributeValues={':steps': {'window': window, 'avg_steps': avg_steps}},
+            )
+        except Exception as e:
+            logger.warning(f"Could not store Fitbit steps for {user_id}: {e}")
+
+    def clear(self):
+        self.cache.clear()
+        self.breaker.record_success()
+        for key in self._stats:
+            self._stats[key] = 0
+
+    def stats(self):
+        rv = dict(self._stats)
+        rv['breaker'] = self.breaker.state
+        rv['cache'] = self.cache.stats()
+        return rv
+
+
+client = FitbitClient()
+
+
+def get_average_steps(access_token, fitbit_user_id, user_id=None, stored=None):
+    return client.get_average_steps(access_token, fitbit_user_id, user_id=user_id, stored=stored)
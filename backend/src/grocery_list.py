@@ -0,0 +1,162 @@
+import re
+from collections import OrderedDict
+
+# Builds the grocery list on the server from the recipes' own ingredient
+# lines, so the result is the same every time for the same recipes instead
+# of depending on how the model merged things that day.
+
+UNITS = {
+    'g': ('g', 1), 'gram': ('g', 1), 'grams': ('g', 1),
+    'kg': ('g', 1000), 'kilogram': ('g', 1000), 'kilograms': ('g', 1000),
+    'ml': ('ml', 1), 'millilitre': ('ml', 1), 'milliliter': ('ml', 1),
+    'l': ('ml', 1000), 'litre': ('ml', 1000), 'liter': ('ml', 1000), 'litres': ('ml', 1000), 'liters': ('ml', 1000),
+    'tbsp': ('tbsp', 1), 'tablespoon': ('tbsp', 1), 'tablespoons': ('tbsp', 1),
+    'tsp': ('tsp', 1), 'teaspoon': ('tsp', 1), 'teaspoons': ('tsp', 1),
+    'cup': ('cup', 1), 'cups': ('cup', 1),
+    'oz': ('oz', 1), 'lb': ('lb', 1), 'lbs': ('lb', 1),
+    'clove': ('clove', 1), 'cloves': ('clove', 1),
+    'can': ('can', 1), 'cans': ('can', 1), 'tin': ('can', 1), 'tins': ('can', 1),
+    'slice': ('slice', 1), 'slices': ('slice', 1),
+    'piece': ('piece', 1), 'pieces': ('piece', 1),
+    'bunch': ('bunch', 1), 'handful': ('handful', 1), 'pinch': ('pinch', 1),
+}
+
+# checked in order, so "black pepper" is a spice before "pepper" is a vegetable
+CATEGORIES = [
+    ('Spices & Condiments', ['black pepper', 'salt', 'oil', 'sauce', 'vinegar', 'spice', 'cumin', 'paprika',
+                             'oregano', 'basil', 'thyme', 'stock', 'honey', 'sugar', 'mustard', 'mayonnaise',
+                             'ketchup', 'curry powder', 'chili flake', 'cinnamon']),
+    ('Dairy', ['milk', 'cheese', 'butter', 'yogurt', 'yoghurt', 'cream', 'egg', 'feta', 'mozzarella', 'parmesan']),
+    ('Meat', ['chicken', 'beef', 'pork', 'lamb', 'bacon', 'turkey', 'sausage', 'ham', 'mince', 'chorizo']),
+    ('Fish & Seafood', ['salmon', 'tuna', 'cod', 'prawn', 'shrimp', 'fish', 'mackerel', 'haddock']),
+    ('Legumes', ['lentil', 'chickpea', 'bean', 'tofu', 'tempeh']),
+    ('Grains', ['rice', 'pasta', 'spaghetti', 'bread', 'flour', 'oat', 'noodle', 'quinoa', 'couscous',
+                'tortilla', 'wrap', 'bulgur']),
+    ('Fruit', ['apple', 'banana', 'lemon', 'lime', 'orange', 'berry', 'berries', 'mango', 'avocado', 'grape']),
+    ('Vegetables', ['onion', 'garlic', 'tomato', 'pepper', 'carrot', 'spinach', 'lettuce', 'potato', 'broccoli',
+                    'mushroom', 'courgette', 'zucchini', 'cucumber', 'celery', 'leek', 'kale', 'cabbage', 'pea',
+                    'corn', 'aubergine', 'eggplant', 'ginger', 'chili', 'herb', 'coriander', 'parsley']),
+]
+
+_QUANTITY = re.compile(
+    r'^\s*(?P<amount>\d+(?:[.,]\d+)?(?:\s*/\s*\d+)?)(?:\s*-\s*\d+(?:[.,]\d+)?)?\s*'
+    r'(?P<unit>[a-zA-Z]+\b\.?)?\s*(?:of\s+)?(?P<name>.*)$'
+)
+
+
+def singular(word):
+    if len(word) <= 3 or word.endswith('ss'):
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith('oes'):
+        return word[:-2]
+    if word.endswith('s'):
+        return word[:-1]
+    return word
+
+
+def normalize_name(name):
+    name = re.sub(r'\(.*?\)', ' ', name.lower())
+    name = name.split(',')[0]
+    name = re.sub(r'[^a-z\s]', ' ', name)
+    words = [singular(w) for w in name.split() if w not in ('fresh', 'large', 'small', 'medium', 'chopped', 'diced',
+                                                              'sliced', 'minced', 'grated', 'to', 'taste', 'a', 'of',
+                                                              'can', 'tin', 'canned', 'tinned')]
+    return ' '.join(words)
+
+
+def _amount(text):
+    text = text.replace(',', '.').replace(' ', '')
+    if '/' in text:
+        num, den = text.split('/', 1)
+        return float(num) / float(den) if float(den) else 0.0
+    return float(text)
+
+
+def parse_ingredient(line):
+    """'200g chicken breast, diced' -> ('chicken breast', 200.0, 'g')"""
+    match = _QUANTITY.match(line)
+    if not match:
+        return normalize_name(line), None, None
+
+    amount = _amount(match.group('amount'))
+    unit = (match.group('unit') or '').rstrip('.').lower()
+    name = match.group('name')
+    if unit in UNITS:
+        unit, factor = UNITS[unit]
+        amount *= factor
+    elif unit:
+        #not a unit, it was the first word of the name ("2 onions")
+        name = f"{unit} {name}"
+        unit = None
+    else:
+        unit = None
+    return normalize_name(name), amount, unit
+
+
+def _matches(keyword, name, words):
+    if ' ' in keyword:
+        return f" {keyword} " in f" {name} "
+    #whole words, plus compounds like "blueberry" or "pineapple"
+    return any(word == keyword or (len(keyword) > 3 and word.endswith(keyword)) for word in words)
+
+
+def categorize(name):
+    words = name.split()
+    for category, keywords in CATEGORIES:
+        for keyword in keywords:
+            if _matches(keyword, name, words):
+                return category
+    return 'Other'
+
+
+def is_available(name, available):
+    """Exact match on normalized names; normalize_name already folds plurals ("onions" is "onion")"""
+    #"chicken" is not "chicken stock" and "pepper" is not "black pepper", partial matches drop things the user needs
+    name = normalize_name(name)
+    return bool(name) and any(name == normalize_name(other) for other in available)
+
+
+def _format_amount(amount, unit):
+    if unit == 'g' and amount >= 1000:
+        amount, unit = amount / 1000, 'kg'
+    elif unit == 'ml' and amount >= 1000:
+        amount, unit = amount / 1000, 'l'
+    number = f"{round(amount, 2):g}"
+    if unit in ('g', 'kg', 'ml', 'l'):
+        return f"{number}{unit}"
+    if unit:
+        return f"{number} {unit}{'s' if amount != 1 and unit not in ('oz', 'lb', 'tbsp', 'tsp') else ''}"
+    return number
+
+
+def build_grocery_list(recipes, available_ingredients):
+    """Merged list of everything the recipes need that the user does not already have"""
+    available = [normalize_name(name) for name in available_ingredients]
+    totals = OrderedDict()
+
+    for recipe in recipes:
+        for line in recipe.get('ingredients', []):
+            if not isinstance(line, str):
+                continue
+            name, amount, unit = parse_ingredient(line)
+            if not name or is_available(name, available):
+                continue
+            entry = totals.setdefault(name, OrderedDict())
+            if amount is None:
+                entry.setdefault(None, None)
+            else:
+                entry[unit] = (entry.get(unit) or 0) + amount
+
+    grocery_list = []
+    for name, amounts in totals.items():
+        parts = [_format_amount(amount, unit) for unit, amount in amounts.items() if amount is not None]
+        grocery_list.append({
+            'name': name,
+            'quantity': ' + '.join(parts) if parts else 'as needed',
+            'category': categorize(name),
+        })
+
+    grocery_list.sort(key=lambda item: (item['category'], item['name']))
+    return grocery_list
@@ -0,0 +1,133 @@
+import io
+import os
+import base64
+import binascii
+import hashlib
+import threading
+from src.ttl_cache import TTLCache
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, without it only exact matches are found
+    Image = None
+
+# Fridge photo analysis results keyed by a digest of the decoded image bytes.
+# The app falls back to the same bundled picture and retries on timeout, so
+# identical uploads are common and should not cost another gpt-4o call.
+# With Pillow installed a 64-bit difference hash also catches re-encoded or
+# resized copies of the same photo.
+
+IMAGE_CACHE_SIZE = int(os.environ.get('IMAGE_CACHE_SIZE', 256))
+IMAGE_CACHE_TTL = int(os.environ.get('IMAGE_CACHE_TTL', 6 * 3600))
+# max differing bits between two dHashes to count as the same photo, 0 turns matching off
+IMAGE_HASH_MAX_DISTANCE = int(os.environ.get('IMAGE_HASH_MAX_DISTANCE', 4))
+
+
+def decode_image(base64_image):
+    """Bytes of a base64 image, with or without a data: URL prefix"""
+    data = base64_image
+    if data.startswith('data:') and ',' in data:
+        data = data.split(',', 1)[1]
+    try:
+        return base64.b64decode(data, validate=False)
+    except (binascii.Error, ValueError):
+        #not valid base64, still hash what we were given
+        return base64_image.encode('utf-8')
+
+
+def difference_hash(image_bytes, size=8):
+    """64-bit dHash, or None when Pillow is missing or the bytes are not an image"""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            img.draft('L', (size * 8, size * 8))  # cheap downscale while decoding JPEGs
+            small = img.convert('L').resize((size + 1, size), Image.BILINEAR)
+            pixels = small.tobytes()
+    except Exception:
+        return None
+
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+class ImageAnalysisCache:
+
+    def __init__(self, maxsize=IMAGE_CACHE_SIZE, ttl=IMAGE_CACHE_TTL, max_distance=IMAGE_HASH_MAX_DISTANCE):
+        self._results = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._hashes = {}  # digest -> dhash, pruned alongside _results
+        self._lock = threading.Lock()
+        self.max_distance = max_distance
+        self._stats = {'exact_hits': 0, 'near_hits': 0, 'misses': 0}
+
+    def _keys(self, base64_image):
+        image_bytes = decode_image(base64_image)
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        dhash = difference_hash(image_bytes) if self.max_distance > 0 else None
+        return digest, dhash
+
+    def _nearest(self, dhash):
+        with self._lock:
+            candidates = list(self._hashes.items())
+        for digest, other in candidates:
+            if bin(dhash ^ other).count('1') <= self.max_distance:
+                result = self._results.get(digest)
+                if result is not None:
+                    return result
+                with self._lock:
+                    self._hashes.pop(digest, None)
+        return None
+
+    def lookup(self, base64_image):
+        """Returns (cached result or None, keys to pass to store())"""
+        keys = self._keys(base64_image)
+        digest, dhash = keys
+
+        result = self._results.get(digest)
+        if result is not None:
+            self._stats['exact_hits'] += 1
+            return result, keys
+
+        if dhash is not None:
+            result = self._nearest(dhash)
+            if result is not None:
+                self._stats['near_hits'] += 1
+                return result, keys
+
+        self._stats['misses'] += 1
+        return None, keys
+
+    def store(self, keys, result):
+        digest, dhash = keys
+        self._results.set(digest, result)
+        if dhash is not None:
+            with self._lock:
+                self._hashes[digest] = dhash
+                # keep the hash index no bigger than the result cache
+                while len(self._hashes) > self._results.maxsize:
+                    self._hashes.pop(next(iter(self._hashes)))
+
+    def clear(self):
+        self._results.clear()
+        with self._lock:
+            self._hashes.clear()
+        for key in self._stats:
+            self._stats[key] = 0
+
+    def stats(self):
+        hits = self._stats['exact_hits'] + self._stats['near_hits']
+        lookups = hits + self._stats['misses']
+        rv = dict(self._stats)
+        rv['hit_rate'] = round(hits / lookups, 4) if lookups else 0.0
+        rv['size'] = len(self._results)
+        rv['evictions'] = self._results.evictions
+        rv['perceptual_hashing'] = Image is not None and self.max_distance > 0
+        return rv
+
+
+cache = ImageAnalysisCache()
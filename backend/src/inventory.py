@@ -0,0 +1,139 @@
+import os
+import re
+import time
+import logging
+from boto3.dynamodb.conditions import Key
+import src.tables as tables
+from src.grocery_list import normalize_name
+
+# Per-user ingredient inventory, one item per ingredient. analyse_picture
+# returns relative expiries ("3 days") which mean nothing once stored, so
+# they are turned into absolute timestamps at ingest. The table is keyed by
+# (user_id, item_name) with a local secondary index on expires_at, so
+# generation can ask for just the soonest-expiring items.
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_TABLE = os.environ.get('INVENTORY_TABLE', 'UserInventory')
+INVENTORY_REGION = 'eu-west-1'
+EXPIRY_INDEX = 'expires_at-index'
+
+DAY = 24 * 3600
+# used when the model gives an expiry we cannot read
+UNKNOWN_EXPIRY_DAYS = 7
+# how long an expired item is still shown before it drops out
+EXPIRED_GRACE_DAYS = 1
+# DynamoDB TTL removes items this long after they expire
+EXPIRED_RETENTION_DAYS = 7
+INVENTORY_PROMPT_ITEMS = int(os.environ.get('INVENTORY_PROMPT_ITEMS', 40))
+
+
+def get_table():
+    return tables.get_table(INVENTORY_TABLE, INVENTORY_REGION)
+
+
+def expiry_days(text):
+    """'3 days' -> 3, '1 week' -> 7, 'today' -> 0; None when it can't be read"""
+    text = str(text).lower()
+    if 'today' in text or 'expired' in text:
+        return 0
+    if 'tomorrow' in text:
+        return 1
+    match = re.search(r'(\d+(?:\.\d+)?)\s*(?:-\s*\d+(?:\.\d+)?\s*)?(day|week|month|year)?', text)
+    if not match:
+        return None
+    days = float(match.group(1))
+    unit = match.group(2) or 'day'
+    return days * {'day': 1, 'week': 7, 'month': 30, 'year': 365}[unit]
+
+
+def relative_expiry(expires_at, now=None):
+    """Absolute expiry back to the "X days" wording the prompt uses"""
+    days = int((int(expires_at) - (now or time.time())) // DAY)
+    if days < 0:
+        return 'expired'
+    if days == 0:
+        return 'today'
+    return f"{days} day{'s' if days != 1 else ''}"
+
+
+def _scanned_items(foods, now):
+    """{item_name: item} for one scan; a name seen twice keeps the sooner expiry"""
+    items = {}
+    for food in foods:
+        if not isinstance(food, dict) or not food.get('name'):
+            continue
+        item_name = normalize_name(food['name'])
+        if not item_name:
+            continue
+        days = expiry_days(food.get('estimated_expiry', ''))
+        expires_at = int(now + (UNKNOWN_EXPIRY_DAYS if days is None else days) * DAY)
+        if item_name in items and items[item_name]['expires_at'] <= expires_at:
+            continue
+        items[item_name] = {
+            'item_name': item_name,
+            'display_name': str(food['name']).strip(),
+            'expires_at': expires_at,
+        }
+    return items
+
+
+def _existing_items(user_id):
+    table = get_table()
+    query = {'KeyConditionExpression': Key('user_id').eq(user_id)}
+    items = {}
+    while True:
+        response = table.query(**query)
+        for item in response.get('Items', []):
+            items[item['item_name']] = item
+        if 'LastEvaluatedKey' not in response:
+            return items
+        query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def merge_scan(user_id, scan, now=None):
+    """Merge one analyse_picture result into the inventory; returns the number of items written.
+
+    Items missing from the scan are kept, since a photo rarely shows the whole
+    fridge. A re-scanned item keeps its earlier expiry unless that has already
+    passed, in which case it counts as a new purchase."""
+    now = now or time.time()
+    foods = scan.get('foods', []) if isinstance(scan, dict) else scan or []
+    scanned = _scanned_items(foods, now)
+    if not scanned:
+        return 0
+
+    existing = _existing_items(user_id)
+    written = 0
+    with get_table().batch_writer() as batch:
+        for item_name, item in scanned.items():
+            old = existing.get(item_name)
+            if old and now <= int(old['expires_at']) <= item['expires_at']:
+                item['expires_at'] = int(old['expires_at'])
+            batch.put_item(Item={
+                'user_id': user_id,
+                **item,
+                'first_seen_at': int(old['first_seen_at']) if old and 'first_seen_at' in old else int(now),
+                'last_seen_at': int(now),
+                'ttl': item['expires_at'] + EXPIRED_RETENTION_DAYS * DAY,
+            })
+            written += 1
+    logger.info(f"Inventory for {user_id}: {written} scanned, {len(existing)} already stored")
+    return written
+
+
+def soonest(user_id, limit=INVENTORY_PROMPT_ITEMS, now=None):
+    """The `limit` soonest-expiring items, in the {"name", "estimated_expiry"} shape the prompt uses"""
+    now = now or time.time()
+    response = get_table().query(
+        IndexName=EXPIRY_INDEX,
+        KeyConditionExpression=Key('user_id').eq(user_id) & Key('expires_at').gte(int(now - EXPIRED_GRACE_DAYS * DAY)),
+        ProjectionExpression='display_name, expires_at',
+        ScanIndexForward=True,
+        Limit=limit,
+    )
+    return [{
+        'name': item['display_name'],
+        'estimated_expiry': relative_expiry(item['expires_at'], now),
+        'expires_at': int(item['expires_at']),
+    } for item in response.get('Items', [])]
@@ -0,0 +1,333 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, request, jsonify, current_app
+import src.aws_clients as aws_clients
+import src.tables as tables
+import src.session_cache as session_cache
+
+# Async job mode for the slow LLM endpoints. Submitting work returns a job id
+# straight away, a worker makes the model call and stores the result, and the
+# client polls /jobs/<id>. The store and the queue sit behind small interfaces
+# so the same flow runs in-process (memory or SQLite) for offline testing and
+# on DynamoDB + async Lambda invokes when deployed.
+
+logger = logging.getLogger(__name__)
+
+jobs_blueprint = Blueprint('jobs', __name__)
+
+JOB_BACKEND = os.environ.get('JOB_BACKEND', 'aws' if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') else 'local')
+JOBS_TABLE = os.environ.get('JOBS_TABLE', 'Jobs')
+JOBS_REGION = 'eu-west-1'
+JOBS_SQLITE_PATH = os.environ.get('JOBS_SQLITE_PATH', '/tmp/lazycook_jobs.db')
+JOB_PAYLOAD_BUCKET = os.environ.get('JOB_PAYLOAD_BUCKET')
+JOB_TTL = int(os.environ.get('JOB_TTL', 24 * 3600))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+
+# DynamoDB items top out at 400KB, bigger payloads (photos) go to S3
+MAX_INLINE_PAYLOAD = 300 * 1024
+
+# key that marks a lambda event as "run this job" rather than an HTTP request
+JOB_EVENT_KEY = 'lazycook_job'
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+
+_handlers = {}
+
+
+class PayloadTooLarge(ValueError):
+    """The job payload cannot be stored, the route answers 413"""
+
+
+def register_handler(kind, fn):
+    """fn(payload) -> (result dict, http status) runs the actual work for a job kind"""
+    _handlers[kind] = fn
+
+
+class JobStore(ABC):
+    """Keeps job status, payload and result"""
+
+    @abstractmethod
+    def create(self, job):
+        pass
+
+    @abstractmethod
+    def update(self, job_id, **fields):
+        pass
+
+    @abstractmethod
+    def get(self, job_id):
+        pass
+
+
+class MemoryJobStore(JobStore):
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job):
+        with self._lock:
+            self._jobs[job['job_id']] = dict(job)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+
+class SQLiteJobStore(JobStore):
+    """Local stand-in that survives restarts, handy for load tests on a laptop"""
+
+    def __init__(self, path=JOBS_SQLITE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def create(self, job):
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT INTO jobs (job_id, data) VALUES (?, ?)", (job['job_id'], json.dumps(job)))
+
+    def update(self, job_id, **fields):
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            job = json.loads(row[0])
+            job.update(fields)
+            conn.execute("UPDATE jobs SET data = ? WHERE job_id = ?", (json.dumps(job), job_id))
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+class DynamoDBJobStore(JobStore):
+    """Jobs table keyed on job_id, payload/result kept as JSON strings"""
+
+    def __init__(self, table_name=JOBS_TABLE, region=JOBS_REGION, payload_bucket=JOB_PAYLOAD_BUCKET):
+        self.table_name = table_name
+        self.region = region
+        self.payload_bucket = payload_bucket
+
+    def _table(self):
+        return tables.get_table(self.table_name, self.region)
+
+    def _encode(self, job):
+        item = {k: v for k, v in job.items() if k not in ('payload', 'result')}
+        payload = json.dumps(job.get('payload'))
+        if len(payload) > MAX_INLINE_PAYLOAD:
+            if not self.payload_bucket:
+                logger.warning("Job payload over the DynamoDB limit and no JOB_PAYLOAD_BUCKET configured")
+                raise PayloadTooLarge(f"Request too large to run as a job (over {MAX_INLINE_PAYLOAD // 1024}KB), "
+                                      "send it without async")
+            key = f"jobs/{job['job_id']}.json"
+            aws_clients.get_client('s3', self.region).put_object(
+                Bucket=self.payload_bucket, Key=key, Body=payload.encode('utf-8'))
+            item['payload_s3_key'] = key
+        else:
+            item['payload'] = payload
+        item['ttl'] = int(time.time()) + JOB_TTL
+        return item
+
+    def _decode(self, item):
+        job = dict(item)
+        if 'payload_s3_key' in job:
+            body = aws_clients.get_client('s3', self.region).get_object(
+                Bucket=self.payload_bucket, Key=job.pop('payload_s3_key'))['Body'].read()
+            job['payload'] = json.loads(body)
+        elif 'payload' in job:
+            job['payload'] = json.loads(job['payload'])
+        if 'result' in job:
+            job['result'] = json.loads(job['result'])
+        if 'status_code' in job:
+            job['status_code'] = int(job['status_code'])
+        return job
+
+    def create(self, job):
+        self._table().put_item(Item=self._encode(job))
+
+    def update(self, job_id, **fields):
+        if 'result' in fields:
+            fields['result'] = json.dumps(fields['result'])
+        names = {f"#{k}": k for k in fields}
+        values = {f":{k}": v for k, v in fields.items()}
+        self._table().update_item(
+            Key={'job_id': job_id},
+            UpdateExpression="SET " + ", ".join(f"#{k} = :{k}" for k in fields),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+
+    def get(self, job_id):
+        item = self._table().get_item(Key={'job_id': job_id}).get('Item')
+        return self._decode(item) if item else None
+
+
+class JobQueue(ABC):
+    """Hands a stored job to a worker"""
+
+    @abstractmethod
+    def enqueue(self, job_id):
+        pass
+
+
+class ThreadJobQueue(JobQueue):
+    """In-process worker pool, only for local runs since Lambda freezes after the response"""
+
+    def __init__(self, workers=JOB_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job-worker')
+
+    def enqueue(self, job_id):
+        app = current_app._get_current_object()
+
+        def work():
+            with app.app_context():
+                run_job(job_id)
+
+        return self._executor.submit(work)
+
+
+class LambdaJobQueue(JobQueue):
+    """Re-invokes this function asynchronously with a job event"""
+
+    def __init__(self, function_name=None, region=JOBS_REGION):
+        self.function_name = function_name or os.environ.get('AWS_LAMBDA_FUNCTION_NAME')
+        self.region = region
+
+    def enqueue(self, job_id):
+        aws_clients.get_client('lambda', self.region).invoke(
+            FunctionName=self.function_name,
+            InvocationType='Event',
+            Payload=json.dumps({JOB_EVENT_KEY: job_id}).encode('utf-8'),
+        )
+
+
+_store = None
+_queue = None
+
+
+def _build_backend(name):
+    if name == 'local':
+        return MemoryJobStore(), ThreadJobQueue()
+    if name == 'sqlite':
+        return SQLiteJobStore(), ThreadJobQueue()
+    if name == 'aws':
+        return DynamoDBJobStore(), LambdaJobQueue()
+    raise ValueError(f"Unknown JOB_BACKEND: {name}")
+
+
+def get_backend():
+    global _store, _queue
+    if _store is None:
+        _store, _queue = _build_backend(JOB_BACKEND)
+    return _store, _queue
+
+
+def set_backend(store, queue):
+    global _store, _queue
+    _store, _queue = store, queue
+
+
+def submit(kind, user_id, payload):
+    if kind not in _handlers:
+        raise ValueError(f"No job handler registered for {kind}")
+
+    store, queue = get_backend()
+    now = int(time.time())
+    job = {
+        'job_id': uuid.uuid4().hex,
+        'kind': kind,
+        'user_id': user_id,
+        'status': QUEUED,
+        'payload': payload,
+        'created_at': now,
+        'updated_at': now,
+    }
+    store.create(job)
+    queue.enqueue(job['job_id'])
+    return job
+
+
+def run_job(job_id):
+    store, _ = get_backend()
+    job = store.get(job_id)
+    if not job:
+        logger.error(f"Job {job_id} not found")
+        return
+
+    store.update(job_id, status=RUNNING, updated_at=int(time.time()))
+    try:
+        result, status_code = _handlers[job['kind']](job['payload'])
+        status = SUCCEEDED if status_code < 400 else FAILED
+        store.update(job_id, status=status, status_code=status_code, result=result, updated_at=int(time.time()))
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {e}", exc_info=True)
+        store.update(job_id, status=FAILED, status_code=500, result={'error': str(e)}, updated_at=int(time.time()))
+
+
+def is_job_event(event):
+    return isinstance(event, dict) and JOB_EVENT_KEY in event
+
+
+def handle_job_event(event, app):
+    with app.app_context():
+        run_job(event[JOB_EVENT_KEY])
+    return {'job_id': event[JOB_EVENT_KEY]}
+
+
+def wants_async(data):
+    #clients opt in with {"async": true}, ?async=1 or Prefer: respond-async
+    if isinstance(data, dict) and data.get('async') in (True, 'true', '1', 1):
+        return True
+    if request.args.get('async') in ('1', 'true'):
+        return True
+    return 'respond-async' in request.headers.get('Prefer', '')
+
+
+def accepted(job):
+    return jsonify({
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'status_url': f"/jobs/{job['job_id']}",
+    }), 202
+
+
+@jobs_blueprint.route('/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    try:
+        session_id = request.args.get('sessionId') or request.headers.get('X-Session-Id')
+        if not session_id:
+            return jsonify({'error': 'Session ID is required!'}), 400
+
+        user_id = session_cache.resolve_user_id(session_id)
+        if not user_id:
+            return jsonify({'error': 'Invalid session ID'}), 400
+
+        store, _ = get_backend()
+        job = store.get(job_id)
+        #do not reveal other users' jobs
+        if not job or job.get('user_id') != user_id:
+            return jsonify({'error': 'Job not found'}), 404
+
+        body = {'job_id': job_id, 'status': job['status']}
+        if job['status'] in (SUCCEEDED, FAILED):
+            body['result'] = job.get('result')
+            body['status_code'] = job.get('status_code')
+        return jsonify(body)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,78 @@
+import json
+
+
+class JSONArrayStreamParser:
+    """Pulls complete objects out of one top-level array while the JSON text is still arriving.
+
+    Feed it the model's deltas; every time an object inside the named array
+    closes it is parsed and returned, long before the whole document is done.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.buffer = []
+        self._text = ''
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_key = None
+        self._in_array = False
+        self._object_start = None
+
+    def feed(self, chunk):
+        if not chunk:
+            return []
+        self.buffer.append(chunk)
+        self._text += chunk
+        completed = []
+        text = self._text
+
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._string_start is not None:
+                        #only strings directly in the top-level object can be keys we care about
+                        self._last_key = json.loads(text[self._string_start:i + 1])
+                        self._string_start = None
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    self._string_start = i
+            elif ch in '{[':
+                self._depth += 1
+                if ch == '[' and self._depth == 2 and self._last_key == self.key:
+                    self._in_array = True
+                elif ch == '{' and self._in_array and self._depth == 3:
+                    self._object_start = i
+            elif ch in '}]':
+                if ch == '}' and self._in_array and self._depth == 3 and self._object_start is not None:
+                    completed.append(json.loads(text[self._object_start:i + 1]))
+                    self._object_start = None
+                elif ch == ']' and self._in_array and self._depth == 2:
+                    self._in_array = False
+                self._depth -= 1
+
+        self._pos = len(text)
+        # everything before the open object (if any) has been consumed, trim it
+        keep_from = self._object_start if self._object_start is not None else self._pos
+        if keep_from > 0 and (self._string_start is None):
+            self._text = text[keep_from:]
+            self._pos -= keep_from
+            if self._object_start is not None:
+                self._object_start -= keep_from
+        return completed
+
+    def document(self):
+        """Parse the full text once the stream has finished"""
+        return json.loads(''.join(self.buffer))
@@ -0,0 +1,179 @@
+import gc
+import os
+import time
+import random
+import logging
+import src.tables as tables
+import src.aws_clients as aws_clients
+import src.openai_client as openai_client
+import src.session_cache as session_cache
+import src.meal_plan_cache as meal_plan_cache
+import src.fitbit as fitbit
+import src.log_setup as log_setup
+
+try:
+    import snapshot_restore_py
+except ImportError:  # only there on SnapStart-enabled runtimes
+    snapshot_restore_py = None
+
+# Container lifecycle for the Lambda. init_app() does the expensive setup
+# (URL matcher, JSON provider, boto3 clients, caches) during the init phase,
+# before the first request pays for it. Scheduled keep-warm pings are
+# answered without going through Flask. On SnapStart the snapshot hooks drop
+# what must not be shared between restored copies: open connections, the
+# cached OpenAI key, session lookups and the random seed.
+
+logger = logging.getLogger(__name__)
+
+# do the setup at import time, i.e. in Lambda's init phase
+LIFECYCLE_INIT = os.environ.get('LIFECYCLE_INIT', '1') == '1'
+# fetch the OpenAI key right after a restore instead of on first use
+RESTORE_PREFETCH_SECRETS = os.environ.get('RESTORE_PREFETCH_SECRETS', '0') == '1'
+
+# keep-warm events: {"warmup": true}, serverless-plugin-warmup, or an EventBridge schedule
+WARMUP_EVENT_KEY = 'warmup'
+WARMUP_SOURCES = ('serverless-plugin-warmup',)
+
+# the clients and tables every route needs, built during init
+INIT_REGIONS = ('eu-west-1', 'eu-north-1')
+INIT_TABLES = [
+    ('Users', 'eu-west-1'),
+    ('UserSessions', 'eu-west-1'),
+    ('user_preferences', 'eu-north-1'),
+    ('food_preferences', 'eu-north-1'),
+]
+INIT_CLIENTS = [
+    ('secretsmanager', openai_client.SECRET_REGION),
+]
+
+_app = None
+_stats = {
+    'initialized': False,
+    'init_ms': None,
+    'init_stages_ms': {},
+    'warmups': 0,
+    'snapshots': 0,
+    'restores': 0,
+    'snapshot_hooks': False,
+}
+
+
+def _step(name, fn):
+    #a failed step is left to happen lazily on first use, as before
+    started = time.perf_counter()
+    try:
+        fn()
+    except Exception as e:
+        logger.warning(f"Lifecycle init step {name} failed: {e}")
+    _stats['init_stages_ms'][name] = round((time.perf_counter() - started) * 1000, 2)
+
+
+def _prepare_routing(app):
+    #werkzeug compiles the rule matcher on the first match
+    app.url_map.update()
+    adapter = app.url_map.bind('localhost')
+    try:
+        adapter.match('/', method='GET')
+    except Exception:
+        pass
+
+
+def _prepare_json(app):
+    app.json.loads(app.json.dumps({'warm': [1, 'a', None]}))
+
+
+def _prepare_aws_clients():
+    for region in INIT_REGIONS:
+        tables.get_resource(region)
+    for table_name, region in INIT_TABLES:
+        tables.get_table(table_name, region)
+    for service, region in INIT_CLIENTS:
+        aws_clients.get_client(service, region)
+
+
+def _prepare_caches():
+    meal_plan_cache.get_cache()
+
+
+def initialize(app=None):
+    """Build the URL matcher, JSON provider, AWS clients and caches ahead of the first request"""
+    app = app or _app
+    started = time.perf_counter()
+    if app is not None:
+        _step('routing', lambda: _prepare_routing(app))
+        _step('json', lambda: _prepare_json(app))
+    _step('aws_clients', _prepare_aws_clients)
+    _step('caches', _prepare_caches)
+    _stats['initialized'] = True
+    _stats['init_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    logger.debug(f"Lifecycle init took {_stats['init_ms']}ms: {_stats['init_stages_ms']}")
+    return _stats['init_ms']
+
+
+def is_warmup_event(event):
+    if not isinstance(event, dict):
+        return False
+    if event.get(WARMUP_EVENT_KEY) or event.get('source') in WARMUP_SOURCES:
+        return True
+    return event.get('source') == 'aws.events' and event.get('detail-type') == 'Scheduled Event'
+
+
+def handle_warmup(event, context=None):
+    """Answer a keep-warm ping without building a WSGI environ"""
+    cold = not _stats['initialized']
+    if cold:
+        initialize()
+    _stats['warmups'] += 1
+    return {'warmed': True, 'cold': cold, 'init_ms': _stats['init_ms']}
+
+
+def before_snapshot():
+    """Runs once before SnapStart takes the snapshot"""
+    if not _stats['initialized']:
+        initialize()
+    log_setup.flush()
+    gc.collect()
+    _stats['snapshots'] += 1
+
+
+def after_restore():
+    """Runs in every copy restored from the snapshot, before its first request"""
+    #connections in the snapshot are dead, and every copy would share them
+    aws_clients.reset()
+    fitbit.client.session.close()
+    fitbit.client.session = fitbit._build_session()
+    _step('aws_clients', _prepare_aws_clients)
+
+    #the key may have been rotated since the snapshot was taken
+    openai_client.provider.invalidate()
+    if RESTORE_PREFETCH_SECRETS:
+        _step('secrets', openai_client.get_client)
+
+    #cached session lookups may have expired in the meantime
+    session_cache.clear()
+    #otherwise every restored copy draws the same random numbers
+    random.seed()
+    _stats['restores'] += 1
+
+
+def register_snapshot_hooks():
+    if snapshot_restore_py is None:
+        return False
+    snapshot_restore_py.register_before_snapshot(before_snapshot)
+    snapshot_restore_py.register_after_restore(after_restore)
+    _stats['snapshot_hooks'] = True
+    return True
+
+
+def init_app(app, initialize_now=LIFECYCLE_INIT):
+    global _app
+    _app = app
+    register_snapshot_hooks()
+    if initialize_now:
+        initialize(app)
+
+
+def stats():
+    rv = dict(_stats)
+    rv['init_stages_ms'] = dict(_stats['init_stages_ms'])
+    return rv
@@ -0,0 +1,189 @@
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+import src.request_timing as request_timing
+
+# Logging for the Lambda. Records are put on a queue by the request thread
+# and written out as JSON lines by a QueueListener thread, so log I/O does
+# not add to request latency. Long messages are truncated before they are
+# queued and DEBUG records are sampled, which keeps CloudWatch ingestion
+# down. Library loggers (botocore above all) get their own levels instead
+# of inheriting a global DEBUG.
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+# per-logger levels, "name=LEVEL,name=LEVEL"
+LOG_LEVELS = os.environ.get('LOG_LEVELS', 'botocore=WARNING,boto3=WARNING,urllib3=WARNING,openai=WARNING,httpx=WARNING')
+LOG_MAX_MESSAGE_CHARS = int(os.environ.get('LOG_MAX_MESSAGE_CHARS', 2000))
+# share of DEBUG records that are kept
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0.1))
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+# longest the handler waits for the queue to drain before returning, Lambda freezes the process after;
+# whatever is left is written when the next invocation thaws it
+LOG_FLUSH_TIMEOUT = float(os.environ.get('LOG_FLUSH_TIMEOUT', 2))
+# time left to the invocation that the flush never eats into, so it cannot cause a timeout
+LOG_FLUSH_MARGIN = float(os.environ.get('LOG_FLUSH_MARGIN', 0.2))
+
+# root handlers replaced by the queue, other ones (e.g. pytest's) are left alone
+RUNTIME_HANDLER_MODULES = ('logging', 'bootstrap', 'awslambdaric')
+
+_listener = None
+_queue = None
+_dropped = 0
+
+
+class StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is at the time, Lambda's log stream"""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+def truncate(message, limit=LOG_MAX_MESSAGE_CHARS):
+    if limit and len(message) > limit:
+        return f"{message[:limit]}... [{len(message) - limit} more chars]"
+    return message
+
+
+def parse_levels(text):
+    """'botocore=WARNING,src=DEBUG' -> {'botocore': 30, 'src': 10}"""
+    levels = {}
+    for part in (text or '').split(','):
+        name, _, level = part.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps every record at INFO and above, and a `rate` share of the ones below"""
+
+    def __init__(self, rate=LOG_DEBUG_SAMPLE_RATE, rng=None):
+        super().__init__()
+        self.rate = rate
+        self.rng = rng or random.Random()
+
+    def filter(self, record):
+        return record.levelno >= logging.INFO or self.rng.random() < self.rate
+
+
+class TruncatingQueueHandler(logging.handlers.QueueHandler):
+    """Queues a trimmed copy of the record; JSON encoding and the write happen on the listener thread"""
+
+    def prepare(self, record):
+        #args and tracebacks must be resolved here, they may change or be gone by the time the listener runs
+        message = truncate(record.getMessage())
+        record = copy.copy(record)
+        record.msg, record.args = message, None
+        if record.exc_info:
+            record.exc_text = truncate(logging.Formatter().formatException(record.exc_info), 4 * LOG_MAX_MESSAGE_CHARS)
+            record.exc_info = None
+        timing = request_timing.current()
+        record.request_id = timing.request_id if timing else None
+        return record
+
+    def enqueue(self, record):
+        global _dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # never block a request on logging
+            _dropped += 1
+
+
+def configure(level=LOG_LEVEL, levels=LOG_LEVELS, stream=None, sample_rate=LOG_DEBUG_SAMPLE_RATE):
+    """Route the root logger through the queue; calling it again reconfigures"""
+    global _listener, _queue
+    stop()
+
+    _queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    output = logging.StreamHandler(stream) if stream is not None else StdoutHandler()
+    output.setFormatter(JSONFormatter())
+    _listener = logging.handlers.QueueListener(_queue, output, respect_handler_level=False)
+
+    handler = TruncatingQueueHandler(_queue)
+    handler.addFilter(SamplingFilter(sample_rate))
+    root = logging.getLogger()
+    # Lambda's runtime (and basicConfig) install blocking handlers on the root logger
+    for existing in list(root.handlers):
+        if type(existing).__module__.startswith(RUNTIME_HANDLER_MODULES):
+            root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    for name, logger_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(logger_level)
+
+    _listener.start()
+    return handler
+
+
+def flush_timeout(context=None, timeout=LOG_FLUSH_TIMEOUT, margin=LOG_FLUSH_MARGIN):
+    """LOG_FLUSH_TIMEOUT, cut down to what the Lambda invocation has left"""
+    remaining = getattr(context, 'get_remaining_time_in_millis', None)
+    if remaining is None:
+        return timeout
+    return max(0.0, min(timeout, remaining() / 1000 - margin))
+
+
+def flush(timeout=None, context=None):
+    """Wait until the listener has written everything queued, or the timeout; True when the queue drained"""
+    pending = _queue
+    if pending is None or not pending.unfinished_tasks:
+        return True
+    if timeout is None:
+        timeout = flush_timeout(context)
+    #the listener calls task_done() per record, which wakes this up, no polling
+    with pending.all_tasks_done:
+        return pending.all_tasks_done.wait_for(lambda: not pending.unfinished_tasks, timeout)
+
+
+def stop():
+    """Write out everything queued and stop the listener thread"""
+    global _listener, _queue
+    if _listener is not None:
+        _listener.stop()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, TruncatingQueueHandler):
+            root.removeHandler(handler)
+    _listener = None
+    _queue = None
+
+
+def stats():
+    return {
+        'queued': _queue.qsize() if _queue is not None else 0,
+        'dropped': _dropped,
+        'debug_sample_rate': LOG_DEBUG_SAMPLE_RATE,
+    }
+
+
+atexit.register(stop)
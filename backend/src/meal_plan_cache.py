@@ -0,0 +1,233 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from decimal import Decimal
+import src.tables as tables
+from src.ttl_cache import TTLCache
+
+# Meal plans keyed by a canonical hash of everything that goes into the
+# prompt. When nothing has changed since the last generation (the app's
+# reload paths do this a lot) the stored plan is returned instead of
+# calling gpt-4o again.
+
+logger = logging.getLogger(__name__)
+
+# bump when the prompt changes so old plans stop matching
+PROMPT_VERSION = 3
+
+MEAL_PLAN_CACHE_TTL = int(os.environ.get('MEAL_PLAN_CACHE_TTL', 12 * 3600))
+MEAL_PLAN_CACHE_SIZE = int(os.environ.get('MEAL_PLAN_CACHE_SIZE', 256))
+MEAL_PLAN_CACHE_TIER = os.environ.get(
+    'MEAL_PLAN_CACHE_TIER', 'dynamodb' if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') else 'file')
+MEAL_PLAN_CACHE_TABLE = os.environ.get('MEAL_PLAN_CACHE_TABLE', 'MealPlanCache')
+MEAL_PLAN_CACHE_REGION = 'eu-west-1'
+MEAL_PLAN_CACHE_DIR = os.environ.get('MEAL_PLAN_CACHE_DIR', '/tmp/lazycook_meal_plans')
+MEAL_PLAN_CACHE_MAX_FILES = int(os.environ.get('MEAL_PLAN_CACHE_MAX_FILES', 1000))
+
+
+def normalize(value):
+    """Turn DynamoDB/JSON values into a canonical form so equal inputs hash equally"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, dict):
+        return {str(k): normalize(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted((normalize(v) for v in value), key=lambda v: json.dumps(v, sort_keys=True))
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def cache_key(**inputs):
+    inputs['prompt_version'] = PROMPT_VERSION
+    canonical = json.dumps(normalize(inputs), sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class CacheBackend(ABC):
+
+    @abstractmethod
+    def get(self, key):
+        pass
+
+    @abstractmethod
+    def set(self, key, value, ttl):
+        pass
+
+    @abstractmethod
+    def delete(self, key):
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    """Per-container LRU, evicts by entry count and TTL"""
+
+    def __init__(self, maxsize=MEAL_PLAN_CACHE_SIZE):
+        self._cache = TTLCache(maxsize=maxsize, ttl=MEAL_PLAN_CACHE_TTL)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, ttl):
+        self._cache.set(key, value, ttl=ttl)
+
+    def delete(self, key):
+        self._cache.pop(key)
+
+
+class FileBackend(CacheBackend):
+    """One JSON file per plan, for local runs; oldest files are pruned past max_files"""
+
+    def __init__(self, directory=MEAL_PLAN_CACHE_DIR, max_files=MEAL_PLAN_CACHE_MAX_FILES):
+        self.directory = directory
+        self.max_files = max_files
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry['expires_at'] <= time.time():
+            self.delete(key)
+            return None
+        return entry['value']
+
+    def set(self, key, value, ttl):
+        tmp = self._path(key) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'expires_at': time.time() + ttl, 'value': value}, f)
+        os.replace(tmp, self._path(key))
+        self._prune()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _prune(self):
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.json')]
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.max_files]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class DynamoDBBackend(CacheBackend):
+    """Shared across containers; DynamoDB TTL handles eviction on the `ttl` attribute"""
+
+    def __init__(self, table_name=MEAL_PLAN_CACHE_TABLE, region=MEAL_PLAN_CACHE_REGION):
+        self.table_name = table_name
+        self.region = region
+
+    def _table(self):
+        return tables.get_table(self.table_name, self.region)
+
+    def get(self, key):
+        item = self._table().get_item(Key={'cache_key': key}).get('Item')
+        if not item or int(item.get('ttl', 0)) <= time.time():
+            return None
+        return json.loads(item['value'])
+
+    def set(self, key, value, ttl):
+        self._table().put_item(Item={
+            'cache_key': key,
+            'value': json.dumps(value),
+            'ttl': int(time.time() + ttl),
+        })
+
+    def delete(self, key):
+        self._table().delete_item(Key={'cache_key': key})
+
+
+class TieredCache:
+    """Checks each backend in order and backfills the faster tiers on a hit"""
+
+    def __init__(self, backends, ttl=MEAL_PLAN_CACHE_TTL):
+        self.backends = backends
+        self.ttl = ttl
+        self._stats = {'hits': 0, 'misses': 0, 'errors': 0, 'tier_hits': [0] * len(backends)}
+
+    def get(self, key):
+        for i, backend in enumerate(self.backends):
+            try:
+                value = backend.get(key)
+            except Exception as e:
+                #a broken tier should never fail the request
+                self._stats['errors'] += 1
+                logger.warning(f"Meal plan cache tier {type(backend).__name__} failed: {e}")
+                continue
+            if value is not None:
+                self._stats['hits'] += 1
+                self._stats['tier_hits'][i] += 1
+                for faster in self.backends[:i]:
+                    self._safe(faster.set, key, value, self.ttl)
+                return value
+        self._stats['misses'] += 1
+        return None
+
+    def set(self, key, value):
+        for backend in self.backends:
+            self._safe(backend.set, key, value, self.ttl)
+
+    def delete(self, key):
+        for backend in self.backends:
+            self._safe(backend.delete, key)
+
+    def _safe(self, fn, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            self._stats['errors'] += 1
+            logger.warning(f"Meal plan cache write failed: {e}")
+
+    def stats(self):
+        lookups = self._stats['hits'] + self._stats['misses']
+        rv = dict(self._stats, tier_hits=list(self._stats['tier_hits']))
+        rv['tiers'] = [type(b).__name__ for b in self.backends]
+        rv['hit_rate'] = round(self._stats['hits'] / lookups, 4) if lookups else 0.0
+        return rv
+
+
+def _build_cache(tier=MEAL_PLAN_CACHE_TIER):
+    backends = [MemoryBackend()]
+    if tier == 'dynamodb':
+        backends.append(DynamoDBBackend())
+    elif tier == 'file':
+        backends.append(FileBackend())
+    elif tier != 'memory':
+        raise ValueError(f"Unknown MEAL_PLAN_CACHE_TIER: {tier}")
+    return TieredCache(backends)
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = _build_cache()
+    return _cache
+
+
+def set_cache(cache):
+    global _cache
+    _cache = cache
+
+
+def stats():
+    return get_cache().stats() if _cache is not None else {}
@@ -1,62 +1,43 @@
 import base64
+import copy
+import os
 import time
+import logging
 from urllib.parse import parse_qs, urlparse
-import boto3
-from botocore.exceptions import ClientError
 import json
-from flask import Blueprint, request, jsonify
-from openai import OpenAI
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from pydantic import BaseModel
 from typing import List
-import src.user_preferences_bp as user_preferences_bp
+import src.tables as tables
+import src.session_cache as session_cache
+import src.jobs as jobs
+import src.user_context as user_context
+import src.openai_client as openai_client
+from src.json_stream import JSONArrayStreamParser
+import src.meal_plan_cache as meal_plan_cache
+import src.image_cache as image_cache
+import src.fitbit as fitbit
+import src.feedback_store as feedback_store
+import src.prompt_budget as prompt_budget
+import src.inventory as inventory
+from src.fanout import generate_week
 from flask_login import current_user, login_required
-import requests
 
 
-dynamodb = boto3.resource('dynamodb', region_name='eu-west-1')  
-user_preferences_table = dynamodb.Table('Users')  
-sessions_table = dynamodb.Table('UserSessions')
+# generate each day concurrently instead of one big completion, see src/fanout.py
+RECIPE_FANOUT = os.environ.get('RECIPE_FANOUT', '0') == '1'
 
 # Create the Blueprint
 recipe_blueprint = Blueprint('recipe', __name__)
 picture_blueprint = Blueprint('picture', __name__)
+logger = logging.getLogger(__name__)
 
-dynamodb = boto3.resource('dynamodb', region_name='eu-west-1')
 table_name = "Users"
 
-# Fetch the API key from AWS Secrets Manager
-def get_secret():
 
-    secret_name = "openai-key-2"
-    region_name = "eu-west-1"
+def get_users_table():
+    return tables.get_table(table_name, 'eu-west-1')
 
-    # Create a Secrets Manager client
-    session = boto3.session.Session()
-    client = session.client(
-        service_name='secretsmanager',
-        region_name=region_name
-    )
-
-    try:
-        get_secret_value_response = client.get_secret_value(
-            SecretId=secret_name
-        )
-    except ClientError as e:
-        raise e
-
-    secret = get_secret_value_response['SecretString']
-    data = json.loads(secret)
-    api_key = data.get("openai-key-2")
-    return api_key
-
-# Initialize OpenAI
-api_key = get_secret()
-
-if not api_key:
-    print("API Key not found in AWS Secrets Manager!")
-
-client = OpenAI(api_key=api_key)
-# openai.api_key = api_key
 
 #Define models
 class Ingredient (BaseModel):
@@ -82,6 +63,11 @@ def analyse_picture(base64_image):
     try:
         # base64_image = base64.b64encode(image_content).decode("utf-8")
 
+        # same (or nearly the same) photo as a recent upload, reuse that analysis
+        cached, image_keys = image_cache.cache.lookup(base64_image)
+        if cached is not None:
+            return copy.deepcopy(cached)
+
         prompt = """
         You are a food safety expert. Analyze the provided image and return:
         1. A list of identified ingredients.
@@ -103,7 +89,7 @@ def analyse_picture(base64_image):
         }}
         """
         
-        completion = client.beta.chat.completions.parse(
+        completion = openai_client.call(lambda client: client.beta.chat.completions.parse(
             model="gpt-4o",
             messages=[
                 {
@@ -123,9 +109,11 @@ def analyse_picture(base64_image):
                 }
             ],
             response_format=Foods,
-        )
+        ))
 
         ingredients = json.loads(completion.choices[0].message.content)
+        if isinstance(ingredients, dict) and "error" not in ingredients:
+            image_cache.cache.store(image_keys, copy.deepcopy(ingredients))
         return ingredients
 
     except Exception as e:
@@ -135,183 +123,198 @@ def analyse_picture(base64_image):
 def store_ingredients_in_db(username, ingredients):
     try:
         if not ingredients:
-            print("No ingredients to store!")
+            logger.warning("No ingredients to store!")
             return
 
-        # Store ingredients in user_preferences table under 'ingredients' key
-        user_preferences_table.update_item(
-            Key={'username': username},
-            UpdateExpression="SET ingredients = :ingredients",
-            ExpressionAttributeValues={':ingredients': ingredients},
-            ReturnValues="UPDATED_NEW"
-        )
+        # Merge the scan into the user's inventory, see src/inventory.py
+        inventory.merge_scan(username, ingredients)
+        # the old single blob on the Users item is superseded by the inventory
+        get_users_table().update_item(Key={'username': username}, UpdateExpression="REMOVE ingredients")
 
     except Exception as e:
-        print(f"Error storing ingredients in DynamoDB: {e}")
+        logger.error(f"Error storing ingredients in DynamoDB: {e}")
+
+
+# Works out the user's Fitbit activity level, None when Fitbit is not connected
+def get_activity(context):
+    #Retrieve access token from database using user_id
+    url = context.fitbit_access_token
+    access_url = urlparse(url)
+    query_params =  parse_qs(access_url.query)
+    # Extract access_token (list → string)
+    access_token = query_params.get('access_token', [None])[0]
+    access_id = query_params.get('user_id', [None])[0]
+
+    if not access_token:
+        return None
+
+    avg_steps = fitbit.get_average_steps(access_token, access_id, user_id=context.user_id,
+                                         stored=context.preferences_item.get(fitbit.STEPS_ATTRIBUTE))
+    if avg_steps is None:
+        #Fitbit unavailable or token rejected, generate without activity
+        return None
+    if avg_steps >= 10000:
+        activity_level = "very active"
+        nutrition_guidance = "High-energy meals with complex carbs"
+    elif avg_steps >= 7000:
+        activity_level = "active"
+        nutrition_guidance = "Balanced protein-rich meals"
+    else:
+        activity_level = "sedentary"
+        nutrition_guidance = "Light, nutrient-dense meals"
+    return {'avg_steps': avg_steps, 'activity_level': activity_level, 'nutrition_guidance': nutrition_guidance}
+
+
+# Cache key over every normalized input that shapes the prompt
+def meal_plan_key(preferences, context, activity):
+    return meal_plan_cache.cache_key(
+        model="gpt-4o",
+        preferences=preferences,
+        form=context.preferences_form,
+        ingredients=context.ingredients,
+        feedback=context.feedback_profile,
+        activity_level=activity['activity_level'] if activity else None,
+    )
 
 
-def get_stored_ingredients(username):
-    try:
-        response = user_preferences_table.get_item(Key={'username': username})
-        user_data = response.get('Item', {})
+# Describes the user's inputs (preferences, form, ingredients, feedback, activity) for a prompt
+def build_recipe_inputs(preferences, context, activity=None):
+    # compact, deduplicated sections that fit PROMPT_INPUT_TOKEN_BUDGET, see src/prompt_budget.py
+    inputs = prompt_budget.budget_inputs(preferences, context.preferences_form, context.ingredients,
+                                         context.feedback_profile)
+
+    prompt = f"""
+    You are a helpful and creative chef AI tasked with generating a personalized weekly meal plan.
+    The user has provided the following inputs:
+    - **Food preferences**: {inputs['preferences']} 
+        do **not repeat** any of these meals.
+        Swiping right = they liked the meal, so use it to infer their tastes (e.g., flavors, cuisines, ingredients). 
+        Swiping left = they disliked it — do not suggest similar meals.
+    - **Form responses**: {inputs['form']}
+    - **Ingredients with expiry dates** (soonest first): {inputs['ingredients']}
+    """
+    if inputs['feedback']:
+        prompt += f"The user has also provided us with this feedback from previous recipes: {inputs['feedback']}.\n"
+
+    if activity:
+        prompt +=  f"""They also have provided us with their activity level: Activity level: {activity['activity_level']}
+        (averaging {activity['avg_steps']} steps/day) and with the following nutrition_guidance: {activity['nutrition_guidance']} .\n"""
+    return prompt
+
+
+# Builds the weekly meal plan prompt from the user's stored context
+def build_recipe_prompt(preferences, context, activity=None):
+    prompt = build_recipe_inputs(preferences, context, activity)
+    prompt += """
+    Generate **7 completely different meals** (one for each day of the week).
+    - Each meal must be **new** — do not repeat or slightly modify meals from preferences or past feedback.
+    - Ensure to respect the user's preferences from the form and prioritize ingredients that will expire soon.
+    - Reflect their activity level and nutritional guidance in the portion size or energy level of meals if provided.
+
+
+    **For each meal, provide:**
+    - Day of the week
+    - Recipe title
+    - A short description
+    - Difficulty level (Easy, Medium, Hard)
+    - Time to prepare (in minutes)
+    - Number of servings
+    - List of ingredients
+    - Step-by-step instructions
+
+    **Then, at the end, provide a **complete** list of groceries that need to be bought, i.e., those not available in the provided ingredients.  
+    For each grocery item, include:**  
+    - Name of the ingredient  
+    - Quantity required  
+    - Category (e.g., Dairy, Vegetables, Meat, Grains, etc.)  
+    - Ensure duplicates are merged into a single entry with the total required quantity. 
+
+    **Respond ONLY in JSON format, following this exact schema:**
+    {{
+        "recipes": [
+            {{
+                "day_of_the_week": "Monday/Tuesday/...",
+                "title": "Recipe Title",
+                "description": "Short description",
+                "difficulty": "Easy/Medium/Hard",
+                "time_to_prepare": "Time in minutes",
+                "servings": Number,
+                "ingredients": ["Ingredient 1", "Ingredient 2"],
+                "instructions": ["Step 1", "Step 2"]
+            }},
+            ... (7 recipes, one for each day)
+
+
+        ],
+        "grocery_list": [
+            {{
+                "name": "Ingredient Name",
+                "quantity": "Amount (e.g., 500g, 2 cups, 1 liter)",
+                "category": "Category (e.g., Dairy, Vegetables, Meat, Grains)"
+            }},
+            ... (one entry per missing ingredient)
+        ]
+    }}
+    """
+    return prompt
 
-        # Return the stored ingredients list, or an empty list if not found
-        return user_data.get('ingredients', [])
 
-    except Exception as e:
-        print(f"Error retrieving ingredients from DynamoDB: {e}")
-        return []
+def recipe_messages(prompt):
+    return [
+        {
+            "role": "user", 
+            "content": [
+                {
+                    "type": "text", 
+                    "text": prompt
+                },
+            ],
+        }
+    ]
 
-def get_stored_feedback(username):
-    try:
-        response = user_preferences_table.get_item(Key={'username': username})
-        user_data = response.get('Item', {})
 
-        # Return the stored ingredients list, or an empty list if not found
-        return user_data.get('feedbacks', [])
+# One JSON completion, used by the fan-out mode for each day
+def complete_json(prompt):
+    completion = openai_client.call(lambda client: client.beta.chat.completions.parse(
+        model="gpt-4o",
+        messages=recipe_messages(prompt),
+        response_format={"type": "json_object"}
+    ))
+    return json.loads(completion.choices[0].message.content)
+
 
-    except Exception as e:
-        print(f"Error retrieving ingredients from DynamoDB: {e}")
-        return []
-    
 # Function to Generate Recipe using OpenAI
-def generate_recipe(preferences, user_id, session_id):
+def generate_recipe(preferences, user_id, context=None, use_cache=True, refresh=False, fanout=None):
     try:
-        stored_ingredients = get_stored_ingredients(user_id)
-        if not stored_ingredients:
+        #everything below reads from one batched load instead of separate get_items
+        context = context or user_context.get_user_context(user_id)
+        if not context.ingredients:
             return {"error": "No stored ingredients found"}
-        
-        # Get user's Fitbit token and fetch average steps
-         # 1. Get the user's session token from DynamoDB
-        # session_data = sessions_table.get_item(Key={'userId': user_id}).get('Item', {})
-        # print ("session data:", session_data)
-        # session_id = session_data.get('sessionId')
-        # print ("session if:", session_id)
-        if session_id:
-            #Retrieve access token from database using user_id
-            url = user_preferences_bp.retrieve_access_token (user_id)
-            access_url = urlparse(url)
-            query_params =  parse_qs(access_url.query)
-            # Extract access_token (list → string)
-            access_token = query_params.get('access_token', [None])[0]
-            print ("access token:", access_token)
-            access_id = query_params.get('user_id', [None])[0]
-            print ("access id:", access_id)
-            # assume not connected 
-            fitbit_connected = 0
-
-            if access_token:
-                avg_steps = get_average_steps(access_token,access_id)
-                fitbit_connected = 1
-                if avg_steps >= 10000:
-                    activity_level = "very active"
-                    nutrition_guidance = "High-energy meals with complex carbs"
-                elif avg_steps >= 7000:
-                    activity_level = "active"
-                    nutrition_guidance = "Balanced protein-rich meals"
-                else:
-                    activity_level = "sedentary"
-                    nutrition_guidance = "Light, nutrient-dense meals"
-
-        print(stored_ingredients)
-        # Format ingredients list for prompt
-        ingredients_list = [
-        f"{item['name']} (expires in {item['estimated_expiry']})"
-        for item in stored_ingredients['foods']
-        ]
-        #Retrieve user preferences form 
-        form_list = user_preferences_bp.retrieve_user_pref(user_id)
-        feedback = get_stored_feedback(user_id)
-
-        print("generate_recipe() function was called")
-        prompt = f"""
-        You are a helpful and creative chef AI tasked with generating a personalized weekly meal plan.
-        The user has provided the following inputs:
-        - **Food preferences**: {preferences} 
-            do **not repeat** any of these meals.
-            Swiping right = they liked the meal, so use it to infer their tastes (e.g., flavors, cuisines, ingredients). 
-            Swiping left = they disliked it — do not suggest similar meals.
-        - **Form responses**: {form_list}
-        - **Ingredients with expiry dates**: {ingredients_list}
-        """
-        if feedback:
-            prompt += f"The user has also provided us with this feedback from previous recipes: {feedback}.\n"
-
-        if fitbit_connected:
-            prompt +=  f"""They also have provided us with their activity level: Activity level: {activity_level}
-            (averaging {avg_steps} steps/day) and with the following nutrition_guidance: {nutrition_guidance} .\n"""
-        prompt += """
-        Generate **7 completely different meals** (one for each day of the week).
-        - Each meal must be **new** — do not repeat or slightly modify meals from preferences or past feedback.
-        - Ensure to respect the user's preferences from the form and prioritize ingredients that will expire soon.
-        - Reflect their activity level and nutritional guidance in the portion size or energy level of meals if provided.
-
-
-        **For each meal, provide:**
-        - Day of the week
-        - Recipe title
-        - A short description
-        - Difficulty level (Easy, Medium, Hard)
-        - Time to prepare (in minutes)
-        - Number of servings
-        - List of ingredients
-        - Step-by-step instructions
-
-        **Then, at the end, provide a **complete** list of groceries that need to be bought, i.e., those not available in the provided ingredients.  
-        For each grocery item, include:**  
-        - Name of the ingredient  
-        - Quantity required  
-        - Category (e.g., Dairy, Vegetables, Meat, Grains, etc.)  
-        - Ensure duplicates are merged into a single entry with the total required quantity. 
-
-        **Respond ONLY in JSON format, following this exact schema:**
-        {{
-            "recipes": [
-                {{
-                    "day_of_the_week": "Monday/Tuesday/...",
-                    "title": "Recipe Title",
-                    "description": "Short description",
-                    "difficulty": "Easy/Medium/Hard",
-                    "time_to_prepare": "Time in minutes",
-                    "servings": Number,
-                    "ingredients": ["Ingredient 1", "Ingredient 2"],
-                    "instructions": ["Step 1", "Step 2"]
-                }},
-                ... (7 recipes, one for each day)
 
+        activity = get_activity(context)
+        key = meal_plan_key(preferences, context, activity) if use_cache else None
+        if key and not refresh:
+            cached = meal_plan_cache.get_cache().get(key)
+            if cached is not None:
+                return {"recipe": cached, "cached": True}
 
-            ],
-            "grocery_list": [
-                {{
-                    "name": "Ingredient Name",
-                    "quantity": "Amount (e.g., 500g, 2 cups, 1 liter)",
-                    "category": "Category (e.g., Dairy, Vegetables, Meat, Grains)"
-                }},
-                ... (one entry per missing ingredient)
-            ]
-        }}
-        """
-        
-        completion = client.beta.chat.completions.parse(
+        if RECIPE_FANOUT if fanout is None else fanout:
+            available = [item['name'] for item in context.ingredients.get('foods', [])]
+            menu = generate_week(build_recipe_inputs(preferences, context, activity), complete_json, available)
+            if key:
+                meal_plan_cache.get_cache().set(key, menu)
+            return {"recipe": menu}
+
+        prompt = build_recipe_prompt(preferences, context, activity)
+
+        completion = openai_client.call(lambda client: client.beta.chat.completions.parse(
             model="gpt-4o",
-            messages=[
-                {
-                    "role": "user", 
-                    "content": [
-                        {
-                            "type": "text", 
-                            "text": prompt
-                        },
-                    ],
-                }
-            ],
+            messages=recipe_messages(prompt),
             response_format={"type": "json_object"}
-        )
-
-        print("Full Completion Response:", completion)  # Debugging
+        ))
 
         raw_content = completion.choices[0].message.content
-        print(f"Type of raw_content: {type(raw_content)}, Content: {raw_content}")
+        logger.debug(f"Recipe completion ({len(raw_content or '')} chars): {raw_content}")
 
         try:
                 menu = json.loads(raw_content) if isinstance(raw_content, str) else raw_content
@@ -320,12 +323,88 @@ def generate_recipe(preferences, user_id, session_id):
         
         if not isinstance(menu, dict):
             return {"error": "Unexpected response format from API"}
+        if key:
+            meal_plan_cache.get_cache().set(key, menu)
         return {"recipe": menu}
 
 
     except Exception as e:
         return {"error": str(e)}
 
+# Streams the meal plan one recipe at a time as the model writes it
+def generate_recipe_stream(preferences, user_id, context=None, use_cache=True, refresh=False):
+    try:
+        context = context or user_context.get_user_context(user_id)
+        if not context.ingredients:
+            yield {"type": "error", "error": "No stored ingredients found"}
+            return
+
+        activity = get_activity(context)
+        key = meal_plan_key(preferences, context, activity) if use_cache else None
+        cached = meal_plan_cache.get_cache().get(key) if key and not refresh else None
+        if cached is not None:
+            for index, recipe in enumerate(cached.get("recipes", [])):
+                yield {"type": "recipe", "index": index, "recipe": recipe}
+            yield {"type": "grocery_list", "grocery_list": cached.get("grocery_list", [])}
+            yield {"type": "done", "recipes": len(cached.get("recipes", [])), "cached": True}
+            return
+
+        prompt = build_recipe_prompt(preferences, context, activity)
+        stream = openai_client.call(lambda client: client.chat.completions.create(
+            model="gpt-4o",
+            messages=recipe_messages(prompt),
+            response_format={"type": "json_object"},
+            stream=True,
+        ))
+
+        parser = JSONArrayStreamParser('recipes')
+        index = 0
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            for recipe in parser.feed(chunk.choices[0].delta.content):
+                yield {"type": "recipe", "index": index, "recipe": recipe}
+                index += 1
+
+        try:
+            menu = parser.document()
+        except json.JSONDecodeError as e:
+            yield {"type": "error", "error": f"Failed to parse JSON: {str(e)}"}
+            return
+
+        if key and isinstance(menu, dict):
+            meal_plan_cache.get_cache().set(key, menu)
+
+        yield {"type": "grocery_list", "grocery_list": menu.get("grocery_list", [])}
+        yield {"type": "done", "recipes": index}
+
+    except Exception as e:
+        yield {"type": "error", "error": str(e)}
+
+
+def wants_stream(data):
+    if isinstance(data, dict) and data.get('stream') in (True, 'true', '1', 1):
+        return True
+    accept = request.headers.get('Accept', '')
+    return 'text/event-stream' in accept or 'application/x-ndjson' in accept
+
+
+def stream_response(events):
+    #server-sent events when asked for them, newline-delimited JSON otherwise
+    if 'text/event-stream' in request.headers.get('Accept', ''):
+        def body():
+            for event in events:
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        mimetype = 'text/event-stream'
+    else:
+        def body():
+            for event in events:
+                yield json.dumps(event) + "\n"
+        mimetype = 'application/x-ndjson'
+
+    return Response(stream_with_context(body()), mimetype=mimetype, headers={'Cache-Control': 'no-cache'})
+
+
 # API Route for Generating a Recipe
 @recipe_blueprint.route('/generate-recipe', methods=['POST'])
 def generate_recipe_endpoint():
@@ -339,23 +418,47 @@ def generate_recipe_endpoint():
         
 
         #retrieve user id using sessionID
-        resp = sessions_table.get_item(Key={'sessionId' : sessionID})
-        if 'Item' not in resp:
+        userId = session_cache.resolve_user_id(sessionID)
+        if not userId:
             return jsonify({'error': 'Invalid session ID'}), 400
-        userId = resp['Item']['userId']
 
-        stored_ingredients = get_stored_ingredients(userId)
-        if not stored_ingredients:
+        context = user_context.get_user_context(userId)
+        if not context.ingredients:
             return jsonify({'error': 'No stored ingredients found. Please analyze an image first!'}), 400
 
-        recipe = generate_recipe(preferences, userId, sessionID)
+        # {"cache": false} skips the meal plan cache, {"regenerate": true} replaces the cached plan
+        use_cache = data.get('cache', True) not in (False, 'false', '0', 0)
+        refresh = data.get('regenerate') in (True, 'true', '1', 1)
+
+        if wants_stream(data):
+            return stream_response(generate_recipe_stream(preferences, userId, context, use_cache, refresh))
 
-        print (recipe)
-        return jsonify({'recipe': recipe})
+        #the session id is a credential, a queued job only carries who it is for
+        payload = {'preferences': preferences, 'user_id': userId,
+                   'use_cache': use_cache, 'refresh': refresh, 'fanout': data.get('fanout')}
+        if jobs.wants_async(data):
+            return jobs.accepted(jobs.submit('generate-recipe', userId, payload))
 
+        result, status_code = run_recipe_job(payload, context)
+        return jsonify(result), status_code
+
+    except jobs.PayloadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+
+def run_recipe_job(payload, context=None):
+    recipe = generate_recipe(payload['preferences'], payload['user_id'], context,
+                             payload.get('use_cache', True), payload.get('refresh', False), payload.get('fanout'))
+
+    if "error" in recipe:
+        #the ingredients can be gone by the time a queued job runs
+        status_code = 400 if recipe["error"] == "No stored ingredients found" else 500
+        return {'error': recipe["error"]}, status_code
+
+    return {'recipe': recipe}, 200
+
 # API Route to Analyze Food Image
 @picture_blueprint.route('/analyse-picture', methods=['POST'])
 def analyse_food_image():
@@ -368,21 +471,36 @@ def analyse_food_image():
             return jsonify({'error': 'Image and session ID are required!'}), 400
 
         #retrieve user id using sessionID
-        resp = sessions_table.get_item(Key={'sessionId' : sessionID})
-        if 'Item' not in resp:
+        user_id = session_cache.resolve_user_id(sessionID)
+        if not user_id:
             return jsonify({'error': 'Invalid session ID'}), 400
-        user_id = resp['Item']['userId']
-        analysis_result = analyse_picture(base64_image)
 
+        payload = {'image': base64_image, 'user_id': user_id}
+        if jobs.wants_async(data):
+            return jobs.accepted(jobs.submit('analyse-picture', user_id, payload))
 
-        if "error" in analysis_result:
-            return jsonify({'error': analysis_result["error"]}), 500
-
-        store_ingredients_in_db(user_id, analysis_result)
-        return jsonify({'analysis': analysis_result})
+        result, status_code = run_picture_job(payload)
+        return jsonify(result), status_code
 
+    except jobs.PayloadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+def run_picture_job(payload):
+    analysis_result = analyse_picture(payload['image'])
+
+    if "error" in analysis_result:
+        return {'error': analysis_result["error"]}, 500
+
+    store_ingredients_in_db(payload['user_id'], analysis_result)
+    return {'analysis': analysis_result}, 200
+
+
+# the same work can run later on a job worker, see src/jobs.py
+jobs.register_handler('generate-recipe', run_recipe_job)
+jobs.register_handler('analyse-picture', run_picture_job)
     
 @recipe_blueprint.route('/submit-feedback', methods=['POST'])
 def submit_feedback():
@@ -395,24 +513,20 @@ def submit_feedback():
         if not sessionID or not recipe_title or not feedback:
             return jsonify({'error': 'Session ID, recipe title, and feedback are required!'}), 400
 
-        resp = sessions_table.get_item(Key={'sessionId' : sessionID})
-        if 'Item' not in resp:
+        userId = session_cache.resolve_user_id(sessionID)
+        if not userId:
             return jsonify({'error': 'Invalid session ID'}), 400
-        
-        userId = resp['Item']['userId']
-        print ("My user", userId)
 
-        # Store feedback in DynamoDB (or another DB)
-        user_preferences_table.update_item(
-            Key={'username': userId},
-            UpdateExpression="SET feedbacks = list_append(if_not_exists(feedbacks, :empty_list), :new_feedback)",
-            ExpressionAttributeValues={
-                ':new_feedback': [{"recipeTitle": recipe_title, "feedback": feedback}],
-                ':empty_list': []
-            },
-            ReturnValues="UPDATED_NEW"
-        )
+        # Old accounts keep their feedback as a list on the Users item, move it over on first use
+        context = user_context.get_user_context(userId)
+        legacy = context.feedback if context.profile_item is None else None
+        if legacy:
+            feedback_store.import_legacy(userId, legacy)
 
+        feedback_store.add_feedback(userId, recipe_title, feedback, legacy_feedbacks=legacy)
+
+        if legacy:
+            get_users_table().update_item(Key={'username': userId}, UpdateExpression="REMOVE feedbacks")
 
         return jsonify({'message': 'Feedback submitted successfully!'})
 
@@ -420,26 +534,22 @@ def submit_feedback():
         return jsonify({'error': str(e)}), 500
 
 
-def get_average_steps(access_token, user_id):
-    """Get average daily steps from the past week"""
+@recipe_blueprint.route('/feedback', methods=['GET'])
+def list_feedback():
+    sessionID = request.args.get('sessionId')
+    if not sessionID:
+        return jsonify({'error': 'Session ID is required!'}), 400
+
+    userId = session_cache.resolve_user_id(sessionID)
+    if not userId:
+        return jsonify({'error': 'Invalid session ID'}), 400
 
     try:
-        # Fetch step data
-        response = requests.get(
-            f'https://api.fitbit.com/1/user/{user_id}/activities/steps/date/2024-01-08/2024-01-14.json',
-            headers={'Authorization': f'Bearer {access_token}'}
-        )
-        response.raise_for_status()
-       
-        # Calculate average
-        steps_data = response.json().get('activities-steps', [])
-        total_steps = sum(int(day['value']) for day in steps_data)
-        avg_steps = round(total_steps / 7) if steps_data else 0
-        print ("my average steps", avg_steps)
-
-        return avg_steps
-
-    except requests.exceptions.HTTPError as err:
-        return jsonify({'error': f'Fitbit API error: {str(err)}'}), err.response.status_code
+        items, cursor = feedback_store.list_feedback(
+            userId, limit=request.args.get('limit', 20, type=int), cursor=request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        return jsonify({'error': f'Server error: {str(e)}'}), 500
+        logger.error(f"Error listing feedback: {e}")
+        return jsonify({'error': 'Could not retrieve feedback'}), 500
+    return jsonify({'feedback': items, 'cursor': cursor})
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import logging
+import threading
+from botocore.exceptions import ClientError
+from openai import OpenAI, AuthenticationError
+import src.aws_clients as aws_clients
+import src.request_timing as request_timing
+
+# The OpenAI key lives in Secrets Manager. Fetching it at import time made
+# every cold start pay for a Secrets Manager round-trip, even on routes that
+# never call OpenAI, so the key and client are now built on first use and
+# shared across warm invocations.
+
+logger = logging.getLogger(__name__)
+
+SECRET_NAME = "openai-key-2"
+SECRET_REGION = "eu-west-1"
+
+# serve the cached key but refresh it in the background after this long
+SECRET_REFRESH_AFTER = int(os.environ.get('OPENAI_SECRET_REFRESH_AFTER', 3600))
+# past this age the key is refreshed before it is used again
+SECRET_MAX_AGE = int(os.environ.get('OPENAI_SECRET_MAX_AGE', 6 * 3600))
+
+
+# Fetch the API key from AWS Secrets Manager
+def get_secret():
+
+    secret_name = SECRET_NAME
+    region_name = SECRET_REGION
+
+    # Secrets Manager client shared through the registry
+    client = aws_clients.get_client('secretsmanager', region_name)
+
+    try:
+        get_secret_value_response = client.get_secret_value(
+            SecretId=secret_name
+        )
+    except ClientError as e:
+        raise e
+
+    secret = get_secret_value_response['SecretString']
+    data = json.loads(secret)
+    api_key = data.get("openai-key-2")
+    return api_key
+
+
+class OpenAIClientProvider:
+    """Lazily fetches the API key and builds one OpenAI client per container"""
+
+    def __init__(self, fetch_secret=get_secret, client_factory=OpenAI,
+                 refresh_after=SECRET_REFRESH_AFTER, max_age=SECRET_MAX_AGE):
+        self.fetch_secret = fetch_secret
+        self.client_factory = client_factory
+        self.refresh_after = refresh_after
+        self.max_age = max_age
+        self._client = None
+        self._api_key = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._stats = {
+            'fetches': 0,
+            'background_refreshes': 0,
+            'auth_retries': 0,
+            'last_fetch_ms': None,
+            # time the first request of this container spent waiting on the secret
+            'cold_start_fetch_ms': None,
+        }
+
+    def _refresh(self):
+        start = time.perf_counter()
+        api_key = self.fetch_secret()
+        if not api_key:
+            raise RuntimeError("API Key not found in AWS Secrets Manager!")
+
+        client = self.client_factory(api_key=api_key)
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+
+        self._api_key = api_key
+        self._client = client
+        self._fetched_at = time.monotonic()
+        self._stats['fetches'] += 1
+        self._stats['last_fetch_ms'] = elapsed_ms
+        if self._stats['cold_start_fetch_ms'] is None:
+            self._stats['cold_start_fetch_ms'] = elapsed_ms
+            logger.info(f"OpenAI secret fetched on first use in {elapsed_ms}ms")
+        return client
+
+    def _refresh_in_background(self):
+        try:
+            with self._lock:
+                self._refresh()
+                self._stats['background_refreshes'] += 1
+        except Exception as e:
+            #keep serving the old key, the next call will try again
+            logger.warning(f"Background OpenAI secret refresh failed: {e}")
+        finally:
+            self._refreshing = False
+
+    def get_client(self, force_refresh=False):
+        age = time.monotonic() - self._fetched_at
+
+        if force_refresh or self._client is None or age > self.max_age:
+            with self._lock:
+                #another thread may have refreshed while we waited
+                age = time.monotonic() - self._fetched_at
+                if force_refresh or self._client is None or age > self.max_age:
+                    return self._refresh()
+                return self._client
+
+        if age > self.refresh_after and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._refresh_in_background, daemon=True).start()
+
+        return self._client
+
+    def invalidate(self):
+        with self._lock:
+            self._client = None
+            self._api_key = None
+            self._fetched_at = 0.0
+
+    def stats(self):
+        rv = dict(self._stats)
+        rv['loaded'] = self._client is not None
+        rv['age_seconds'] = round(time.monotonic() - self._fetched_at, 1) if self._client else None
+        return rv
+
+
+provider = OpenAIClientProvider()
+
+
+def get_client(force_refresh=False):
+    return provider.get_client(force_refresh=force_refresh)
+
+
+def _timed(fn, client):
+    with request_timing.measure('openai'):
+        result = fn(client)
+    request_timing.record_usage(result)
+    return result
+
+
+def call(fn):
+    """Run fn(client), retrying once with a freshly fetched key if the key was rejected"""
+    try:
+        return _timed(fn, get_client())
+    except AuthenticationError:
+        # the secret was probably rotated since we cached it
+        provider._stats['auth_retries'] += 1
+        return _timed(fn, get_client(force_refresh=True))
+
+
+def stats():
+    return provider.stats()
@@ -0,0 +1,28 @@
+import json
+import base64
+from decimal import Decimal
+
+# Opaque cursor tokens for DynamoDB paging: the LastEvaluatedKey of one page,
+# handed back as ExclusiveStartKey for the next.
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def encode_cursor(last_key):
+    if not last_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_key, default=_default).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, dict):
+        raise ValueError("Invalid cursor")
+    return key
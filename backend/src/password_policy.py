@@ -0,0 +1,226 @@
+import os
+import sys
+import json
+import argparse
+import time
+import hashlib
+import logging
+import platform
+import threading
+from botocore.exceptions import ClientError
+from werkzeug.security import generate_password_hash, check_password_hash
+import src.aws_clients as aws_clients
+
+# Password hashing cost tuned to the machine the app runs on. werkzeug's
+# default scrypt:32768:8:1 is used until a calibration is recorded.
+# Calibrating benchmarks scrypt against a latency budget and is an explicit
+# admin step, never a side effect of serving a request: run
+# `python -m src.password_policy --save` on the target hardware, or POST
+# /admin/password-policy/calibrate on the deployed function. The result is
+# kept per environment (memory size, architecture, CPUs) in an SSM parameter
+# that every container reads once. Stored hashes weaker than the current
+# policy are upgraded on successful login; stronger ones are only rehashed
+# down when a floor below werkzeug's default has been configured.
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_HASH_TARGET_MS = float(os.environ.get('PASSWORD_HASH_TARGET_MS', 100))
+# scrypt N must be a power of two; r and p stay at the usual 8 and 1
+DEFAULT_N = 2 ** 15
+# never calibrate below this; a value under werkzeug's default is the opt-in to cheaper hashes
+PASSWORD_HASH_MIN_N = int(os.environ.get('PASSWORD_HASH_MIN_N', DEFAULT_N))
+PASSWORD_HASH_MAX_N = int(os.environ.get('PASSWORD_HASH_MAX_N', 2 ** 17))
+PASSWORD_HASH_R = 8
+PASSWORD_HASH_P = 1
+# e.g. "scrypt:65536:8:1", overrides any recorded calibration
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD')
+# SSM parameter holding {environment key: calibration} for all containers
+PASSWORD_POLICY_PARAMETER = os.environ.get('PASSWORD_POLICY_PARAMETER', '/lazycook/password-policy')
+PASSWORD_POLICY_REGION = 'eu-west-1'
+
+BENCHMARK_ROUNDS = 3
+
+
+def environment_key():
+    """Identifies the hardware a calibration is valid for"""
+    return ':'.join([
+        os.environ.get('AWS_LAMBDA_FUNCTION_MEMORY_SIZE', 'local'),
+        platform.machine() or 'unknown',
+        str(os.cpu_count() or 0),
+    ])
+
+
+def scrypt_method(n, r=PASSWORD_HASH_R, p=PASSWORD_HASH_P):
+    return f"scrypt:{n}:{r}:{p}"
+
+
+def parse_method(password_hash):
+    """("scrypt", n, r, p) for scrypt hashes, (method, None, None, None) otherwise"""
+    method = password_hash.split('$', 1)[0]
+    parts = method.split(':')
+    if parts[0] == 'scrypt':
+        try:
+            n, r, p = (int(x) for x in parts[1:4])
+        except ValueError:
+            return parts[0], None, None, None
+        return parts[0], n, r, p
+    return parts[0], None, None, None
+
+
+def time_scrypt(n, r=PASSWORD_HASH_R, p=PASSWORD_HASH_P, rounds=BENCHMARK_ROUNDS):
+    """Median milliseconds for one scrypt derivation with these parameters"""
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        hashlib.scrypt(b'benchmark', salt=b'lazycook-benchmark', n=n, r=r, p=p, maxmem=132 * n * r * p, dklen=64)
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+
+def calibrate(target_ms=PASSWORD_HASH_TARGET_MS, min_n=PASSWORD_HASH_MIN_N, max_n=PASSWORD_HASH_MAX_N, timer=time_scrypt):
+    """Largest N within the latency budget, but never below min_n"""
+    n = min_n
+    elapsed = timer(n)
+    chosen = (n, elapsed)
+    while n * 2 <= max_n:
+        #cost is linear in N, so stop as soon as the next step would blow the budget
+        if elapsed * 2 > target_ms:
+            break
+        n *= 2
+        elapsed = timer(n)
+        if elapsed > target_ms:
+            break
+        chosen = (n, elapsed)
+    return {'method': scrypt_method(chosen[0]), 'benchmark_ms': round(chosen[1], 2), 'target_ms': target_ms}
+
+
+def load_calibrations(parameter=PASSWORD_POLICY_PARAMETER):
+    """Every recorded calibration, {environment key: calibration}"""
+    ssm = aws_clients.get_client('ssm', PASSWORD_POLICY_REGION)
+    try:
+        value = ssm.get_parameter(Name=parameter)['Parameter']['Value']
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ParameterNotFound':
+            return {}
+        raise
+    return json.loads(value)
+
+
+def load_recorded(parameter=PASSWORD_POLICY_PARAMETER):
+    return load_calibrations(parameter).get(environment_key())
+
+
+def save_calibration(calibration, parameter=PASSWORD_POLICY_PARAMETER):
+    """Record `calibration` for this environment, keeping the other environments' ones"""
+    recorded = load_calibrations(parameter)
+    recorded[environment_key()] = calibration
+    aws_clients.get_client('ssm', PASSWORD_POLICY_REGION).put_parameter(
+        Name=parameter, Value=json.dumps(recorded, sort_keys=True), Type='String', Overwrite=True)
+    return recorded
+
+
+class PasswordPolicy:
+
+    def __init__(self, method=PASSWORD_HASH_METHOD, loader=load_recorded, min_n=PASSWORD_HASH_MIN_N):
+        self._method = method
+        self._source = 'environment' if method else None
+        self._benchmark = None
+        self._loader = loader
+        self.min_n = min_n
+        #only a floor configured below werkzeug's default allows rehashing to a cheaper cost
+        self.allow_downgrade = min_n < DEFAULT_N
+        self._lock = threading.Lock()
+        self._stats = {'hashes': 0, 'verifications': 0, 'rehashes': 0}
+
+    @property
+    def method(self):
+        """The current hashing method: configured, recorded by a calibration, or werkzeug's default"""
+        if self._method:
+            return self._method
+        with self._lock:
+            if self._method:
+                return self._method
+            try:
+                calibration = self._loader()
+            except Exception as e:
+                logger.warning(f"Could not load the recorded password policy: {e}")
+                calibration = None
+            if calibration and self._acceptable(calibration['method']):
+                self._benchmark = calibration
+                self._method = calibration['method']
+                self._source = 'recorded'
+            else:
+                self._method = scrypt_method(max(DEFAULT_N, self.min_n))
+                self._source = 'default'
+            logger.info(f"Password hashing policy {self._method} ({self._source})")
+        return self._method
+
+    def _acceptable(self, method):
+        name, n, r, p = parse_method(method)
+        return name == 'scrypt' and n is not None and n >= self.min_n
+
+    def calibrate(self, save=True, **kwargs):
+        """Benchmark this machine, use the result from now on and record it for other containers"""
+        calibration = calibrate(min_n=self.min_n, **kwargs)
+        if save:
+            save_calibration(calibration)
+        with self._lock:
+            self._benchmark = calibration
+            self._method = calibration['method']
+            self._source = 'benchmark'
+        return calibration
+
+    def hash_password(self, password):
+        self._stats['hashes'] += 1
+        return generate_password_hash(password, method=self.method)
+
+    def verify(self, password_hash, password):
+        self._stats['verifications'] += 1
+        return check_password_hash(password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True when the stored hash is not scrypt or is cheaper than the current policy (or differs, with a lower floor)"""
+        name, n, r, p = parse_method(password_hash)
+        if name != 'scrypt' or n is None:
+            return True
+        policy = parse_method(self.method)[1:]
+        if self.allow_downgrade:
+            return (n, r, p) != policy
+        #a stronger hash is kept unless a lower floor was configured
+        return n < policy[0] or r < policy[1] or p < policy[2]
+
+    def verify_and_upgrade(self, password_hash, password):
+        """(valid, new hash or None); the new hash should replace the stored one"""
+        if not self.verify(password_hash, password):
+            return False, None
+        if not self.needs_rehash(password_hash):
+            return True, None
+        self._stats['rehashes'] += 1
+        return True, self.hash_password(password)
+
+    def stats(self):
+        rv = dict(self._stats)
+        rv['method'] = self._method
+        rv['source'] = self._source
+        rv['environment'] = environment_key()
+        rv['benchmark'] = self._benchmark
+        return rv
+
+
+policy = PasswordPolicy()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m src.password_policy',
+                                     description='Benchmark scrypt on this machine and pick the password hashing cost')
+    parser.add_argument('--target-ms', type=float, default=PASSWORD_HASH_TARGET_MS)
+    parser.add_argument('--save', action='store_true', help=f'record it in the SSM parameter {PASSWORD_POLICY_PARAMETER}')
+    args = parser.parse_args(argv)
+
+    calibration = policy.calibrate(save=args.save, target_ms=args.target_ms)
+    print(json.dumps({'environment': environment_key(), **calibration}, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
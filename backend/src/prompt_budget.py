@@ -0,0 +1,198 @@
+import os
+import logging
+from src.meal_plan_cache import normalize
+from src.feedback_store import describe_profile
+from src.inventory import expiry_days
+
+try:
+    import tiktoken
+except ImportError:  # optional, falls back to ~4 characters per token
+    tiktoken = None
+
+# Keeps the user-specific part of the recipe prompt within a token budget.
+# Each section (swipes, form, ingredients, feedback) is rendered compactly
+# and, when the total is still over budget, stepped down to shorter
+# renderings, lowest-value context first. Soon-expiring ingredients are the
+# last thing to go.
+
+logger = logging.getLogger(__name__)
+
+PROMPT_INPUT_TOKEN_BUDGET = int(os.environ.get('PROMPT_INPUT_TOKEN_BUDGET', 1500))
+PROMPT_MODEL = 'gpt-4o'
+
+# form fields that say nothing about what to cook
+IRRELEVANT_FORM_FIELDS = {'user_id', 'sessionId', 'fitbit_access_token', 'fitbit_steps'}
+
+MIN_INGREDIENTS = 5
+# sections in the order they give up detail, lowest value first
+TRIM_ORDER = ['feedback', 'preferences', 'ingredients']
+
+_encoding = None
+
+
+def estimate_tokens(text):
+    global _encoding
+    if not text:
+        return 0
+    if tiktoken is not None:
+        if _encoding is None:
+            try:
+                _encoding = tiktoken.encoding_for_model(PROMPT_MODEL)
+            except KeyError:
+                _encoding = tiktoken.get_encoding('o200k_base')
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def _swipe(entry):
+    if entry.get('preference') in ('like', 'dislike'):
+        return 'liked' if entry['preference'] == 'like' else 'disliked'
+    if entry.get('swipe'):
+        return 'liked' if 'right' in entry['swipe'] else 'disliked'
+    if entry.get('is_liked') is not None:
+        return 'liked' if entry['is_liked'] in (True, 'true', 'True') else 'disliked'
+    return None
+
+
+def dedupe_preferences(preferences):
+    """One entry per meal title from the app's swipe list, the last swipe wins"""
+    meals = {}
+    for entry in preferences:
+        if not isinstance(entry, dict) or not entry.get('title'):
+            continue
+        key = ' '.join(str(entry['title']).lower().split())
+        meal = meals.pop(key, {'title': str(entry['title']).strip(), 'description': '', 'swipe': None})
+        meal['description'] = meal['description'] or str(entry.get('description') or '').strip()
+        meal['swipe'] = _swipe(entry) or meal['swipe']
+        #re-insert so the most recent swipes end up last
+        meals[key] = meal
+    return list(meals.values())
+
+
+def preference_levels(preferences):
+    if not preferences:
+        return ['none']
+    if isinstance(preferences, str):
+        text = preferences.strip()
+        return [text, text[:800], text[:300]]
+    if not isinstance(preferences, list):
+        return [str(normalize(preferences))]
+
+    meals = dedupe_preferences(preferences)
+    if not meals:
+        return ['none']
+
+    def render(meals, descriptions):
+        return '; '.join(
+            f"{m['title']} ({m['swipe'] or 'seen'})" + (f": {m['description']}" if descriptions and m['description'] else '')
+            for m in meals)
+
+    return [render(meals, True), render(meals, False), render(meals[-20:], False), render(meals[-10:], False)]
+
+
+def compact_form(form):
+    if not form:
+        return 'none'
+    if not isinstance(form, dict):
+        return str(normalize(form))
+    form = normalize({k: v for k, v in form.items() if k not in IRRELEVANT_FORM_FIELDS})
+    parts = []
+    for key, value in form.items():
+        if value in (None, '', [], {}):
+            continue
+        if isinstance(value, list):
+            value = ', '.join(str(v) for v in value)
+        parts.append(f"{key.replace('_', ' ')}: {value}")
+    return '; '.join(parts) or 'none'
+
+
+def sorted_ingredients(ingredients):
+    """Soonest-expiring first; items without a readable expiry go last"""
+    foods = ingredients.get('foods', []) if isinstance(ingredients, dict) else ingredients or []
+    foods = [f for f in foods if isinstance(f, dict) and f.get('name')]
+    def days(food):
+        if food.get('expires_at') is not None:
+            return float(food['expires_at']) / 86400
+        return expiry_days(food.get('estimated_expiry', ''))
+    return sorted(foods, key=lambda f: (days(f) is None, days(f) or 0))
+
+
+def ingredient_levels(ingredients):
+    foods = sorted_ingredients(ingredients)
+    if not foods:
+        return ['none']
+
+    def render(foods, total):
+        text = ', '.join(f"{f['name']} (expires in {f.get('estimated_expiry', 'unknown')})" for f in foods)
+        if len(foods) < total:
+            text += f" and {total - len(foods)} longer-lasting items"
+        return text
+
+    levels = [render(foods, len(foods))]
+    count = len(foods)
+    while count > MIN_INGREDIENTS:
+        count = max(MIN_INGREDIENTS, count // 2)
+        levels.append(render(foods[:count], len(foods)))
+    return levels
+
+
+def feedback_levels(profile):
+    if not profile:
+        return ['']
+    short = {
+        'likes': (profile.get('likes') or [])[:5],
+        'dislikes': (profile.get('dislikes') or [])[:5],
+        'complaints': dict(list((profile.get('complaints') or {}).items())[:3]),
+    }
+    return [
+        describe_profile(profile),
+        describe_profile({k: v for k, v in profile.items() if k != 'notes'}),
+        describe_profile(short),
+        describe_profile({'complaints': short['complaints']}),
+    ]
+
+
+class PromptInputs:
+    """The rendered sections plus what it took to fit them in the budget"""
+
+    def __init__(self, sections, tokens, budget, trimmed):
+        self.sections = sections
+        self.tokens = tokens
+        self.budget = budget
+        self.trimmed = trimmed
+
+    def __getitem__(self, name):
+        return self.sections[name]
+
+    @property
+    def total_tokens(self):
+        return sum(self.tokens.values())
+
+
+def budget_inputs(preferences, form, ingredients, feedback_profile, budget=PROMPT_INPUT_TOKEN_BUDGET):
+    levels = {
+        'preferences': preference_levels(preferences),
+        'form': [compact_form(form)],
+        'ingredients': ingredient_levels(ingredients),
+        'feedback': feedback_levels(feedback_profile),
+    }
+    chosen = {name: 0 for name in levels}
+    tokens = {name: estimate_tokens(options[0]) for name, options in levels.items()}
+    trimmed = []
+
+    # step each section down one level at a time, cheapest context first
+    while sum(tokens.values()) > budget:
+        for name in TRIM_ORDER:
+            if chosen[name] + 1 < len(levels[name]):
+                chosen[name] += 1
+                tokens[name] = estimate_tokens(levels[name][chosen[name]])
+                trimmed.append(name)
+                break
+        else:
+            break
+
+    sections = {name: levels[name][chosen[name]] for name in levels}
+    inputs = PromptInputs(sections, tokens, budget, trimmed)
+    logger.info(f"Recipe prompt inputs: {inputs.total_tokens} tokens (budget {budget}) "
+                 f"{tokens}{f', trimmed {trimmed}' if trimmed else ''}")
+    return inputs
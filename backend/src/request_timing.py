@@ -0,0 +1,263 @@
+import os
+import sys
+import json
+import time
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+# Per-request timing breakdown. lambda_handler opens a RequestTiming for each
+# event; DynamoDB calls (through the botocore hooks in aws_clients), OpenAI,
+# Fitbit, JSON parsing/serialization, the Flask app, response compression and
+# awsgi's marshalling add their time to it. When the request is done the
+# breakdown goes out as one CloudWatch Embedded Metric Format line and, when
+# enabled, as a Server-Timing header with the coarse stages only.
+# Work on executor threads is counted when submitted through bind().
+
+METRICS_NAMESPACE = os.environ.get('REQUEST_METRICS_NAMESPACE', 'LazyCook')
+REQUEST_METRICS = os.environ.get('REQUEST_METRICS', '1') == '1'
+# off by default, the header goes to every client
+SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', '0') == '1'
+# table names, call counts and token usage in the header too, for non-public deployments only
+SERVER_TIMING_DETAIL = os.environ.get('SERVER_TIMING_DETAIL', '0') == '1'
+
+# stages reported as metrics, in Server-Timing order
+STAGES = ['dynamodb', 'openai', 'fitbit', 'json_parse', 'json_serialize', 'app', 'compress', 'awsgi']
+COUNTS = ['dynamodb_calls', 'openai_prompt_tokens', 'openai_completion_tokens', 'response_bytes', 'compressed_bytes']
+
+_current = contextvars.ContextVar('request_timing', default=None)
+
+
+class RequestTiming:
+    """Time spent per stage during one request; safe to add to from several threads"""
+
+    def __init__(self, request_id=None):
+        self.request_id = request_id
+        self.route = None
+        self.status = None
+        self.started = time.perf_counter()
+        self.total_ms = None
+        self.stages = {}
+        self.counts = {}
+        self.tables = {}
+        self.compression = None
+        self._lock = threading.Lock()
+
+    def add(self, stage, ms, table=None, region=None):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + ms
+            if table:
+                entry = self.tables.setdefault(f"{table}:{region}" if region else table, {'calls': 0, 'ms': 0.0})
+                entry['calls'] += 1
+                entry['ms'] += ms
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+        # what the app did not account for was spent building the environ and the response
+        if 'app' in self.stages:
+            self.stages['awsgi'] = max(0.0, self.total_ms - self.stages['app'] - self.stages.get('compress', 0.0))
+        return self
+
+    def server_timing(self, detail=False):
+        """Stage durations; `detail` adds table names, call counts and token usage"""
+        parts = []
+        for stage in STAGES:
+            if stage in self.stages:
+                desc = ''
+                if detail and stage == 'dynamodb':
+                    desc = f';desc="{self.counts.get("dynamodb_calls", 0)} calls"'
+                elif detail and stage == 'openai' and 'openai_completion_tokens' in self.counts:
+                    desc = (f';desc="{self.counts.get("openai_prompt_tokens", 0)} prompt + '
+                            f'{self.counts["openai_completion_tokens"]} completion tokens"')
+                parts.append(f"{stage};dur={self.stages[stage]:.1f}{desc}")
+        for name, entry in sorted(self.tables.items() if detail else ()):
+            table = name.split(':')[0]
+            parts.append(f"dynamodb.{table};dur={entry['ms']:.1f}")
+        if self.total_ms is not None:
+            parts.append(f"total;dur={self.total_ms:.1f}")
+        return ', '.join(parts)
+
+    def emf(self):
+        """The CloudWatch Embedded Metric Format record for this request"""
+        metrics = [{'Name': 'total', 'Unit': 'Milliseconds'}]
+        metrics += [{'Name': stage, 'Unit': 'Milliseconds'} for stage in STAGES if stage in self.stages]
+        metrics += [{'Name': name, 'Unit': 'Bytes' if name.endswith('_bytes') else 'Count'}
+                    for name in COUNTS if name in self.counts]
+        record = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [['Route']],
+                    'Metrics': metrics,
+                }],
+            },
+            'Route': self.route or 'unmatched',
+            'StatusCode': self.status,
+            'RequestId': self.request_id,
+            'total': round(self.total_ms or 0.0, 2),
+            # per-table detail stays out of the metrics, it is there for Logs Insights
+            'dynamodb_tables': {name: {'calls': e['calls'], 'ms': round(e['ms'], 2)} for name, e in self.tables.items()},
+        }
+        if self.compression:
+            record['content_encoding'] = self.compression['encoding']
+            record['compression_ratio'] = self.compression['ratio']
+        record.update({stage: round(self.stages[stage], 2) for stage in STAGES if stage in self.stages})
+        record.update({name: self.counts[name] for name in COUNTS if name in self.counts})
+        return record
+
+
+def start(request_id=None):
+    timing = RequestTiming(request_id)
+    _current.set(timing)
+    return timing
+
+
+def current():
+    return _current.get()
+
+
+def stop():
+    _current.set(None)
+
+
+def record(stage, ms, table=None, region=None):
+    timing = _current.get()
+    if timing is not None:
+        timing.add(stage, ms, table=table, region=region)
+
+
+def count(name, n=1):
+    timing = _current.get()
+    if timing is not None and n:
+        timing.count(name, n)
+
+
+@contextmanager
+def measure(stage):
+    if _current.get() is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, (time.perf_counter() - started) * 1000)
+
+
+def record_usage(completion):
+    """Token counts from an OpenAI response, when it has them"""
+    usage = getattr(completion, 'usage', None)
+    if usage is not None:
+        count('openai_prompt_tokens', getattr(usage, 'prompt_tokens', 0) or 0)
+        count('openai_completion_tokens', getattr(usage, 'completion_tokens', 0) or 0)
+
+
+def record_compression(stats):
+    """awsgi's on_compress callback: CPU time, sizes and ratio of the compressed response"""
+    timing = _current.get()
+    if timing is not None:
+        timing.compression = stats
+        timing.add('compress', stats['cpu_ms'])
+        timing.count('response_bytes', stats['original_bytes'])
+        timing.count('compressed_bytes', stats['compressed_bytes'])
+
+
+def bind(fn):
+    """fn, run in the submitting request's context; use for executor.submit"""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+def emit(timing, stream=None):
+    #EMF has to be the whole log line, so it bypasses the logging prefix
+    stream = stream or sys.stdout
+    stream.write(json.dumps(timing.emf(), separators=(',', ':')) + '\n')
+
+
+def finish(response):
+    """Close the current timing, add Server-Timing to an awsgi response dict and log the metrics"""
+    timing = _current.get()
+    if timing is None:
+        return response
+    stop()
+    timing.finish()
+    if isinstance(response, dict):
+        timing.status = timing.status or response.get('statusCode')
+        if SERVER_TIMING_HEADER and isinstance(response.get('headers'), dict):
+            response['headers']['Server-Timing'] = timing.server_timing(detail=SERVER_TIMING_DETAIL)
+    if REQUEST_METRICS:
+        emit(timing)
+    return response
+
+
+# --- Flask ---------------------------------------------------------------
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, timing request parsing and response serialization"""
+
+    def loads(self, s, **kwargs):
+        with measure('json_parse'):
+            return super().loads(s, **kwargs)
+
+    def dumps(self, obj, **kwargs):
+        with measure('json_serialize'):
+            return super().dumps(obj, **kwargs)
+
+
+class _TimedIterable:
+    """Counts the time spent producing a (possibly streamed) response body as app time"""
+
+    def __init__(self, iterable, timing):
+        self._iterable = iterable
+        self._iter = iter(iterable)
+        self._timing = timing
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            return next(self._iter)
+        finally:
+            self._timing.add('app', (time.perf_counter() - started) * 1000)
+
+    def close(self):
+        if hasattr(self._iterable, 'close'):
+            self._iterable.close()
+
+
+def _timed_wsgi_app(wsgi_app):
+
+    @functools.wraps(wsgi_app)
+    def timed(environ, start_response):
+        timing = _current.get()
+        if timing is None:
+            return wsgi_app(environ, start_response)
+        started = time.perf_counter()
+        body = wsgi_app(environ, start_response)
+        timing.add('app', (time.perf_counter() - started) * 1000)
+        return _TimedIterable(body, timing)
+    return timed
+
+
+def _remember_route(response):
+    timing = _current.get()
+    if timing is not None:
+        rule = request.url_rule.rule if request.url_rule else 'unmatched'
+        timing.route = f"{request.method} {rule}"
+        timing.status = response.status_code
+    return response
+
+
+def init_app(app):
+    app.json = TimedJSONProvider(app)
+    app.wsgi_app = _timed_wsgi_app(app.wsgi_app)
+    app.after_request(_remember_route)
@@ -0,0 +1,105 @@
+import os
+import time
+import threading
+import src.tables as tables
+from src.ttl_cache import TTLCache
+
+# Shared session resolver for every authenticated endpoint. Resolved sessions
+# are cached briefly in the warm container so a swipe burst does not turn
+# into one UserSessions read per card. A logout only invalidates the cache of
+# the container that served it, so other containers may accept the session
+# for up to SESSION_CACHE_TTL seconds afterwards; keep it short.
+
+SESSIONS_TABLE = 'UserSessions'
+SESSIONS_REGION = 'eu-west-1'
+
+SESSION_CACHE_TTL = int(os.environ.get('SESSION_CACHE_TTL', 30))
+NEGATIVE_CACHE_TTL = int(os.environ.get('SESSION_NEGATIVE_CACHE_TTL', 10))
+SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', 2048))
+
+_cache = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL)
+
+_stats = {'lookups': 0, 'negative_hits': 0, 'expired_rejections': 0, 'dynamodb_reads': 0}
+# requests resolve sessions from several threads (streaming, fan-out, job workers)
+_stats_lock = threading.Lock()
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def get_sessions_table():
+    return tables.get_table(SESSIONS_TABLE, SESSIONS_REGION)
+
+
+def _session_expired(expires_at):
+    return expires_at is not None and expires_at <= time.time()
+
+
+def _remember(session_id, user_id, expires_at):
+    #never keep a session in the cache past its own ttl attribute
+    ttl = SESSION_CACHE_TTL
+    if expires_at is not None:
+        ttl = min(ttl, expires_at - time.time())
+    _cache.set(session_id, (user_id, expires_at), ttl=ttl)
+
+
+def resolve_user_id(session_id):
+    """Return the user id for a session id, or None if the session is unknown or expired"""
+    if not session_id:
+        return None
+
+    _count('lookups')
+    cached = _cache.get(session_id)
+    if cached is not None:
+        user_id, expires_at = cached
+        if user_id is None:
+            _count('negative_hits')
+            return None
+        if _session_expired(expires_at):
+            _count('expired_rejections')
+            _cache.pop(session_id)
+            return None
+        return user_id
+
+    _count('dynamodb_reads')
+    resp = get_sessions_table().get_item(Key={'sessionId': session_id})
+    item = resp.get('Item')
+    expires_at = int(item['ttl']) if item and item.get('ttl') is not None else None
+    user_id = item.get('userId') if item else None
+
+    # DynamoDB TTL deletion can lag by hours, so check the attribute ourselves
+    if item and _session_expired(expires_at):
+        _count('expired_rejections')
+        user_id = None
+
+    if not user_id:
+        _cache.set(session_id, (None, None), ttl=NEGATIVE_CACHE_TTL)
+        return None
+
+    _remember(session_id, user_id, expires_at)
+    return user_id
+
+
+def remember_session(session_id, user_id, expires_at=None):
+    #called after login/register so the first request skips the read
+    _remember(session_id, user_id, expires_at)
+
+
+def invalidate(session_id):
+    _cache.pop(session_id)
+
+
+def clear():
+    _cache.clear()
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
+
+
+def stats():
+    rv = _cache.stats()
+    with _stats_lock:
+        rv.update(_stats)
+    return rv
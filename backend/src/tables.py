@@ -0,0 +1,708 @@
+import os
+import re
+import json
+import zlib
+import sqlite3
+import threading
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
+from botocore.exceptions import ClientError
+import src.aws_clients as aws_clients
+
+# Table access for the whole app. With TABLE_BACKEND=dynamodb (the default)
+# this hands out the usual boto3 Table objects. With memory or sqlite it
+# hands out local stand-ins that take the same calls (get/put/update/delete
+# item, scan, query, batch_writer, batch_get_item) and the same expression
+# strings, so the app can be run and profiled on a laptop without AWS.
+# Items are stored as DynamoDB JSON, so numbers come back as Decimal and
+# floats are rejected just like with boto3.
+
+TABLE_BACKEND = os.environ.get('TABLE_BACKEND', 'dynamodb')
+TABLE_SQLITE_PATH = os.environ.get('TABLE_SQLITE_PATH', '/tmp/lazycook_tables.db')
+
+# (partition key, sort key) of every table the app uses
+KEY_SCHEMAS = {
+    'Users': ('username', None),
+    'UserSessions': ('sessionId', None),
+    'user_preferences': ('user_id', None),
+    'food_preferences': ('user_id', 'food_id'),
+    'food_preferences_batches': ('idempotency_key', None),
+    'RecipeFeedback': ('user_id', 'sk'),
+    'UserInventory': ('user_id', 'item_name'),
+    'MealPlanCache': ('cache_key', None),
+    'Jobs': ('job_id', None),
+}
+INDEXES = {
+    'UserInventory': {'expires_at-index': ('user_id', 'expires_at')},
+}
+
+MAX_ITEM_BYTES = 400 * 1024
+# a Scan or Query without Limit stops after about this much data, like DynamoDB
+MAX_PAGE_BYTES = 1024 * 1024
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+_MISSING = object()
+
+
+def _error(code, message, operation):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+def serialize(item):
+    return {k: _serializer.serialize(v) for k, v in item.items()}
+
+
+def deserialize(data):
+    return {k: _deserializer.deserialize(v) for k, v in data.items()}
+
+
+def _plain(value):
+    """A Python value as boto3 would hand it back (ints become Decimal)"""
+    return _deserializer.deserialize(_serializer.serialize(value))
+
+
+# --- expressions ---------------------------------------------------------
+
+_TOKEN = re.compile(r'\s*(?:(?P<num>\d+)|(?P<name>#?[A-Za-z_][A-Za-z0-9_\-]*)|(?P<value>:[A-Za-z0-9_]+)'
+                    r'|(?P<op><>|<=|>=|[=<>(),.\[\]+\-]))')
+_KEYWORDS = {'AND', 'OR', 'NOT', 'BETWEEN', 'IN', 'SET', 'REMOVE', 'ADD', 'DELETE'}
+
+
+class Expression:
+    """Parser for condition, update and projection expressions, compiled to functions of an item"""
+
+    def __init__(self, text, names=None, values=None):
+        self.names = names or {}
+        self.values = {k: _plain(v) for k, v in (values or {}).items()}
+        self.tokens = []
+        pos, text = 0, text.strip()
+        while pos < len(text):
+            match = _TOKEN.match(text, pos)
+            if not match or match.end() == pos:
+                raise _error('ValidationException', f"Invalid expression near: {text[pos:]}", 'Expression')
+            kind = match.lastgroup
+            self.tokens.append((kind, match.group(kind)))
+            pos = match.end()
+        self.pos = 0
+
+    def _peek(self, offset=0):
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else (None, None)
+
+    def _next(self):
+        token = self._peek()
+        self.pos += 1
+        return token
+
+    def _accept(self, text):
+        kind, value = self._peek()
+        if value is not None and kind in ('op', 'name') and value.upper() == text:
+            if kind == 'name' and value.startswith('#'):
+                return False
+            self.pos += 1
+            return True
+        return False
+
+    def _expect(self, text):
+        if not self._accept(text):
+            raise _error('ValidationException', f"Expected {text} in expression", 'Expression')
+
+    def _keyword(self):
+        kind, value = self._peek()
+        return value.upper() if kind == 'name' and value.upper() in _KEYWORDS else None
+
+    def done(self):
+        return self.pos >= len(self.tokens)
+
+    # paths and operands
+
+    def path(self):
+        kind, value = self._next()
+        if kind != 'name':
+            raise _error('ValidationException', f"Expected an attribute name, got {value}", 'Expression')
+        segments = [self._name(value)]
+        while True:
+            if self._accept('.'):
+                segments.append(self._name(self._next()[1]))
+            elif self._accept('['):
+                segments.append(int(self._next()[1]))
+                self._expect(']')
+            else:
+                return segments
+
+    def _name(self, token):
+        if token.startswith('#'):
+            if token not in self.names:
+                raise _error('ValidationException', f"Unknown attribute name placeholder {token}", 'Expression')
+            return self.names[token]
+        return token
+
+    def operand(self):
+        kind, value = self._peek()
+        if kind == 'value':
+            self.pos += 1
+            if value not in self.values:
+                raise _error('ValidationException', f"Unknown attribute value placeholder {value}", 'Expression')
+            constant = self.values[value]
+            return lambda item: constant
+        if kind == 'name' and self._peek(1)[1] == '(':
+            return self._function()
+        path = self.path()
+        return lambda item: resolve(item, path)
+
+    def _function(self):
+        name = self._next()[1]
+        self._expect('(')
+        if name == 'size':
+            arg = self.operand()
+            self._expect(')')
+            return lambda item: _size(arg(item))
+        if name == 'if_not_exists':
+            path = self.path()
+            self._expect(',')
+            default = self.operand()
+            self._expect(')')
+            return lambda item: resolve(item, path) if resolve(item, path) is not _MISSING else default(item)
+        if name == 'list_append':
+            first = self.operand()
+            self._expect(',')
+            second = self.operand()
+            self._expect(')')
+            return lambda item: list(first(item)) + list(second(item))
+        raise _error('ValidationException', f"Unsupported function {name}", 'Expression')
+
+    # conditions
+
+    def condition(self):
+        left = self._and()
+        while self._accept('OR'):
+            right = self._and()
+            left = (lambda a, b: lambda item: a(item) or b(item))(left, right)
+        return left
+
+    def _and(self):
+        left = self._not()
+        while self._accept('AND'):
+            right = self._not()
+            left = (lambda a, b: lambda item: a(item) and b(item))(left, right)
+        return left
+
+    def _not(self):
+        if self._accept('NOT'):
+            inner = self._not()
+            return lambda item: not inner(item)
+        return self._primary()
+
+    def _primary(self):
+        if self._accept('('):
+            inner = self.condition()
+            self._expect(')')
+            return inner
+
+        kind, value = self._peek()
+        if kind == 'name' and self._peek(1)[1] == '(' and value != 'size':
+            return self._condition_function()
+
+        left = self.operand()
+        if self._accept('BETWEEN'):
+            low = self.operand()
+            self._expect('AND')
+            high = self.operand()
+            return lambda item: _compare(low(item), '<=', left(item)) and _compare(left(item), '<=', high(item))
+        if self._accept('IN'):
+            self._expect('(')
+            options = [self.operand()]
+            while self._accept(','):
+                options.append(self.operand())
+            self._expect(')')
+            return lambda item: any(_compare(left(item), '=', option(item)) for option in options)
+
+        op = self._next()[1]
+        if op not in ('=', '<>', '<', '<=', '>', '>='):
+            raise _error('ValidationException', f"Unexpected {op} in condition", 'Expression')
+        right = self.operand()
+        return lambda item: _compare(left(item), op, right(item))
+
+    def _condition_function(self):
+        name = self._next()[1]
+        self._expect('(')
+        if name in ('attribute_exists', 'attribute_not_exists'):
+            path = self.path()
+            self._expect(')')
+            exists = name == 'attribute_exists'
+            return lambda item: (resolve(item, path) is not _MISSING) == exists
+        if name in ('begins_with', 'contains'):
+            target = self.operand()
+            self._expect(',')
+            arg = self.operand()
+            self._expect(')')
+            if name == 'begins_with':
+                return lambda item: isinstance(target(item), (str, bytes)) and target(item).startswith(arg(item))
+            return lambda item: _contains(target(item), arg(item))
+        raise _error('ValidationException', f"Unsupported function {name}", 'Expression')
+
+    # updates
+
+    def update(self):
+        """List of (action, path, value function) applied after evaluating against the old item"""
+        actions = []
+        while not self.done():
+            clause = self._keyword()
+            if clause is None:
+                raise _error('ValidationException', "Expected SET, REMOVE, ADD or DELETE", 'UpdateItem')
+            self.pos += 1
+            while True:
+                path = self.path()
+                if clause == 'SET':
+                    self._expect('=')
+                    value = self.operand()
+                    if self._peek()[1] in ('+', '-'):
+                        sign = self._next()[1]
+                        other = self.operand()
+                        value = (lambda a, b, s: lambda item: a(item) + b(item) if s == '+' else a(item) - b(item))(
+                            value, other, sign)
+                    actions.append(('SET', path, value))
+                elif clause == 'REMOVE':
+                    actions.append(('REMOVE', path, None))
+                else:
+                    actions.append((clause, path, self.operand()))
+                if not self._accept(','):
+                    break
+        return actions
+
+    def projection(self):
+        paths = [self.path()]
+        while self._accept(','):
+            paths.append(self.path())
+        return paths
+
+
+def resolve(item, path):
+    current = item
+    for segment in path:
+        if isinstance(segment, int):
+            if not isinstance(current, list) or segment >= len(current):
+                return _MISSING
+        elif not isinstance(current, dict) or segment not in current:
+            return _MISSING
+        current = current[segment]
+    return current
+
+
+def _parent(item, path, operation):
+    parent = resolve(item, path[:-1])
+    if parent is _MISSING:
+        raise _error('ValidationException', "The document path provided in the update expression is invalid for update",
+                     operation)
+    return parent
+
+
+def _size(value):
+    if value is _MISSING:
+        return _MISSING
+    return len(value)
+
+
+def _contains(target, value):
+    if isinstance(target, str) and isinstance(value, str):
+        return value in target
+    if isinstance(target, (list, set)):
+        return value in target
+    return False
+
+
+def _compare(left, op, right):
+    if left is _MISSING or right is _MISSING:
+        return op == '<>'
+    if op == '=':
+        return left == right
+    if op == '<>':
+        return left != right
+    try:
+        return {'<': left < right, '<=': left <= right, '>': left > right, '>=': left >= right}[op]
+    except TypeError:
+        return False
+
+
+def _build(expression, names, values, is_key_condition=False):
+    """Expression string, names and values; boto3 condition objects are turned into strings first"""
+    names = dict(names or {})
+    values = dict(values or {})
+    if isinstance(expression, ConditionBase):
+        built = ConditionExpressionBuilder().build_expression(expression, is_key_condition=is_key_condition)
+        names.update(built.attribute_name_placeholders)
+        values.update(built.attribute_value_placeholders)
+        expression = built.condition_expression
+    return expression, names, values
+
+
+def _check_condition(item, condition, names, values, operation):
+    if not condition:
+        return
+    expression, names, values = _build(condition, names, values)
+    if not Expression(expression, names, values).condition()(item or {}):
+        raise _error('ConditionalCheckFailedException', 'The conditional request failed', operation)
+
+
+def project(item, projection, names=None):
+    if not projection:
+        return item
+    result = {}
+    for path in Expression(projection, names).projection():
+        value = resolve(item, path)
+        if value is _MISSING:
+            continue
+        #copies the enclosing structure down to the projected value
+        target = result
+        for segment, next_segment in zip(path, path[1:]):
+            target = target.setdefault(segment, [] if isinstance(next_segment, int) else {})
+        if isinstance(target, list):
+            target.append(value)
+        else:
+            target[path[-1]] = value
+    return result
+
+
+# --- storage -------------------------------------------------------------
+
+def _key_text(value):
+    return json.dumps(_serializer.serialize(value), sort_keys=True)
+
+
+class SQLiteStorage:
+    """Rows of DynamoDB JSON; ':memory:' gives the in-memory backend"""
+
+    def __init__(self, path=TABLE_SQLITE_PATH):
+        self.path = path
+        self.lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL' if path != ':memory:' else 'PRAGMA journal_mode=MEMORY')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS items ('
+                           'tbl TEXT NOT NULL, pk TEXT NOT NULL, sk TEXT NOT NULL, segment INTEGER NOT NULL, '
+                           'data TEXT NOT NULL, PRIMARY KEY (tbl, pk, sk))')
+
+    def get(self, table, pk, sk):
+        with self.lock:
+            row = self._conn.execute('SELECT data FROM items WHERE tbl = ? AND pk = ? AND sk = ?',
+                                     (table, pk, sk)).fetchone()
+        return deserialize(json.loads(row[0])) if row else None
+
+    def put(self, table, pk, sk, data):
+        with self.lock:
+            self._conn.execute('INSERT OR REPLACE INTO items (tbl, pk, sk, segment, data) VALUES (?, ?, ?, ?, ?)',
+                               (table, pk, sk, zlib.crc32(pk.encode()), data))
+
+    def delete(self, table, pk, sk):
+        with self.lock:
+            self._conn.execute('DELETE FROM items WHERE tbl = ? AND pk = ? AND sk = ?', (table, pk, sk))
+
+    def partition(self, table, pk):
+        with self.lock:
+            rows = self._conn.execute('SELECT data FROM items WHERE tbl = ? AND pk = ?', (table, pk)).fetchall()
+        return [deserialize(json.loads(row[0])) for row in rows]
+
+    def scan(self, table, after=None, segment=None, total_segments=None):
+        """Rows in (pk, sk) order, starting after the (pk, sk) pair `after`; yields (pk, sk, size, item)"""
+        sql = 'SELECT pk, sk, data FROM items WHERE tbl = ?'
+        args = [table]
+        if after:
+            sql += ' AND (pk > ? OR (pk = ? AND sk > ?))'
+            args += [after[0], after[0], after[1]]
+        if total_segments:
+            sql += ' AND segment % ? = ?'
+            args += [total_segments, segment]
+        sql += ' ORDER BY pk, sk'
+        with self.lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        for pk, sk, data in rows:
+            yield pk, sk, len(data), deserialize(json.loads(data))
+
+    def clear(self):
+        with self.lock:
+            self._conn.execute('DELETE FROM items')
+
+
+# --- local table ---------------------------------------------------------
+
+class LocalTable:
+    """The subset of the boto3 Table API the app uses, on top of SQLiteStorage"""
+
+    def __init__(self, name, storage):
+        if name not in KEY_SCHEMAS:
+            raise ValueError(f"No key schema for table {name}, add it to KEY_SCHEMAS")
+        self.name = self.table_name = name
+        self.storage = storage
+        self.hash_key, self.range_key = KEY_SCHEMAS[name]
+
+    def _key(self, key, operation):
+        expected = {self.hash_key} | ({self.range_key} if self.range_key else set())
+        if set(key) != expected:
+            raise _error('ValidationException', 'The provided key element does not match the schema', operation)
+        return _key_text(key[self.hash_key]), _key_text(key[self.range_key]) if self.range_key else ''
+
+    def _key_of(self, item):
+        return {k: item[k] for k in (self.hash_key, self.range_key) if k}
+
+    def _store(self, item, operation):
+        data = json.dumps(serialize(item))
+        if len(data) > MAX_ITEM_BYTES:
+            raise _error('ValidationException', 'Item size has exceeded the maximum allowed size', operation)
+        self.storage.put(self.name, *self._key(self._key_of(item), operation), data)
+
+    def get_item(self, Key, ProjectionExpression=None, ExpressionAttributeNames=None, ConsistentRead=None):
+        item = self.storage.get(self.name, *self._key(Key, 'GetItem'))
+        return {'Item': project(item, ProjectionExpression, ExpressionAttributeNames)} if item else {}
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, ReturnValues=None):
+        item = _plain(Item)
+        with self.storage.lock:
+            old = self.storage.get(self.name, *self._key(self._key_of(item), 'PutItem'))
+            _check_condition(old, ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues, 'PutItem')
+            self._store(item, 'PutItem')
+        return {'Attributes': old} if ReturnValues == 'ALL_OLD' and old else {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues=None):
+        with self.storage.lock:
+            old = self.storage.get(self.name, *self._key(Key, 'UpdateItem'))
+            _check_condition(old, ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues,
+                             'UpdateItem')
+            item = _plain(old) if old else dict(_plain(Key))
+            actions = Expression(UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues).update()
+            #every value is worked out against the item as it was before the update
+            evaluated = [(action, path, value(item) if value else None) for action, path, value in actions]
+            for action, path, value in evaluated:
+                self._apply(item, action, path, value)
+            self._store(item, 'UpdateItem')
+
+        updated = {path[0] for _, path, _ in actions}
+        if ReturnValues == 'ALL_NEW':
+            return {'Attributes': item}
+        if ReturnValues == 'UPDATED_NEW':
+            return {'Attributes': {k: v for k, v in item.items() if k in updated}}
+        if ReturnValues == 'ALL_OLD' and old:
+            return {'Attributes': old}
+        if ReturnValues == 'UPDATED_OLD' and old:
+            return {'Attributes': {k: v for k, v in old.items() if k in updated}}
+        return {}
+
+    def _apply(self, item, action, path, value):
+        if path[0] in (self.hash_key, self.range_key):
+            raise _error('ValidationException', 'Cannot update attribute that is part of the key', 'UpdateItem')
+        if value is _MISSING:
+            raise _error('ValidationException', 'The provided expression refers to an attribute that does not exist',
+                         'UpdateItem')
+        parent = _parent(item, path, 'UpdateItem')
+        current = resolve(item, path)
+        if action == 'REMOVE':
+            if current is not _MISSING:
+                del parent[path[-1]]
+            return
+        if action == 'ADD':
+            if current is _MISSING:
+                pass
+            elif isinstance(current, set):
+                value = current | value
+            else:
+                value = current + value
+        elif action == 'DELETE':
+            if current is _MISSING:
+                return
+            value = current - value
+            if not value:
+                del parent[path[-1]]
+                return
+        if isinstance(parent, list) and path[-1] >= len(parent):
+            parent.append(value)
+        else:
+            parent[path[-1]] = value
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues=None):
+        with self.storage.lock:
+            keys = self._key(Key, 'DeleteItem')
+            old = self.storage.get(self.name, *keys)
+            _check_condition(old, ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues,
+                             'DeleteItem')
+            self.storage.delete(self.name, *keys)
+        return {'Attributes': old} if ReturnValues == 'ALL_OLD' and old else {}
+
+    def scan(self, Limit=None, ExclusiveStartKey=None, ProjectionExpression=None, ExpressionAttributeNames=None,
+             ExpressionAttributeValues=None, FilterExpression=None, Segment=None, TotalSegments=None,
+             ConsistentRead=None, Select=None):
+        expression, names, values = _build(FilterExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+        keep = Expression(expression, names, values).condition() if expression else None
+        after = self._key(ExclusiveStartKey, 'Scan') if ExclusiveStartKey else None
+
+        items, scanned, size, last = [], 0, 0, None
+        for pk, sk, row_size, item in self.storage.scan(self.name, after, Segment, TotalSegments):
+            scanned += 1
+            size += row_size
+            last = item
+            if keep is None or keep(item):
+                items.append(project(item, ProjectionExpression, names))
+            if (Limit and scanned >= Limit) or size >= MAX_PAGE_BYTES:
+                break
+        else:
+            last = None
+
+        response = {'Items': items, 'Count': len(items), 'ScannedCount': scanned}
+        if last is not None:
+            response['LastEvaluatedKey'] = self._key_of(last)
+        return response
+
+    def query(self, KeyConditionExpression, IndexName=None, ScanIndexForward=True, Limit=None,
+              ExclusiveStartKey=None, ProjectionExpression=None, ExpressionAttributeNames=None,
+              ExpressionAttributeValues=None, FilterExpression=None, ConsistentRead=None, Select=None):
+        key_expression, names, values = _build(KeyConditionExpression, ExpressionAttributeNames,
+                                               ExpressionAttributeValues, is_key_condition=True)
+        filter_expression, names, values = _build(FilterExpression, names, values)
+
+        hash_key, range_key = (INDEXES.get(self.name, {})[IndexName] if IndexName
+                               else (self.hash_key, self.range_key))
+        hash_value = self._hash_value(key_expression, names, values, hash_key)
+        if hash_key == self.hash_key:
+            candidates = self.storage.partition(self.name, _key_text(hash_value))
+        else:
+            candidates = [item for _, _, _, item in self.storage.scan(self.name)]
+
+        matches = Expression(key_expression, names, values).condition()
+        #a sparse index only holds items that have its sort key
+        items = [item for item in candidates if matches(item) and (not range_key or range_key in item)]
+        order = [k for k in (range_key, self.range_key) if k]
+        items.sort(key=lambda item: tuple(item[k] for k in order if k in item), reverse=not ScanIndexForward)
+
+        if ExclusiveStartKey:
+            start = self._key_of(ExclusiveStartKey)
+            position = next((i for i, item in enumerate(items) if self._key_of(item) == start), None)
+            items = items[position + 1:] if position is not None else []
+
+        page = items[:Limit] if Limit else items
+        keep = Expression(filter_expression, names, values).condition() if filter_expression else None
+        response = {
+            'Items': [project(item, ProjectionExpression, names) for item in page if keep is None or keep(item)],
+            'ScannedCount': len(page),
+        }
+        response['Count'] = len(response['Items'])
+        if Limit and len(page) == Limit and len(items) > Limit:
+            last = page[-1]
+            response['LastEvaluatedKey'] = {k: last[k] for k in {hash_key, range_key, self.hash_key, self.range_key}
+                                            if k and k in last}
+        return response
+
+    @staticmethod
+    def _hash_value(expression, names, values, hash_key):
+        for name, value in re.findall(r'(#?[A-Za-z_][A-Za-z0-9_\-]*)\s*=\s*(:[A-Za-z0-9_]+)', expression):
+            if names.get(name, name) == hash_key:
+                return values[value]
+        raise _error('ValidationException', f"Query condition missed key schema element: {hash_key}", 'Query')
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return LocalBatchWriter(self, overwrite_by_pkeys)
+
+
+class LocalBatchWriter:
+    """Buffers writes like boto3's BatchWriter and applies them on exit"""
+
+    def __init__(self, table, overwrite_by_pkeys=None):
+        self.table = table
+        self.overwrite_by_pkeys = overwrite_by_pkeys
+        self._buffer = []
+
+    def _dedupe(self, key):
+        if self.overwrite_by_pkeys:
+            keys = tuple(key.get(k) for k in self.overwrite_by_pkeys)
+            self._buffer = [(op, value) for op, value in self._buffer
+                            if tuple(value.get(k) for k in self.overwrite_by_pkeys) != keys]
+
+    def put_item(self, Item):
+        self._dedupe(Item)
+        self._buffer.append(('put', Item))
+
+    def delete_item(self, Key):
+        self._dedupe(Key)
+        self._buffer.append(('delete', Key))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for op, value in self._buffer:
+            if op == 'put':
+                self.table.put_item(Item=value)
+            else:
+                self.table.delete_item(Key=value)
+        self._buffer = []
+
+
+class LocalResource:
+    """Stands in for boto3.resource('dynamodb') for Table() and batch_get_item()"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._tables = {}
+
+    def Table(self, name):
+        if name not in self._tables:
+            self._tables[name] = LocalTable(name, self.storage)
+        return self._tables[name]
+
+    def batch_get_item(self, RequestItems):
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.Table(name)
+            items = []
+            for key in request['Keys']:
+                item = table.get_item(Key=key, ProjectionExpression=request.get('ProjectionExpression'),
+                                      ExpressionAttributeNames=request.get('ExpressionAttributeNames')).get('Item')
+                if item:
+                    items.append(item)
+            responses[name] = items
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+
+# --- selection -----------------------------------------------------------
+
+_local = None
+_backend = TABLE_BACKEND
+
+
+def _local_resource():
+    global _local
+    if _local is None:
+        if _backend == 'memory':
+            _local = LocalResource(SQLiteStorage(':memory:'))
+        elif _backend == 'sqlite':
+            _local = LocalResource(SQLiteStorage(TABLE_SQLITE_PATH))
+        else:
+            raise ValueError(f"Unknown TABLE_BACKEND: {_backend}")
+    return _local
+
+
+def get_table(table_name, region):
+    """A Table for table_name; region only matters for DynamoDB"""
+    if _backend == 'dynamodb':
+        return aws_clients.get_table(table_name, region)
+    return _local_resource().Table(table_name)
+
+
+def get_resource(region):
+    """Something with batch_get_item(RequestItems=...) for the given region"""
+    if _backend == 'dynamodb':
+        return aws_clients.get_resource('dynamodb', region)
+    return _local_resource()
+
+
+def set_backend(name, storage=None, resource=None):
+    """Switch backend at runtime, e.g. set_backend('memory') in a load test.
+
+    `resource` replaces the local resource outright, e.g. one that adds latency."""
+    global _backend, _local
+    _backend = name
+    _local = resource or (LocalResource(storage) if storage is not None else None)
+
+
+def backend():
+    return _backend
@@ -0,0 +1,137 @@
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from flask import g, has_request_context
+import src.tables as tables
+import src.feedback_store as feedback_store
+import src.inventory as inventory
+import src.request_timing as request_timing
+
+# Loads everything recipe generation needs about a user in as few DynamoDB
+# round-trips as possible: one BatchGetItem per region plus one inventory
+# query, all fetched in parallel. The result is kept on flask.g for the rest of the request.
+
+logger = logging.getLogger(__name__)
+
+USERS_TABLE = 'Users'
+USERS_REGION = 'eu-west-1'
+PREFERENCES_TABLE = 'user_preferences'
+PREFERENCES_REGION = 'eu-north-1'
+
+# never pull the password hash into the request
+USERS_PROJECTION = {
+    'ProjectionExpression': '#ingredients, #feedbacks',
+    'ExpressionAttributeNames': {'#ingredients': 'ingredients', '#feedbacks': 'feedbacks'},
+}
+
+MAX_BATCH_RETRIES = 5
+
+# bookkeeping kept on the preferences item that is not part of the user's form
+INTERNAL_PREFERENCE_ATTRIBUTES = ('fitbit_steps',)
+
+_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix='user-context')
+
+
+class UserContext:
+    """Everything about a user that a single generation request reads"""
+
+    def __init__(self, user_id, user_item=None, preferences_item=None, profile_item=None, inventory_items=None):
+        self.user_id = user_id
+        self.user_item = user_item or {}
+        self.preferences_item = preferences_item or {}
+        self.profile_item = profile_item
+        self.inventory_items = inventory_items or []
+
+    @property
+    def ingredients(self):
+        if self.inventory_items:
+            return {'foods': self.inventory_items}
+        #the old blob on the Users item, only left for users who have not scanned since
+        return self.user_item.get('ingredients', [])
+
+    @property
+    def feedback(self):
+        #the old unbounded list on the Users item, only left for users who have not submitted since
+        return self.user_item.get('feedbacks', [])
+
+    @property
+    def feedback_profile(self):
+        if self.profile_item is None:
+            return feedback_store.prompt_profile(feedback_store.build_profile(self.feedback))
+        return feedback_store.prompt_profile(self.profile_item)
+
+    @property
+    def preferences_form(self):
+        #[] when nothing is stored, as the prompt has always been given
+        form = {k: v for k, v in self.preferences_item.items() if k not in INTERNAL_PREFERENCE_ATTRIBUTES}
+        return form or []
+
+    @property
+    def fitbit_access_token(self):
+        return self.preferences_item.get('fitbit_access_token') or ""
+
+
+def batch_get(dynamodb, request_items):
+    """Run a BatchGetItem, retrying UnprocessedKeys, and return {table_name: [items]}"""
+    results = {table_name: [] for table_name in request_items}
+    pending = request_items
+
+    for attempt in range(MAX_BATCH_RETRIES):
+        response = dynamodb.batch_get_item(RequestItems=pending)
+        for table_name, items in response.get('Responses', {}).items():
+            results[table_name].extend(items)
+
+        pending = response.get('UnprocessedKeys') or {}
+        if not pending:
+            return results
+        time.sleep(0.05 * (2 ** attempt))
+
+    raise RuntimeError(f"BatchGetItem left unprocessed keys for {list(pending)}")
+
+
+def _first(results, table_name):
+    items = results.get(table_name) or []
+    return items[0] if items else None
+
+
+def _load_user_items(user_id):
+    # the feedback profile lives in the same region, so it rides along in the same batch
+    results = batch_get(tables.get_resource(USERS_REGION), {
+        USERS_TABLE: {
+            'Keys': [{'username': user_id}],
+            **USERS_PROJECTION,
+        },
+        feedback_store.FEEDBACK_TABLE: {'Keys': [feedback_store.profile_key(user_id)]},
+    })
+    return _first(results, USERS_TABLE), _first(results, feedback_store.FEEDBACK_TABLE)
+
+
+def _load_preferences_item(user_id):
+    results = batch_get(tables.get_resource(PREFERENCES_REGION), {
+        PREFERENCES_TABLE: {'Keys': [{'user_id': user_id}]},
+    })
+    return _first(results, PREFERENCES_TABLE)
+
+
+def load_user_context(user_id):
+    """Fetch both regions in parallel and build a UserContext"""
+    start = time.perf_counter()
+    user_future = _executor.submit(request_timing.bind(_load_user_items), user_id)
+    preferences_future = _executor.submit(request_timing.bind(_load_preferences_item), user_id)
+    inventory_future = _executor.submit(request_timing.bind(inventory.soonest), user_id)
+
+    user_item, profile_item = user_future.result()
+    context = UserContext(user_id, user_item, preferences_future.result(), profile_item, inventory_future.result())
+    logger.debug(f"Loaded user context for {user_id} in {(time.perf_counter() - start) * 1000:.1f}ms")
+    return context
+
+
+def get_user_context(user_id):
+    """Return the UserContext for this request, loading it on first use"""
+    if not has_request_context():
+        return load_user_context(user_id)
+
+    contexts = g.setdefault('user_contexts', {})
+    if user_id not in contexts:
+        contexts[user_id] = load_user_context(user_id)
+    return contexts[user_id]
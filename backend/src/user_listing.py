@@ -0,0 +1,103 @@
+import os
+import json
+import queue
+import logging
+import threading
+from decimal import Decimal
+from src.pagination import encode_cursor, decode_cursor
+
+# Listing the Users table without pulling password hashes, feedback or
+# ingredient blobs. Pages are projected to public fields and handed out with
+# a cursor; admin exports scan the table in parallel segments and stream
+# JSON lines, with a bounded queue keeping memory flat.
+
+logger = logging.getLogger(__name__)
+
+PUBLIC_FIELDS = ('username', 'id', 'name')
+USERS_PAGE_SIZE = 50
+MAX_USERS_PAGE_SIZE = 500
+EXPORT_SEGMENTS = int(os.environ.get('USERS_EXPORT_SEGMENTS', 4))
+MAX_EXPORT_SEGMENTS = 16
+# items buffered between the scanning threads and the response
+EXPORT_QUEUE_SIZE = 1000
+# the export is off unless this is set; callers send it as X-Admin-Token
+ADMIN_EXPORT_TOKEN = os.environ.get('ADMIN_EXPORT_TOKEN')
+
+_DONE = object()
+
+
+def projection():
+    names = {f'#{field}': field for field in PUBLIC_FIELDS}
+    return {'ProjectionExpression': ', '.join(names), 'ExpressionAttributeNames': names}
+
+
+def _public(item):
+    return {field: _plain(item[field]) for field in PUBLIC_FIELDS if field in item}
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+def list_page(table, limit=USERS_PAGE_SIZE, cursor=None):
+    """One page of public user fields; returns (users, next cursor)"""
+    scan = {'Limit': max(1, min(int(limit), MAX_USERS_PAGE_SIZE)), **projection()}
+    if cursor:
+        scan['ExclusiveStartKey'] = decode_cursor(cursor)
+    response = table.scan(**scan)
+    return [_public(item) for item in response.get('Items', [])], encode_cursor(response.get('LastEvaluatedKey'))
+
+
+def _scan_segment(table, segment, total_segments, out, stop):
+    scan = {'Segment': segment, 'TotalSegments': total_segments, **projection()}
+    try:
+        while not stop.is_set():
+            response = table.scan(**scan)
+            for item in response.get('Items', []):
+                _put(out, _public(item), stop)
+            if 'LastEvaluatedKey' not in response:
+                break
+            scan['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    except Exception as e:
+        logger.error(f"Users export segment {segment} failed: {e}")
+        _put(out, e, stop)
+    finally:
+        _put(out, _DONE, stop)
+
+
+def _put(out, value, stop):
+    #a full queue means the client is slow, wait for it unless the export was abandoned
+    while not stop.is_set():
+        try:
+            out.put(value, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+
+
+def export_lines(table, segments=EXPORT_SEGMENTS):
+    """JSON lines of every user's public fields, scanned in parallel segments"""
+    segments = max(1, min(int(segments), MAX_EXPORT_SEGMENTS))
+    out = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+    stop = threading.Event()
+    workers = [threading.Thread(target=_scan_segment, args=(table, i, segments, out, stop),
+                                name=f'users-export-{i}', daemon=True) for i in range(segments)]
+    for worker in workers:
+        worker.start()
+
+    finished = 0
+    try:
+        while finished < segments:
+            value = out.get()
+            if value is _DONE:
+                finished += 1
+            elif isinstance(value, Exception):
+                yield json.dumps({'error': 'Export failed'}) + '\n'
+                return
+            else:
+                yield json.dumps(value) + '\n'
+    finally:
+        # also runs when the client goes away and the generator is closed
+        stop.set()
@@ -1,20 +1,17 @@
 from flask import Flask, request, jsonify, Blueprint
 from flask_login import current_user, login_required
-import boto3
 import logging
+import src.tables as tables
+import src.session_cache as session_cache
 
 user_preferences_bp = Blueprint('user_preferences', __name__)
-logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
 
-dynamodb = boto3.resource('dynamodb', region_name='eu-north-1') 
 table_name = "user_preferences"
 
-dynamodb_w = boto3.resource('dynamodb', region_name='eu-west-1') 
-sessions_table = dynamodb_w.Table('UserSessions')
-
 
 def get_table():
-    return dynamodb.Table(table_name)
+    return tables.get_table(table_name, 'eu-north-1')
 
 @user_preferences_bp.route("/add_user_preferences", methods=["POST"])
 def add_user_preferences():
@@ -28,17 +25,13 @@ def add_user_preferences():
         sessionID = data.get('sessionId')
 
         if not sessionID:
-            logging.error("Session ID is missing from request")
+            logger.error("Session ID is missing from request")
             return jsonify({"error": "Must provide session id"}), 401
         
-        resp = sessions_table.get_item(Key={'sessionId':sessionID})
-        if 'Item' not in resp:
-            logging.error(f"Invalid session ID: {sessionID}")
-            return jsonify({"error": "Invalid session id"}), 401
-  
-        user_id = resp['Item']['userId']  
+        user_id = session_cache.resolve_user_id(sessionID)
         if not user_id:
-            return jsonify({"error": "Could not find user"}), 400
+            logger.error(f"Invalid session ID: {sessionID}")
+            return jsonify({"error": "Invalid session id"}), 401
 
         diet = data.get('diet')
         budget= data.get('budget')
@@ -54,16 +47,16 @@ def add_user_preferences():
 
         number_of_people = int(number_of_people)
 
-        logging.info(f"Received data: diet={diet},budget={budget},"
-                     f" cuisines={cuisines}, allergens={allergens}, kitchen_equipment={kitchen_equipment},"
-                     f" number_of_people={number_of_people}, notification_options={notification_options}")
+        logger.debug(f"Received data: diet={diet},budget={budget},"
+                      f" cuisines={cuisines}, allergens={allergens}, kitchen_equipment={kitchen_equipment},"
+                      f" number_of_people={number_of_people}, notification_options={notification_options}")
 
         if (not diet or not budget or not cuisines or not allergens or not kitchen_equipment
                 or not number_of_people or not notification_options):
-            logging.error("Invalid input data")
+            logger.error("Invalid input data")
             return jsonify({"error": "Invalid input data"}), 400
 
-        table = dynamodb.Table(table_name)
+        table = get_table()
         response = table.put_item(Item={  # posts
         'user_id': user_id,
         'diet': diet,
@@ -76,34 +69,9 @@ def add_user_preferences():
         'fitbit_access_token': fitbit_access_token
         })
 
-        logging.info(f"DynamoDB Response: {response}")
+        logger.debug(f"DynamoDB Response: {response}")
         return jsonify({"output": "User preferences logged"}), 201  # confirm logged
 
     except Exception as e:
-        logging.error(f"Error adding user preference: {e}", exc_info=True)  # error message for debugging
+        logger.error(f"Error adding user preference: {e}", exc_info=True)  # error message for debugging
         return jsonify({"error": "An unexpected error occurred"}), 500
-
-def retrieve_user_pref(user_id):
-    #retrieve items from DB 
-    table = get_table()
-
-    response = table.get_item(Key={'user_id':user_id})
-    
-    # Check if the item exists
-    if 'Item' in response:
-        return response['Item'] 
-    else:
-        return []
-
-def retrieve_access_token(user_id):
-    #retrieve items from DB 
-    table = get_table()
-
-    response = table.get_item(Key={'user_id':user_id})
-    
-    # Check if the item exists
-    if 'Item' in response:
-        return response['Item'].get('fitbit_access_token', "")
-    else:
-        return ""
-
@@ -0,0 +1,31 @@
+import sys
+import os
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# the lambda layer in /python ships awsgi, use it when it is not installed locally
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'python'))
+# importing app must not build AWS clients, tests that need the init phase call lifecycle.initialize()
+os.environ.setdefault('LIFECYCLE_INIT', '0')
+
+import src.aws_clients as aws_clients
+import src.session_cache as session_cache
+import src.meal_plan_cache as meal_plan_cache
+import src.image_cache as image_cache
+import src.fitbit as fitbit
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    #caches live for the whole process, so reset them between tests
+    session_cache.clear()
+    image_cache.cache.clear()
+    fitbit.client.clear()
+    aws_clients.reset()
+    # memory only, so no plan leaks between tests through /tmp
+    meal_plan_cache.set_cache(meal_plan_cache.TieredCache([meal_plan_cache.MemoryBackend()]))
+    yield
+    session_cache.clear()
+    image_cache.cache.clear()
+    fitbit.client.clear()
+    aws_clients.reset()
@@ -0,0 +1,39 @@
+from unittest import mock
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.aws_clients as aws_clients
+
+
+def test_clients_are_built_once_per_service_and_region():
+    first = aws_clients.get_client('dynamodb', 'eu-west-1')
+    second = aws_clients.get_client('dynamodb', 'eu-west-1')
+    other = aws_clients.get_client('dynamodb', 'eu-north-1')
+
+    assert first is second
+    assert first is not other
+    assert first.meta.config.max_pool_connections == aws_clients.AWS_CONFIG.max_pool_connections
+    assert first.meta.config.retries['mode'] == 'adaptive'
+
+
+def test_tables_share_one_resource_per_region():
+    users = aws_clients.get_table('Users', 'eu-west-1')
+    sessions = aws_clients.get_table('UserSessions', 'eu-west-1')
+
+    assert users.meta.client is sessions.meta.client
+    assert aws_clients.get_table('Users', 'eu-west-1') is users
+
+
+def test_calls_are_counted_and_timed():
+    client = aws_clients.get_client('dynamodb', 'eu-west-1')
+    http_response = mock.Mock(status_code=200, headers={}, content=b'{"TableNames": []}')
+    http_response.raw = mock.Mock()
+
+    with mock.patch.object(client._endpoint, 'make_request', return_value=(http_response, {'TableNames': []})):
+        client.list_tables()
+        client.list_tables()
+
+    stats = aws_clients.stats()['dynamodb:eu-west-1']['ListTables']
+    assert stats['calls'] == 2
+    assert stats['errors'] == 0
+    assert stats['avg_ms'] >= 0
@@ -0,0 +1,219 @@
+import json
+import awsgi
+from flask import Flask, request, jsonify, make_response
+
+app = Flask(__name__)
+
+
+@app.route('/echo', methods=['GET', 'POST'])
+def echo():
+    response = make_response(jsonify({
+        'method': request.method,
+        'path': request.path,
+        'script_root': request.script_root,
+        'args': request.args.to_dict(flat=False),
+        'cookies': request.cookies,
+        'accept': request.headers.get('Accept'),
+        'remote_addr': request.remote_addr,
+        'body': request.get_data(as_text=True),
+        'source': request.environ['awsgi.event_source'],
+    }))
+    response.set_cookie('a', '1')
+    response.set_cookie('b', '2')
+    return response
+
+
+@app.route('/', methods=['GET', 'POST'])
+def root():
+    return jsonify({'path': request.path, 'script_root': request.script_root})
+
+
+def v2_event(domain='abc123.execute-api.eu-west-1.amazonaws.com', stage='$default', path='/echo', **kwargs):
+    event = {
+        'version': '2.0',
+        'routeKey': '$default',
+        'rawPath': path,
+        'rawQueryString': 'tag=a&tag=b&q=x%20y',
+        'cookies': ['session=s1', 'theme=dark'],
+        'headers': {'accept': 'application/json,text/plain', 'content-type': 'text/plain', 'host': domain},
+        'queryStringParameters': {'tag': 'a,b', 'q': 'x y'},
+        'requestContext': {
+            'domainName': domain,
+            'http': {'method': 'POST', 'path': path, 'protocol': 'HTTP/1.1', 'sourceIp': '198.51.100.7'},
+            'requestId': 'r1',
+            'stage': stage,
+        },
+        'body': 'aGVsbG8=',
+        'isBase64Encoded': True,
+    }
+    event.update(kwargs)
+    return event
+
+
+def test_http_api_v2_event():
+    response = awsgi.response(app, v2_event(), None)
+    body = json.loads(response['body'])
+
+    assert response['statusCode'] == 200
+    assert body['method'] == 'POST'
+    assert body['path'] == '/echo'
+    assert body['args'] == {'tag': ['a', 'b'], 'q': ['x y']}
+    assert body['cookies'] == {'session': 's1', 'theme': 'dark'}
+    assert body['accept'] == 'application/json,text/plain'
+    assert body['remote_addr'] == '198.51.100.7'
+    assert body['body'] == 'hello'
+    assert body['source'] == 'http-api'
+    assert sorted(c.split(';')[0] for c in response['cookies']) == ['a=1', 'b=2']
+    assert 'Set-Cookie' not in response['headers']
+
+
+def test_function_url_and_named_stage():
+    url = awsgi.response(app, v2_event(domain='xyz.lambda-url.eu-west-1.on.aws'), None)
+    staged = awsgi.response(app, v2_event(stage='prod', path='/prod/echo'), None)
+
+    assert json.loads(url['body'])['source'] == 'function-url'
+    assert json.loads(staged['body'])['path'] == '/echo'
+    assert json.loads(staged['body'])['script_root'] == '/prod'
+
+    # the stage root itself, with no trailing slash
+    root = awsgi.response(app, v2_event(stage='prod', path='/prod'), None)
+    assert json.loads(root['body']) == {'path': '/', 'script_root': '/prod'}
+
+
+def test_rest_api_multi_value_query_and_headers():
+    event = {
+        'httpMethod': 'GET',
+        'path': '/echo',
+        'headers': {'Accept': 'text/plain'},
+        'multiValueHeaders': {'Accept': ['application/json', 'text/plain']},
+        'queryStringParameters': {'tag': 'b'},
+        'multiValueQueryStringParameters': {'tag': ['a', 'b']},
+        'requestContext': {'stage': 'prod'},
+        'body': None,
+    }
+
+    response = awsgi.response(app, event, None)
+    body = json.loads(response['body'])
+
+    assert response['statusCode'] == '200'
+    assert body['args'] == {'tag': ['a', 'b']}
+    assert body['accept'] == 'application/json,text/plain'
+    assert body['source'] == 'rest-api'
+
+
+def test_body_input_reads_without_copying():
+    body = b'first line\nsecond line\nrest'
+    stream = awsgi.BodyInput(body)
+
+    assert stream.read() is body
+    stream = awsgi.BodyInput(body)
+    assert stream.readline() == b'first line\n'
+    buffer = bytearray(6)
+    assert stream.readinto(buffer) == 6 and bytes(buffer) == b'second'
+    assert list(stream) == [b' line\n', b'rest']
+    assert stream.read() == b''
+
+
+def test_chunked_responses_are_joined_and_closed():
+    closed = []
+
+    class Body(list):
+        def close(self):
+            closed.append(True)
+
+    def chunked_app(environ, start_response):
+        write = start_response('200 OK', [('Content-Type', 'text/plain')])
+        write(b'head ')
+        return Body([b'caf\xc3\xa9 ', b'tail'])
+
+    response = awsgi.response(chunked_app, {'httpMethod': 'POST', 'path': '/', 'queryStringParameters': None,
+                                            'body': 'eyJhIjogMX0=', 'isBase64Encoded': True}, None)
+
+    assert response['body'] == 'head café tail'
+    assert closed == [True]
+
+
+def test_stream_writes_prelude_then_each_chunk():
+    out = awsgi.MemoryResponseStream()
+    seen = []
+
+    def plan_app(environ, start_response):
+        # a generator app, start_response only runs once the first chunk is asked for
+        start_response('200 OK', [('Content-Type', 'application/x-ndjson'), ('Set-Cookie', 'a=1')])
+        for day in ('mon', 'tue', 'wed'):
+            # what has reached the client by the time the next chunk is produced
+            seen.append(len(out.writes))
+            yield (json.dumps({'day': day}) + '\n').encode()
+
+    written = awsgi.stream(plan_app, v2_event(path='/plan'), None, out)
+
+    assert out.content_type == awsgi.STREAMING_CONTENT_TYPE
+    assert out.prelude() == {'statusCode': 200, 'headers': {'Content-Type': 'application/x-ndjson'},
+                             'cookies': ['a=1']}
+    assert out.body().splitlines() == [b'{"day": "mon"}', b'{"day": "tue"}', b'{"day": "wed"}']
+    assert written == len(out.body())
+    # the prelude goes out with the first chunk, every later chunk right away
+    assert seen == [0, 3, 4]
+    assert out.closed
+
+
+def test_compression_follows_accept_encoding():
+    import base64
+    import gzip
+    import zlib
+    plan = json.dumps([{'day': n, 'meal': 'Lentil Dahl with rice and greens'} for n in range(200)]).encode()
+    stats = []
+
+    def plan_app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'application/json'), ('Content-Length', str(len(plan))),
+                                  ('Vary', 'Origin')])
+        return [plan]
+
+    def call(accept, min_size=1024, app=plan_app):
+        event = {'httpMethod': 'GET', 'path': '/plan', 'queryStringParameters': None,
+                 'headers': {'Accept-Encoding': accept} if accept else {}}
+        return awsgi.response(app, event, None,
+                              compression=awsgi.Compression(min_size=min_size, on_compress=stats.append))
+
+    response = call('deflate;q=0.5, gzip, br;q=0')
+    assert response['isBase64Encoded']
+    assert response['headers']['Content-Encoding'] == 'gzip'
+    assert response['headers']['Vary'] == 'Origin, Accept-Encoding'
+    compressed = base64.b64decode(response['body'])
+    assert gzip.decompress(compressed) == plan
+    assert response['headers']['Content-Length'] == str(len(compressed))
+    assert stats[-1]['encoding'] == 'gzip' and stats[-1]['ratio'] > 5 and stats[-1]['cpu_ms'] >= 0
+
+    assert zlib.decompress(base64.b64decode(call('deflate')['body'])) == plan
+
+    # not accepted, too small, or not in the allowlist: sent as is
+    for response in (call(None), call('identity'), call('gzip', min_size=len(plan) + 1)):
+        assert not response['isBase64Encoded'] and 'Content-Encoding' not in response['headers']
+        assert response['body'] == plan.decode()
+    png = awsgi.response(lambda environ, start_response: start_response('200 OK', [('Content-Type', 'image/png')])
+                         and [b'\x89PNG' * 1000],
+                         {'httpMethod': 'GET', 'path': '/', 'queryStringParameters': None,
+                          'headers': {'Accept-Encoding': 'gzip'}}, None,
+                         base64_content_types={'image/png'}, compression=awsgi.Compression())
+    assert 'Content-Encoding' not in png['headers']
+    assert base64.b64decode(png['body']) == b'\x89PNG' * 1000
+    assert len(stats) == 2
+
+
+def test_alb_multi_value_event_gets_multi_value_headers():
+    event = {
+        'requestContext': {'elb': {'targetGroupArn': 'arn:aws:elasticloadbalancing:eu-west-1:1:targetgroup/tg/1'}},
+        'httpMethod': 'GET',
+        'path': '/echo',
+        'multiValueQueryStringParameters': {},
+        'multiValueHeaders': {'accept': ['application/json']},
+        'body': '',
+        'isBase64Encoded': False,
+    }
+    response = awsgi.response(app, event, None)
+
+    assert response['statusCode'] == 200
+    assert 'headers' not in response
+    assert response['multiValueHeaders']['Content-Type'] == ['application/json']
+    assert [c.split(';')[0] for c in response['multiValueHeaders']['Set-Cookie']] == ['a=1', 'b=2']
+    assert json.loads(response['body'])['source'] == 'elb'
@@ -0,0 +1,76 @@
+import re
+import threading
+import time
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.fanout import generate_week, DAYS
+from src.grocery_list import build_grocery_list, parse_ingredient
+
+
+def fake_complete(titles):
+    #answers each day's prompt with the next title for that day
+    calls = []
+    lock = threading.Lock()
+
+    def complete(prompt):
+        days = re.search(r'one for each of these days: (.*)\.', prompt).group(1).split(', ')
+        with lock:
+            calls.append(days)
+        return {"recipes": [{"title": titles[day].pop(0), "ingredients": ["200g rice", "1 onion"]} for day in days]}
+
+    return complete, calls
+
+
+def test_each_day_generated_and_ordered():
+    complete, calls = fake_complete({day: [f"{day} special"] for day in DAYS})
+    menu = generate_week("inputs", complete, available_ingredients=["Onion"])
+
+    assert [r["day_of_the_week"] for r in menu["recipes"]] == DAYS
+    assert len(calls) == 7
+    assert menu["grocery_list"] == [{"name": "rice", "quantity": "1.4kg", "category": "Grains"}]
+
+
+def test_duplicate_titles_are_regenerated():
+    titles = {day: [f"{day} special"] for day in DAYS}
+    titles["Friday"] = ["Monday Special", "Fish pie"]
+    complete, calls = fake_complete(titles)
+
+    menu = generate_week("inputs", complete, available_ingredients=[], per_call=2)
+
+    assert menu["recipes"][4]["title"] == "Fish pie"
+    assert ["Friday"] in calls  # retried on its own
+    assert len({r["title"].lower() for r in menu["recipes"]}) == 7
+
+
+def test_concurrency_is_bounded():
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def complete(prompt):
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.02)
+        with lock:
+            active.pop()
+        day = re.search(r'these days: (\w+)', prompt).group(1)
+        return {"recipes": [{"title": day, "ingredients": []}]}
+
+    generate_week("inputs", complete, [], concurrency=2)
+    assert max(peak) <= 2
+
+
+def test_grocery_list_merges_units():
+    recipes = [
+        {"ingredients": ["500 g chicken breast, diced", "2 tbsp olive oil", "Salt to taste"]},
+        {"ingredients": ["0.5kg chicken breasts", "1 tbsp olive oil", "2 eggs"]},
+    ]
+    grocery_list = build_grocery_list(recipes, ["salt"])
+    assert grocery_list == [
+        {"name": "egg", "quantity": "2", "category": "Dairy"},
+        {"name": "chicken breast", "quantity": "1kg", "category": "Meat"},
+        {"name": "olive oil", "quantity": "3 tbsp", "category": "Spices & Condiments"},
+    ]
+    assert parse_ingredient("1/2 cup rice") == ("rice", 0.5, "cup")
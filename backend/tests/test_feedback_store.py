@@ -0,0 +1,73 @@
+from unittest import mock
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.feedback_store as feedback_store
+from src.user_context import UserContext
+
+
+def test_classify_sentiment_and_complaints():
+    assert feedback_store.classify("Liked it but too spicy") == ('liked', ['too spicy'])
+    assert feedback_store.classify("didn't like it") == ('disliked', [])
+    assert feedback_store.classify("way too salty") == ('disliked', ['too salty'])
+    assert feedback_store.classify("made it twice") == (None, [])
+
+
+def test_profile_is_compact_and_counts_complaints():
+    profile = feedback_store.build_profile([
+        {'recipeTitle': 'Chili', 'feedback': 'loved it'},
+        {'recipeTitle': 'Curry', 'feedback': 'too spicy'},
+        {'recipeTitle': 'Chili', 'feedback': 'bad, too spicy'},
+        {'recipeTitle': 'Soup', 'feedback': 'made it for my mum'},
+    ])
+
+    assert profile['likes'] == []
+    assert profile['dislikes'] == ['Chili', 'Curry']
+    assert profile['complaints'] == {'too spicy': 2}
+    assert profile['count'] == 4
+    assert feedback_store.prompt_profile(profile) == {
+        'dislikes': ['Chili', 'Curry'],
+        'notes': ['Soup: made it for my mum'],
+        'complaints': {'too spicy': 2},
+    }
+
+
+def test_add_feedback_folds_legacy_list_into_new_profile():
+    table = mock.Mock()
+    table.get_item.return_value = {}
+    with mock.patch('src.feedback_store.get_table', return_value=table):
+        profile = feedback_store.add_feedback('bob', 'Pasta', 'liked', legacy_feedbacks=[
+            {'recipeTitle': 'Stew', 'feedback': 'too bland'}])
+
+    assert profile['likes'] == ['Pasta']
+    assert profile['complaints'] == {'too bland': 1}
+    entry, stored_profile = [call.kwargs for call in table.put_item.call_args_list]
+    assert entry['Item']['sk'].startswith('FEEDBACK#')
+    assert stored_profile['Item']['sk'] == 'PROFILE'
+    assert stored_profile['Item']['version'] == 1
+    assert stored_profile['ExpressionAttributeValues'] == {':version': 0}
+
+
+def test_list_feedback_round_trips_cursor():
+    table = mock.Mock()
+    table.query.return_value = {
+        'Items': [{'recipeTitle': 'Pasta', 'feedback': 'liked', 'created_at': '2024-01-01'}],
+        'LastEvaluatedKey': {'user_id': 'bob', 'sk': 'FEEDBACK#2024-01-01'},
+    }
+    with mock.patch('src.feedback_store.get_table', return_value=table):
+        items, cursor = feedback_store.list_feedback('bob', limit=1)
+        feedback_store.list_feedback('bob', limit=1, cursor=cursor)
+        with pytest.raises(ValueError):
+            feedback_store.list_feedback('eve', cursor=cursor)
+
+    assert items[0]['recipeTitle'] == 'Pasta'
+    assert table.query.call_args.kwargs['ExclusiveStartKey'] == {'user_id': 'bob', 'sk': 'FEEDBACK#2024-01-01'}
+    assert table.query.call_args.kwargs['ScanIndexForward'] is False
+
+
+def test_context_prefers_stored_profile_over_legacy_list():
+    legacy = {'feedbacks': [{'recipeTitle': 'Stew', 'feedback': 'liked'}]}
+
+    assert UserContext('bob', legacy).feedback_profile == {'likes': ['Stew']}
+    assert UserContext('bob', legacy, profile_item={'likes': ['Pasta'], 'version': 3}).feedback_profile == {'likes': ['Pasta']}
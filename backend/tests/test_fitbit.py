@@ -0,0 +1,93 @@
+from datetime import date
+from unittest import mock
+import requests
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.fitbit import CircuitBreaker, FitbitClient, date_window
+from src.user_context import UserContext
+from src.openai import get_activity
+
+
+def _response(status, steps=None):
+    response = mock.Mock(status_code=status)
+    response.json.return_value = {'activities-steps': [{'value': str(s)} for s in steps or []]}
+    return response
+
+
+def _client(*responses):
+    session = mock.Mock()
+    session.get.side_effect = list(responses)
+    return FitbitClient(session=session, breaker=CircuitBreaker(max_failures=2, reset_after=60)), session
+
+
+def test_date_window_ends_today():
+    assert date_window(date(2024, 1, 14)) == ('2024-01-08', '2024-01-14')
+
+
+@mock.patch('src.fitbit.tables.get_table')
+def test_average_is_fetched_once_per_day(mock_get_table):
+    client, session = _client(_response(200, [7000, 9000]))
+
+    assert client.get_average_steps('token', 'FB1', user_id='alice') == 8000
+    assert client.get_average_steps('token', 'FB1', user_id='alice') == 8000
+    assert session.get.call_count == 1
+    assert session.get.call_args.kwargs['timeout']
+    # persisted for other containers
+    mock_get_table.return_value.update_item.assert_called_once()
+
+
+def test_stored_aggregate_for_today_skips_the_api():
+    client, session = _client()
+    start, end = date_window()
+
+    assert client.get_average_steps('token', 'FB1', stored={'window': f'{start}/{end}', 'avg_steps': 12000}) == 12000
+    session.get.assert_not_called()
+
+
+def test_failures_return_none_and_open_the_breaker():
+    client, session = _client(requests.exceptions.ConnectTimeout(), _response(503))
+
+    assert client.get_average_steps('token', 'FB1') is None
+    assert client.get_average_steps('token', 'FB1') is None
+    assert client.get_average_steps('token', 'FB1') is None
+    assert session.get.call_count == 2
+    assert client.stats()['breaker'] == 'open'
+    assert client.stats()['short_circuited'] == 1
+
+
+def test_rejected_token_does_not_trip_the_breaker():
+    client, _ = _client(_response(401), _response(401))
+
+    assert client.get_average_steps('bad', 'FB1') is None
+    assert client.get_average_steps('bad', 'FB1') is None
+    assert client.stats()['breaker'] == 'closed'
+
+
+@mock.patch('src.openai.fitbit.get_average_steps', return_value=None)
+def test_activity_is_skipped_when_fitbit_is_unavailable(mock_steps):
+    context = UserContext('alice', preferences_item={
+        'fitbit_access_token': 'https://app/callback?access_token=abc&user_id=FB1'})
+
+    assert get_activity(context) is None
+    mock_steps.assert_called_once_with('abc', 'FB1', user_id='alice', stored=None)
+
+
+def test_half_open_lets_only_one_trial_call_through():
+    now = [0.0]
+    breaker = CircuitBreaker(max_failures=1, reset_after=60, clock=lambda: now[0])
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    now[0] = 61
+    assert breaker.state == 'half-open'
+    assert breaker.allow()
+    # a second caller arriving while the trial is in flight is turned away
+    assert not breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+    now[0] = 122
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow() and breaker.allow()
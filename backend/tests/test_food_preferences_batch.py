@@ -0,0 +1,138 @@
+from unittest.mock import MagicMock
+from botocore.exceptions import ClientError
+from flask import Flask
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.PushMealPreferencesFile_Tabled import food_preferences_bp
+
+
+def create_client():
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.register_blueprint(food_preferences_bp)
+    return app.test_client()
+
+
+def setup_tables(mocker):
+    sessions = MagicMock()
+    sessions.get_item.return_value = {'Item': {'userId': 'alice'}}
+    mocker.patch('src.session_cache.get_sessions_table', return_value=sessions)
+
+    table = MagicMock()
+    batch = table.batch_writer.return_value.__enter__.return_value
+    mocker.patch('src.PushMealPreferencesFile_Tabled.get_table', return_value=table)
+
+    idempotency = MagicMock()
+    mocker.patch('src.PushMealPreferencesFile_Tabled.get_idempotency_table', return_value=idempotency)
+    return batch, idempotency
+
+
+def test_batch_dedupes_last_write_wins(mocker):
+    batch, _ = setup_tables(mocker)
+
+    response = create_client().post('/add_food_preferences/batch', json={
+        'sessionId': 's1',
+        'events': [
+            {'food_id': 'pizza', 'is_liked': True},
+            {'food_id': 'sushi', 'is_liked': True},
+            {'food_id': 'pizza', 'is_liked': False},
+        ],
+    })
+
+    assert response.status_code == 201
+    assert response.json['written'] == 2
+    items = [call.kwargs['Item'] for call in batch.put_item.call_args_list]
+    assert items == [
+        {'user_id': 'alice', 'food_id': 'pizza', 'is_liked': False},
+        {'user_id': 'alice', 'food_id': 'sushi', 'is_liked': True},
+    ]
+
+
+def test_batch_rejects_invalid_event(mocker):
+    batch, _ = setup_tables(mocker)
+
+    response = create_client().post('/add_food_preferences/batch', json={
+        'sessionId': 's1', 'events': [{'food_id': 'pizza', 'is_liked': True}, {'food_id': ''}]})
+
+    assert response.status_code == 400
+    assert 'index 1' in response.json['error']
+    batch.put_item.assert_not_called()
+
+
+def test_replayed_idempotency_key_returns_stored_response(mocker):
+    batch, idempotency = setup_tables(mocker)
+    idempotency.put_item.side_effect = ClientError(
+        {'Error': {'Code': 'ConditionalCheckFailedException', 'Message': ''}}, 'PutItem')
+    idempotency.get_item.return_value = {'Item': {
+        'status': 'done', 'response': '{"output": "Food preferences logged", "received": 1, "written": 1}'}}
+
+    response = create_client().post('/add_food_preferences/batch', headers={'Idempotency-Key': 'flush-1'},
+                                    json={'sessionId': 's1', 'events': [{'food_id': 'pizza', 'is_liked': True}]})
+
+    assert response.status_code == 200
+    assert response.json['written'] == 1
+    idempotency.get_item.assert_called_once_with(Key={'idempotency_key': 'alice#flush-1'})
+    batch.put_item.assert_not_called()
+
+
+def test_retry_takes_over_a_key_left_pending_by_a_crash(mocker):
+    import src.tables as tables
+    import src.PushMealPreferencesFile_Tabled as batches
+    tables.set_backend('memory')
+    try:
+        tables.get_table('UserSessions', 'eu-west-1').put_item(
+            Item={'sessionId': 's1', 'userId': 'alice', 'ttl': 4102444800})
+        request = {'sessionId': 's1', 'events': [{'food_id': 'pizza', 'is_liked': True}]}
+        now = 1_700_000_000
+        clock = mocker.patch('src.PushMealPreferencesFile_Tabled.time.time', return_value=now)
+
+        # the first invocation claimed the key and was killed before writing anything
+        assert batches.claim_idempotency_key('alice#flush-1') is None
+
+        client = create_client()
+        response = client.post('/add_food_preferences/batch', headers={'Idempotency-Key': 'flush-1'}, json=request)
+        assert response.status_code == 409
+
+        clock.return_value = now + batches.IDEMPOTENCY_PENDING_TIMEOUT + 1
+        response = client.post('/add_food_preferences/batch', headers={'Idempotency-Key': 'flush-1'}, json=request)
+        assert response.status_code == 201
+        assert batches.get_table().get_item(Key={'user_id': 'alice', 'food_id': 'pizza'})['Item']['is_liked'] is True
+
+        # once done, a replay gets the stored response even after the pending window
+        response = client.post('/add_food_preferences/batch', headers={'Idempotency-Key': 'flush-1'}, json=request)
+        assert response.status_code == 200 and response.json['written'] == 1
+    finally:
+        tables.set_backend('dynamodb')
+
+
+def test_batch_rejects_unhashable_food_id(mocker):
+    batch, _ = setup_tables(mocker)
+
+    for food_id in (['pizza'], {'name': 'pizza'}, 7):
+        response = create_client().post('/add_food_preferences/batch', json={
+            'sessionId': 's1', 'events': [{'food_id': food_id, 'is_liked': True}]})
+        assert response.status_code == 400
+        assert 'index 0' in response.json['error']
+    batch.put_item.assert_not_called()
+
+
+def test_reused_idempotency_key_with_other_events_conflicts(mocker):
+    import src.tables as tables
+    tables.set_backend('memory')
+    try:
+        tables.get_table('UserSessions', 'eu-west-1').put_item(
+            Item={'sessionId': 's1', 'userId': 'alice', 'ttl': 4102444800})
+        client = create_client()
+        first = {'sessionId': 's1', 'events': [{'food_id': 'pizza', 'is_liked': True}]}
+        other = {'sessionId': 's1', 'events': [{'food_id': 'sushi', 'is_liked': False}]}
+
+        assert client.post('/add_food_preferences/batch', headers={'Idempotency-Key': 'flush-2'},
+                           json=first).status_code == 201
+        response = client.post('/add_food_preferences/batch', headers={'Idempotency-Key': 'flush-2'}, json=other)
+        assert response.status_code == 409
+        assert 'different batch' in response.json['error']
+        assert client.post('/add_food_preferences/batch', headers={'Idempotency-Key': 'flush-2'},
+                           json=first).status_code == 200
+    finally:
+        tables.set_backend('dynamodb')
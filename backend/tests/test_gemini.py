@@ -1,7 +1,7 @@
 # import sys
 # import os
 # sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-# from src.openai import get_secret
+# from src.openai_client import get_secret
 # import pytest
 # from unittest import mock
 # import json
@@ -0,0 +1,16 @@
+from src.grocery_list import is_available, build_grocery_list
+
+
+def test_ingredient_is_not_available_because_a_longer_one_is():
+    assert not is_available('chicken', ['chicken stock'])
+
+
+def test_ingredient_is_not_available_because_a_shorter_one_is():
+    assert not is_available('chicken stock', ['chicken'])
+    assert not is_available('black pepper', ['pepper'])
+
+
+def test_plural_and_singular_names_match():
+    assert is_available('onion', ['Onions'])
+    assert is_available('tomatoes', ['tomato'])
+    assert is_available('chicken stock', ['chicken stock'])
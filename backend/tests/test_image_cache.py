@@ -0,0 +1,64 @@
+import base64
+import io
+from unittest import mock
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.image_cache import ImageAnalysisCache, decode_image
+from src.openai import analyse_picture
+
+
+def test_data_url_prefix_is_ignored():
+    raw = base64.b64encode(b'fridge').decode()
+    assert decode_image(raw) == decode_image(f'data:image/jpeg;base64,{raw}') == b'fridge'
+
+
+def test_exact_duplicate_hits_and_eviction_is_bounded():
+    cache = ImageAnalysisCache(maxsize=2, max_distance=0)
+    for name in ('a', 'b', 'c'):
+        _, keys = cache.lookup(base64.b64encode(name.encode()).decode())
+        cache.store(keys, {'foods': [name]})
+
+    result, _ = cache.lookup(base64.b64encode(b'c').decode())
+    evicted, _ = cache.lookup(base64.b64encode(b'a').decode())
+    assert result == {'foods': ['c']}
+    assert evicted is None
+    stats = cache.stats()
+    assert stats['exact_hits'] == 1
+    assert stats['evictions'] == 1
+
+
+def test_near_duplicate_photo_matches():
+    Image = pytest.importorskip('PIL.Image')
+
+    def photo(quality):
+        img = Image.new('RGB', (64, 64))
+        for x in range(64):
+            for y in range(64):
+                img.putpixel((x, y), (x * 4, y * 4, 128))
+        out = io.BytesIO()
+        img.save(out, format='JPEG', quality=quality)
+        return base64.b64encode(out.getvalue()).decode()
+
+    cache = ImageAnalysisCache()
+    _, keys = cache.lookup(photo(95))
+    cache.store(keys, {'foods': ['egg']})
+
+    result, _ = cache.lookup(photo(60))
+    assert result == {'foods': ['egg']}
+    assert cache.stats()['near_hits'] == 1
+
+
+def test_repeat_upload_skips_model_call():
+    fake_client = mock.Mock()
+    fake_client.beta.chat.completions.parse.return_value = mock.Mock(
+        choices=[mock.Mock(message=mock.Mock(content='{"foods": [{"name": "milk"}]}'))])
+    image = 'data:image/jpeg;base64,' + base64.b64encode(b'same photo').decode()
+
+    with mock.patch('src.openai_client.get_client', return_value=fake_client):
+        first = analyse_picture(image)
+        second = analyse_picture(image)
+
+    assert first == second == {'foods': [{'name': 'milk'}]}
+    fake_client.beta.chat.completions.parse.assert_called_once()
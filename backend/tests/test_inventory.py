@@ -0,0 +1,64 @@
+from unittest import mock
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.inventory as inventory
+from src.inventory import DAY
+from src.user_context import UserContext
+
+NOW = 1_700_000_000
+
+
+def fake_table(existing=()):
+    table = mock.MagicMock()
+    table.query.return_value = {'Items': list(existing)}
+    return table, table.batch_writer.return_value.__enter__.return_value
+
+
+def test_scan_is_stored_with_absolute_expiry_and_normalized_names():
+    table, batch = fake_table()
+    with mock.patch('src.inventory.get_table', return_value=table):
+        written = inventory.merge_scan('bob', {'foods': [
+            {'name': 'Tomatoes', 'estimated_expiry': '3 days'},
+            {'name': 'tomato', 'estimated_expiry': '2 days'},
+            {'name': 'Milk', 'estimated_expiry': 'a while'},
+        ]}, now=NOW)
+
+    items = {call.kwargs['Item']['item_name']: call.kwargs['Item'] for call in batch.put_item.call_args_list}
+    assert written == 2
+    assert items['tomato']['expires_at'] == NOW + 2 * DAY
+    assert items['milk']['expires_at'] == NOW + inventory.UNKNOWN_EXPIRY_DAYS * DAY
+    assert items['milk']['ttl'] > items['milk']['expires_at']
+
+
+def test_rescan_merges_instead_of_clobbering():
+    old_expiry = NOW + DAY
+    table, batch = fake_table([{'item_name': 'tomato', 'expires_at': old_expiry, 'first_seen_at': NOW - DAY}])
+    with mock.patch('src.inventory.get_table', return_value=table):
+        inventory.merge_scan('bob', {'foods': [{'name': 'Tomato', 'estimated_expiry': '5 days'}]}, now=NOW)
+
+    item = batch.put_item.call_args.kwargs['Item']
+    # same tomatoes seen again, the earlier estimate still stands
+    assert item['expires_at'] == old_expiry
+    assert item['first_seen_at'] == NOW - DAY
+    batch.delete_item.assert_not_called()
+
+
+def test_soonest_queries_expiry_index():
+    table, _ = fake_table([{'display_name': 'Milk', 'expires_at': NOW + 2 * DAY + 60}])
+    with mock.patch('src.inventory.get_table', return_value=table):
+        items = inventory.soonest('bob', limit=10, now=NOW)
+
+    assert items == [{'name': 'Milk', 'estimated_expiry': '2 days', 'expires_at': NOW + 2 * DAY + 60}]
+    kwargs = table.query.call_args.kwargs
+    assert kwargs['IndexName'] == inventory.EXPIRY_INDEX
+    assert kwargs['Limit'] == 10
+    assert kwargs['ScanIndexForward'] is True
+
+
+def test_context_prefers_inventory_over_legacy_blob():
+    legacy = {'ingredients': {'foods': [{'name': 'Old', 'estimated_expiry': '3 days'}]}}
+
+    assert UserContext('bob', legacy).ingredients == legacy['ingredients']
+    assert UserContext('bob', legacy, inventory_items=[{'name': 'Milk'}]).ingredients == {'foods': [{'name': 'Milk'}]}
+    assert UserContext('bob').ingredients == []
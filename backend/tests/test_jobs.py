@@ -0,0 +1,142 @@
+from unittest import mock
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.jobs as jobs
+from app import app
+
+
+class InlineQueue(jobs.JobQueue):
+    #runs the job straight away so tests do not race a worker thread
+    def enqueue(self, job_id):
+        jobs.run_job(job_id)
+
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    jobs.set_backend(jobs.MemoryJobStore(), InlineQueue())
+    yield app.test_client()
+    jobs.set_backend(None, None)
+
+
+@pytest.fixture
+def session():
+    table = mock.Mock(get_item=mock.Mock(return_value={'Item': {'userId': 'bob'}}))
+    with mock.patch('src.session_cache.get_sessions_table', return_value=table):
+        yield 's1'
+
+
+def test_analyse_picture_async_returns_job_id(client, session):
+    with mock.patch('src.openai.analyse_picture', return_value={'foods': [{'name': 'egg'}]}), \
+            mock.patch('src.openai.store_ingredients_in_db') as store:
+        response = client.post('/analyse-picture', json={'image': 'img', 'sessionId': session, 'async': True})
+
+        assert response.status_code == 202
+        job_id = response.get_json()['job_id']
+
+        status = client.get(f'/jobs/{job_id}?sessionId={session}')
+
+    assert status.status_code == 200
+    body = status.get_json()
+    assert body['status'] == jobs.SUCCEEDED
+    assert body['result'] == {'analysis': {'foods': [{'name': 'egg'}]}}
+    store.assert_called_once_with('bob', {'foods': [{'name': 'egg'}]})
+
+
+def test_failed_job_reports_error(client, session):
+    with mock.patch('src.openai.analyse_picture', return_value={'error': 'model down'}):
+        response = client.post('/analyse-picture?async=1', json={'image': 'img', 'sessionId': session})
+        job_id = response.get_json()['job_id']
+        body = client.get(f'/jobs/{job_id}?sessionId={session}').get_json()
+
+    assert body['status'] == jobs.FAILED
+    assert body['status_code'] == 500
+    assert body['result'] == {'error': 'model down'}
+
+
+def test_jobs_are_private_to_their_user(client, session):
+    job = jobs.submit('analyse-picture', 'alice', {'image': 'img', 'user_id': 'alice'})
+    response = client.get(f"/jobs/{job['job_id']}?sessionId={session}")
+    assert response.status_code == 404
+
+
+def test_sqlite_store_round_trip(tmp_path):
+    store = jobs.SQLiteJobStore(str(tmp_path / 'jobs.db'))
+    store.create({'job_id': 'j1', 'status': jobs.QUEUED, 'payload': {'a': 1}})
+    store.update('j1', status=jobs.SUCCEEDED, result={'ok': True})
+
+    job = store.get('j1')
+    assert job['status'] == jobs.SUCCEEDED
+    assert job['result'] == {'ok': True}
+    assert store.get('missing') is None
+
+
+def test_lambda_job_event_runs_job():
+    store = jobs.MemoryJobStore()
+    jobs.set_backend(store, InlineQueue())
+    store.create({'job_id': 'j2', 'kind': 'analyse-picture', 'status': jobs.QUEUED,
+                  'payload': {'image': 'img', 'user_id': 'bob'}})
+    try:
+        with mock.patch('src.openai.analyse_picture', return_value={'foods': []}), \
+                mock.patch('src.openai.store_ingredients_in_db'):
+            from app import lambda_handler
+            lambda_handler({jobs.JOB_EVENT_KEY: 'j2'}, None)
+    finally:
+        jobs.set_backend(None, None)
+
+    assert store.get('j2')['status'] == jobs.SUCCEEDED
+
+
+def test_incomplete_backend_fails_at_construction():
+    class NoGet(jobs.JobStore):
+        def create(self, job):
+            pass
+
+        def update(self, job_id, **fields):
+            pass
+
+    with pytest.raises(TypeError):
+        NoGet()
+    with pytest.raises(TypeError):
+        jobs.JobQueue()
+
+
+def test_failed_recipe_job_reports_error(client, session):
+    context = mock.Mock(ingredients={'foods': [{'name': 'egg'}]})
+    with mock.patch('src.openai.user_context.get_user_context', return_value=context), \
+            mock.patch('src.openai.generate_recipe', return_value={'error': 'model down'}):
+        response = client.post('/generate-recipe', json={'preferences': ['quick'], 'sessionId': session})
+        assert response.status_code == 500
+        assert response.get_json() == {'error': 'model down'}
+
+        response = client.post('/generate-recipe?async=1', json={'preferences': ['quick'], 'sessionId': session})
+        body = client.get(f"/jobs/{response.get_json()['job_id']}?sessionId={session}").get_json()
+
+    assert body['status'] == jobs.FAILED
+    assert body['status_code'] == 500
+
+
+def test_oversized_job_without_payload_bucket_is_rejected(client, session):
+    jobs.set_backend(jobs.DynamoDBJobStore(payload_bucket=None), InlineQueue())
+    image = 'a' * (jobs.MAX_INLINE_PAYLOAD + 1)
+
+    response = client.post('/analyse-picture?async=1', json={'image': image, 'sessionId': session})
+
+    assert response.status_code == 413
+    assert 'too large' in response.get_json()['error']
+
+
+def test_recipe_job_payload_carries_no_session_id(client, session):
+    store = jobs.MemoryJobStore()
+    jobs.set_backend(store, InlineQueue())
+    context = mock.Mock(ingredients={'foods': [{'name': 'egg'}]})
+    with mock.patch('src.openai.user_context.get_user_context', return_value=context), \
+            mock.patch('src.openai.generate_recipe', return_value={'recipe': {}}) as generate:
+        response = client.post('/generate-recipe?async=1', json={'preferences': ['quick'], 'sessionId': session})
+
+    job = store.get(response.get_json()['job_id'])
+    assert 'session_id' not in job['payload'] and session not in str(job['payload'])
+    #the worker loads the user's context, Fitbit token included, from the user id
+    generate.assert_called_once_with(['quick'], 'bob', None, True, False, None)
@@ -0,0 +1,37 @@
+import json
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.json_stream import JSONArrayStreamParser
+
+
+MENU = {
+    "recipes": [
+        {"day_of_the_week": "Monday", "title": "Curry {spicy}", "ingredients": ["rice", "\"chili\""]},
+        {"day_of_the_week": "Tuesday", "title": "Soup ]", "ingredients": []},
+    ],
+    "grocery_list": [{"name": "rice", "quantity": "1kg", "category": "Grains"}],
+}
+
+
+def test_recipes_emitted_as_soon_as_they_close():
+    text = json.dumps(MENU)
+    parser = JSONArrayStreamParser('recipes')
+    emitted = []
+    first_seen_at = None
+
+    for i in range(0, len(text), 7):
+        found = parser.feed(text[i:i + 7])
+        if found and first_seen_at is None:
+            first_seen_at = i
+        emitted.extend(found)
+
+    assert emitted == MENU["recipes"]
+    assert first_seen_at < text.index('"Tuesday"')
+    assert parser.document() == MENU
+
+
+def test_objects_in_other_arrays_are_ignored():
+    parser = JSONArrayStreamParser('recipes')
+    text = json.dumps({"grocery_list": [{"name": "egg"}], "recipes": [{"title": "Omelette"}]})
+    assert parser.feed(text) == [{"title": "Omelette"}]
@@ -0,0 +1,74 @@
+import json
+from types import SimpleNamespace
+from unittest import mock
+import src.lifecycle as lifecycle
+import src.aws_clients as aws_clients
+import src.openai_client as openai_client
+import src.session_cache as session_cache
+import src.fitbit as fitbit
+
+
+def test_warmup_events_skip_the_flask_dispatch(monkeypatch):
+    from app import lambda_handler
+    monkeypatch.setitem(lifecycle._stats, 'initialized', False)
+
+    with mock.patch('awsgi.response') as response:
+        #only the first ping pays for the init
+        for cold, event in ((True, {'warmup': True}), (False, {'source': 'serverless-plugin-warmup'}),
+                            (False, {'source': 'aws.events', 'detail-type': 'Scheduled Event', 'detail': {}})):
+            rv = lambda_handler(event, SimpleNamespace(aws_request_id='w1'))
+            assert rv['warmed'] is True and rv['cold'] is cold
+    response.assert_not_called()
+    assert not lifecycle.is_warmup_event({'httpMethod': 'GET', 'path': '/'})
+    assert not lifecycle.is_warmup_event({'source': 'aws.events', 'detail-type': 'Object Created'})
+
+
+def test_init_builds_clients_and_routing():
+    from app import app
+    aws_clients.reset()
+    lifecycle.initialize(app)
+
+    stats = lifecycle.stats()
+    assert stats['initialized'] and stats['init_ms'] is not None
+    assert set(stats['init_stages_ms']) >= {'routing', 'json', 'aws_clients', 'caches'}
+    assert ('secretsmanager', openai_client.SECRET_REGION) in aws_clients._clients
+
+
+def test_after_restore_drops_connections_and_secrets():
+    aws_clients.get_client('secretsmanager', openai_client.SECRET_REGION)
+    before = aws_clients.get_client('secretsmanager', openai_client.SECRET_REGION)
+    old_session = fitbit.client.session
+    session_cache.remember_session('s1', 'bob', 4102444800)
+
+    with mock.patch.object(openai_client.provider, 'invalidate') as invalidate:
+        lifecycle.after_restore()
+
+    assert aws_clients.get_client('secretsmanager', openai_client.SECRET_REGION) is not before
+    assert fitbit.client.session is not old_session
+    invalidate.assert_called_once_with()
+    assert session_cache._cache.get('s1') is None
+
+
+def test_snapshot_hooks_register_when_the_runtime_supports_them(monkeypatch):
+    registered = {}
+    runtime = SimpleNamespace(register_before_snapshot=lambda fn: registered.setdefault('before', fn),
+                              register_after_restore=lambda fn: registered.setdefault('after', fn))
+    monkeypatch.setattr(lifecycle, 'snapshot_restore_py', runtime)
+    monkeypatch.setitem(lifecycle._stats, 'snapshot_hooks', False)
+
+    assert lifecycle.register_snapshot_hooks()
+    assert registered == {'before': lifecycle.before_snapshot, 'after': lifecycle.after_restore}
+    monkeypatch.setattr(lifecycle, 'snapshot_restore_py', None)
+    assert not lifecycle.register_snapshot_hooks()
+
+
+def test_streaming_handler_routes_warmup_events_like_the_plain_one():
+    import awsgi
+    from app import lambda_stream_handler
+    out = awsgi.MemoryResponseStream()
+
+    with mock.patch('awsgi.stream') as stream:
+        lambda_stream_handler({'warmup': True}, out, SimpleNamespace(aws_request_id='w2'))
+    stream.assert_not_called()
+    assert json.loads(out.getvalue())['warmed'] is True
+    assert out.closed
@@ -0,0 +1,59 @@
+import json
+import src.tables as tables
+import src.openai_client as openai_client
+from loadtest import harness
+from loadtest.events import build_events, gateway_event, load_events, route_of, ROUTE_WEIGHTS
+from loadtest.fakes import credentials
+
+
+def test_events_cover_every_route():
+    events = build_events(credentials(3), 200, seed=1, image_kb=4)
+
+    assert {route_of(event) for event in events} == set(ROUTE_WEIGHTS)
+    picture = next(e for e in events if e['path'] == '/analyse-picture')
+    assert len(json.loads(picture['body'])['image']) > 4 * 1024
+    assert [e['body'] for e in build_events(credentials(3), 200, seed=1, image_kb=4)] == [e['body'] for e in events]
+    v2 = build_events(credentials(3), 200, seed=1, image_kb=4, payload_format='2.0')
+    assert [route_of(e) for e in v2] == [route_of(e) for e in events]
+
+
+def test_load_events_reads_json_lines(tmp_path):
+    event = gateway_event('GET', '/feedback', query={'sessionId': 's1'})
+    path = tmp_path / 'events.jsonl'
+    path.write_text(json.dumps(event) + '\n' + json.dumps(event) + '\n')
+
+    assert [route_of(e) for e in load_events(str(path))] == ['GET /feedback', 'GET /feedback']
+
+
+def test_in_process_run_reports_every_route():
+    provider = openai_client.provider
+
+    report = harness.run(requests=60, users=3, scale=0, seed=2, image_kb=4)
+
+    assert report['errors'] == 0
+    assert report['requests'] == 60
+    assert set(report['routes']) == set(ROUTE_WEIGHTS)
+    generate = report['routes']['POST /generate-recipe']
+    assert generate['p50_ms'] <= generate['p95_ms'] <= generate['p99_ms']
+    assert report['calls']['openai']['vision'] == report['routes']['POST /analyse-picture']['count']
+    # the fakes are gone again afterwards
+    assert tables.backend() == 'dynamodb'
+    assert openai_client.provider is provider
+
+
+def test_compare_flags_slower_routes_only():
+    route = {'count': 200, 'errors': 0, 'p50_ms': 10.0, 'p95_ms': 20.0, 'p99_ms': 30.0}
+    baseline = {'routes': {'POST /login': route, 'GET /feedback': route}, 'cold': {'import_ms': 500.0},
+                'throughput_rps': 100, 'peak_rss_mb': 100, 'latency_scale': 0}
+    current = json.loads(json.dumps(baseline))
+    current['routes']['POST /login']['p95_ms'] = 30.0
+    current['routes']['GET /feedback']['p99_ms'] = 31.0
+
+    assert harness.compare(current, baseline, tolerance=0.2) == ['POST /login p95_ms: 20.0 -> 30.0 (+50%)']
+    assert harness.compare(baseline, baseline) == []
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert [harness.percentile(values, p) for p in (50, 95, 99)] == [50, 95, 99]
+    assert harness.percentile([7.0], 99) == 7.0
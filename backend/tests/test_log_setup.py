@@ -0,0 +1,97 @@
+import io
+import json
+import logging
+import pytest
+import src.log_setup as log_setup
+import src.request_timing as request_timing
+
+
+@pytest.fixture
+def output():
+    stream = io.StringIO()
+    yield stream
+    log_setup.configure()
+
+
+def records(stream):
+    log_setup.stop()
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_records_are_json_and_truncated(output):
+    log_setup.configure(stream=output)
+    timing = request_timing.start('req-7')
+    try:
+        logging.info('x' * (log_setup.LOG_MAX_MESSAGE_CHARS + 50))
+    finally:
+        request_timing.stop()
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        logging.exception('failed')
+
+    long, failed = records(output)
+    assert long['level'] == 'INFO'
+    assert long['request_id'] == 'req-7'
+    assert long['message'].endswith('... [50 more chars]')
+    assert failed['message'] == 'failed'
+    assert 'ValueError: boom' in failed['exception']
+    assert timing.request_id == 'req-7'
+
+
+def test_debug_is_sampled_and_library_levels_apply(output):
+    log_setup.configure(level='DEBUG', levels='botocore=WARNING', stream=output, sample_rate=0)
+    logging.debug('dropped by sampling')
+    logging.getLogger('botocore.endpoint').info('dropped by level')
+    logging.getLogger('botocore.endpoint').warning('kept')
+    logging.info('kept too')
+
+    assert [r['message'] for r in records(output)] == ['kept', 'kept too']
+
+
+def test_basic_config_handlers_are_replaced(output):
+    root = logging.getLogger()
+    stray = logging.StreamHandler(io.StringIO())
+    root.addHandler(stray)
+
+    log_setup.configure(stream=output)
+
+    assert stray not in root.handlers
+    assert sum(isinstance(h, log_setup.TruncatingQueueHandler) for h in root.handlers) == 1
+
+
+def test_parse_levels():
+    assert log_setup.parse_levels('botocore=warning, urllib3=ERROR,bad') == {'botocore': 30, 'urllib3': 40}
+
+
+def test_app_modules_have_their_own_levels(output):
+    import src.openai as openai_module
+    log_setup.configure(levels='src.openai=ERROR', stream=output)
+    try:
+        openai_module.logger.warning('dropped by level')
+        openai_module.logger.error('kept')
+    finally:
+        logging.getLogger('src.openai').setLevel(logging.NOTSET)
+
+    assert [r['logger'] for r in records(output)] == ['src.openai']
+
+
+def test_flush_returns_at_once_when_nothing_is_queued(output):
+    import time
+    log_setup.configure(stream=output)
+    start = time.perf_counter()
+    log_setup.flush(timeout=1)
+    assert time.perf_counter() - start < 0.1
+
+    logging.warning('written before flush returns')
+    log_setup.flush(timeout=1)
+    assert 'written before flush returns' in output.getvalue()
+
+
+def test_flush_waits_no_longer_than_the_invocation_has_left():
+    from types import SimpleNamespace
+    context = SimpleNamespace(get_remaining_time_in_millis=lambda: 700)
+    assert log_setup.flush_timeout(context, timeout=2, margin=0.2) == pytest.approx(0.5)
+    assert log_setup.flush_timeout(context, timeout=0.1, margin=0.2) == 0.1
+    assert log_setup.flush_timeout(SimpleNamespace(get_remaining_time_in_millis=lambda: 100), margin=0.2) == 0
+    assert log_setup.flush_timeout(None, timeout=2) == 2
@@ -0,0 +1,83 @@
+from decimal import Decimal
+from unittest import mock
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.meal_plan_cache as meal_plan_cache
+from src.meal_plan_cache import TieredCache, MemoryBackend, FileBackend
+from src.user_context import UserContext
+from app import app
+
+
+def test_key_ignores_ordering_and_decimal_types():
+    a = meal_plan_cache.cache_key(form={'diet': 'vegan', 'number_of_people': Decimal('2')}, preferences=' pizza ')
+    b = meal_plan_cache.cache_key(preferences='pizza', form={'number_of_people': 2, 'diet': 'vegan'})
+    c = meal_plan_cache.cache_key(preferences='pizza', form={'number_of_people': 3, 'diet': 'vegan'})
+    assert a == b
+    assert a != c
+
+
+def test_file_tier_backfills_memory(tmp_path):
+    memory = MemoryBackend()
+    files = FileBackend(str(tmp_path))
+    cache = TieredCache([memory, files])
+
+    files.set('k', {'recipes': []}, ttl=60)
+    assert cache.get('k') == {'recipes': []}
+    assert memory.get('k') == {'recipes': []}
+    assert cache.stats()['tier_hits'] == [0, 1]
+
+
+def test_file_tier_prunes_oldest(tmp_path):
+    files = FileBackend(str(tmp_path), max_files=2)
+    for key in ('a', 'b', 'c'):
+        files.set(key, {'k': key}, ttl=60)
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_broken_tier_is_skipped():
+    broken = mock.Mock()
+    broken.get.side_effect = Exception('dynamodb down')
+    cache = TieredCache([MemoryBackend(), broken])
+    assert cache.get('k') is None
+    assert cache.stats()['errors'] == 1
+
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+def post_generate(client, fake_client, **extra):
+    context = UserContext('1', {'ingredients': {"foods": [{"name": "Tomato", "estimated_expiry": "2 days"}]}}, {'diet': 'vegan'})
+    with mock.patch('src.openai_client.get_client', return_value=fake_client), \
+            mock.patch('src.session_cache.get_sessions_table', return_value=mock.Mock(get_item=mock.Mock(return_value={'Item': {'userId': '1'}}))), \
+            mock.patch('src.openai.user_context.get_user_context', return_value=context):
+        return client.post('/generate-recipe', json={'preferences': 'vegan', 'sessionId': 's1', **extra})
+
+
+def test_repeat_generation_served_from_cache(client):
+    fake_client = mock.Mock()
+    fake_client.beta.chat.completions.parse.return_value = mock.Mock(
+        choices=[mock.Mock(message=mock.Mock(content='{"recipes": [], "grocery_list": []}'))])
+
+    first = post_generate(client, fake_client)
+    second = post_generate(client, fake_client)
+    assert fake_client.beta.chat.completions.parse.call_count == 1
+    assert second.get_json()['recipe']['cached'] is True
+    assert second.get_json()['recipe']['recipe'] == first.get_json()['recipe']['recipe']
+
+    post_generate(client, fake_client, regenerate=True)
+    post_generate(client, fake_client, cache=False)
+    assert fake_client.beta.chat.completions.parse.call_count == 3
+
+
+def test_incomplete_cache_backend_fails_at_construction():
+    class GetOnly(meal_plan_cache.CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnly()
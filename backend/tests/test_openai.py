@@ -5,7 +5,9 @@ from botocore.exceptions import ClientError
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from src.openai import analyse_picture, get_secret
+from src.openai import analyse_picture
+from src.openai_client import get_secret
+from src.user_context import UserContext
 from app import app
 
 
@@ -43,12 +45,14 @@ def test_get_secret_client_error():
 
 def test_generate_recipe_working(client):
     #tests correct menu gen with valid preferences
-    with mock.patch('src.openai.client.beta.chat.completions.parse') as mock_generate_content, \
-            mock.patch('src.openai.sessions_table.get_item', return_value={'Item': {'userId': '1'}}), \
-            mock.patch('src.openai.get_stored_ingredients', return_value={"foods": [{"name": "Tomato", "estimated_expiry": "2 days"}]}), \
-            mock.patch('src.openai.user_preferences_bp.retrieve_user_pref', return_value={'diet': 'vegan'}):
-
-
+    with mock.patch('src.openai_client.get_client') as mock_get_client, \
+            mock.patch('src.session_cache.get_sessions_table', return_value=mock.Mock(get_item=mock.Mock(return_value={'Item': {'userId': '1'}}))), \
+            mock.patch('src.openai.user_context.get_user_context', return_value=UserContext(
+                '1',
+                {'ingredients': {"foods": [{"name": "Tomato", "estimated_expiry": "2 days"}]}},
+                {'diet': 'vegan'})):
+
+        mock_generate_content = mock_get_client.return_value.beta.chat.completions.parse
         mock_generate_content.return_value = mock.Mock(
             choices=[
                 mock.Mock(message=mock.Mock(content='{"recipes": "vegan recipe", "grocery_list": []}'))]
@@ -84,10 +88,11 @@ def test_no_preferences(client):
 
 def test_server_error(client):
     #500 error, server error i.e. open ai crashing
-    with mock.patch('src.openai.sessions_table.get_item', return_value={'Item': {'userId': '5'}}), \
-            mock.patch('src.openai.get_stored_ingredients',
-                       return_value={"foods": [{"name": "Tomato", "estimated_expiry": "5 days"}]}), \
-            mock.patch('src.openai.user_preferences_bp.retrieve_user_pref', return_value={'diet': 'vegan'}), \
+    with mock.patch('src.session_cache.get_sessions_table', return_value=mock.Mock(get_item=mock.Mock(return_value={'Item': {'userId': '5'}}))), \
+            mock.patch('src.openai.user_context.get_user_context', return_value=UserContext(
+                '5',
+                {'ingredients': {"foods": [{"name": "Tomato", "estimated_expiry": "5 days"}]}},
+                {'diet': 'vegan'})), \
             mock.patch('src.openai.generate_recipe', side_effect=Exception("Test server error")):
 
         response = client.post('/generate-recipe', json={'preferences': 'test', 'sessionId': 's1' })
@@ -107,7 +112,9 @@ def test_analyse_image():
             "foods": [{"name":"orange"}]
         })))
     ]
-    with mock.patch("src.openai.client.beta.chat.completions.parse", return_value=mock_response):
+    fake_client = mock.Mock()
+    fake_client.beta.chat.completions.parse.return_value = mock_response
+    with mock.patch("src.openai_client.get_client", return_value=fake_client):
         result = analyse_picture(image)
         assert "foods" in result
         assert result["foods"][0]["name"] == "orange"
@@ -136,8 +143,10 @@ def test_no_session_id(client):
 
 def test_image_analyse_serve_failure(client):
     # 500 error
-    with (mock.patch('src.openai.sessions_table.get_item', return_value={'Item': {'userId': '5'}}), \
-            mock.patch('src.openai.client.beta.chat.completions.parse', side_effect=Exception("Test image anaylse error"))):
+    fake_client = mock.Mock()
+    fake_client.beta.chat.completions.parse.side_effect = Exception("Test image anaylse error")
+    with (mock.patch('src.session_cache.get_sessions_table', return_value=mock.Mock(get_item=mock.Mock(return_value={'Item': {'userId': '5'}}))), \
+            mock.patch('src.openai_client.get_client', return_value=fake_client)):
 
         response = client.post('/analyse-picture', json={
             'image': 'image', 'sessionId': 's1'
@@ -161,3 +170,34 @@ def test_image_analyse_serve_failure(client):
 
 
 
+
+def test_generate_recipe_streams_ndjson(client):
+    menu = json.dumps({"recipes": [{"title": "Soup"}, {"title": "Stew"}], "grocery_list": [{"name": "leek"}]})
+    chunks = [mock.Mock(choices=[mock.Mock(delta=mock.Mock(content=menu[i:i + 10]))]) for i in range(0, len(menu), 10)]
+    fake_client = mock.Mock()
+    fake_client.chat.completions.create.return_value = iter(chunks)
+
+    with mock.patch('src.openai_client.get_client', return_value=fake_client), \
+            mock.patch('src.session_cache.get_sessions_table', return_value=mock.Mock(get_item=mock.Mock(return_value={'Item': {'userId': '1'}}))), \
+            mock.patch('src.openai.user_context.get_user_context', return_value=UserContext(
+                '1',
+                {'ingredients': {"foods": [{"name": "Leek", "estimated_expiry": "2 days"}]}},
+                {'diet': 'vegan'})):
+        response = client.post('/generate-recipe', json={'preferences': 'vegan', 'sessionId': 's1', 'stream': True})
+        events = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.mimetype == 'application/x-ndjson'
+    assert [e['type'] for e in events] == ['recipe', 'recipe', 'grocery_list', 'done']
+    assert events[1]['recipe'] == {"title": "Stew"}
+    assert events[2]['grocery_list'] == [{"name": "leek"}]
+    assert fake_client.chat.completions.create.call_args.kwargs['stream'] is True
+
+
+def test_list_feedback_dynamodb_error_is_json(client):
+    error = ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException', 'Message': 'slow down'}}, 'Query')
+    with mock.patch('src.openai.session_cache.resolve_user_id', return_value='bob'), \
+            mock.patch('src.openai.feedback_store.list_feedback', side_effect=error):
+        response = client.get('/feedback?sessionId=s1')
+
+    assert response.status_code == 500
+    assert response.json == {'error': 'Could not retrieve feedback'}
@@ -0,0 +1,58 @@
+from unittest import mock
+import httpx
+import pytest
+from openai import AuthenticationError
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.openai_client as openai_client
+from src.openai_client import OpenAIClientProvider
+
+
+def auth_error():
+    response = httpx.Response(401, request=httpx.Request('POST', 'https://api.openai.com'))
+    return AuthenticationError('bad key', response=response, body=None)
+
+
+def test_secret_fetched_once_on_first_use():
+    fetch = mock.Mock(return_value='key-1')
+    factory = mock.Mock()
+    provider = OpenAIClientProvider(fetch_secret=fetch, client_factory=factory)
+
+    fetch.assert_not_called()  # nothing happens at construction/import time
+    first = provider.get_client()
+    second = provider.get_client()
+
+    assert first is second
+    fetch.assert_called_once()
+    factory.assert_called_once_with(api_key='key-1')
+    assert provider.stats()['cold_start_fetch_ms'] is not None
+
+
+def test_stale_secret_refreshes_in_background():
+    fetch = mock.Mock(side_effect=['key-1', 'key-2'])
+    provider = OpenAIClientProvider(fetch_secret=fetch, client_factory=mock.Mock(), refresh_after=0, max_age=3600)
+    provider.get_client()
+
+    with mock.patch('src.openai_client.threading.Thread') as thread:
+        provider.get_client()
+
+    thread.assert_called_once()
+    thread.return_value.start.assert_called_once()
+
+
+def test_missing_key_raises():
+    provider = OpenAIClientProvider(fetch_secret=mock.Mock(return_value=None), client_factory=mock.Mock())
+    with pytest.raises(RuntimeError):
+        provider.get_client()
+
+
+def test_call_retries_once_after_auth_failure():
+    clients = [mock.Mock(), mock.Mock()]
+    fn = mock.Mock(side_effect=[auth_error(), 'ok'])
+
+    with mock.patch('src.openai_client.get_client', side_effect=clients) as get_client:
+        assert openai_client.call(fn) == 'ok'
+
+    assert get_client.call_args_list[1] == mock.call(force_refresh=True)
+    fn.assert_called_with(clients[1])
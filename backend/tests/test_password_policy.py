@@ -0,0 +1,89 @@
+import json
+from unittest import mock
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from werkzeug.security import generate_password_hash
+from botocore.exceptions import ClientError
+from src.password_policy import PasswordPolicy, calibrate, environment_key, parse_method, save_calibration
+from app import app
+
+
+def test_calibrate_picks_largest_n_within_budget():
+    # 1ms per 1024 N
+    timer = lambda n: n / 1024
+    assert calibrate(target_ms=40, min_n=2 ** 12, max_n=2 ** 17, timer=timer)['method'] == 'scrypt:32768:8:1'
+
+
+def test_calibrate_never_goes_below_the_floor():
+    assert calibrate(target_ms=1, timer=lambda n: 500)['method'] == 'scrypt:32768:8:1'
+
+
+def test_recorded_calibration_is_shared_through_ssm():
+    ssm = mock.Mock()
+    ssm.get_parameter.side_effect = ClientError({'Error': {'Code': 'ParameterNotFound', 'Message': ''}}, 'GetParameter')
+    with mock.patch('src.password_policy.aws_clients.get_client', return_value=ssm):
+        save_calibration({'method': 'scrypt:65536:8:1', 'benchmark_ms': 20, 'target_ms': 100})
+        stored = ssm.put_parameter.call_args.kwargs
+        assert json.loads(stored['Value'])[environment_key()]['method'] == 'scrypt:65536:8:1'
+
+        ssm.get_parameter.side_effect = None
+        ssm.get_parameter.return_value = {'Parameter': {'Value': stored['Value']}}
+        policy = PasswordPolicy()
+        assert policy.method == 'scrypt:65536:8:1'
+        assert policy.stats()['source'] == 'recorded'
+
+
+def test_without_a_calibration_werkzeugs_default_is_used_and_nothing_is_benchmarked():
+    with mock.patch('src.password_policy.calibrate') as calibrate_:
+        assert PasswordPolicy(loader=lambda: None).method == 'scrypt:32768:8:1'
+        # a recorded cost below the floor is ignored
+        assert PasswordPolicy(loader=lambda: {'method': 'scrypt:16384:8:1'}).method == 'scrypt:32768:8:1'
+    calibrate_.assert_not_called()
+
+
+def test_lower_floor_is_an_explicit_opt_in_to_cheaper_hashes():
+    stronger = generate_password_hash('secret', method='scrypt:32768:8:1')
+
+    assert not PasswordPolicy(method='scrypt:16384:8:1').needs_rehash(stronger)
+    cheaper = PasswordPolicy(loader=lambda: {'method': 'scrypt:16384:8:1'}, min_n=2 ** 14)
+    assert cheaper.method == 'scrypt:16384:8:1'
+    valid, new_hash = cheaper.verify_and_upgrade(stronger, 'secret')
+    assert valid and parse_method(new_hash) == ('scrypt', 16384, 8, 1)
+
+
+def test_old_hash_is_upgraded_after_successful_verify():
+    policy = PasswordPolicy(method='scrypt:65536:8:1')
+    old_hash = generate_password_hash('secret', method='scrypt:32768:8:1')
+
+    assert policy.verify_and_upgrade(old_hash, 'wrong') == (False, None)
+    valid, new_hash = policy.verify_and_upgrade(old_hash, 'secret')
+    assert valid
+    assert parse_method(new_hash) == ('scrypt', 65536, 8, 1)
+    assert policy.verify_and_upgrade(new_hash, 'secret') == (True, None)
+
+
+def test_stronger_hash_is_never_downgraded():
+    policy = PasswordPolicy(method='scrypt:32768:8:1')
+    stronger = generate_password_hash('secret', method='scrypt:65536:8:1')
+
+    assert not policy.needs_rehash(stronger)
+    assert policy.verify_and_upgrade(stronger, 'secret') == (True, None)
+    assert policy.needs_rehash(generate_password_hash('secret', method='pbkdf2:sha256'))
+
+
+@mock.patch('app.password_policy', PasswordPolicy(method='scrypt:32768:8:1'))
+@mock.patch('app.session_cache.get_sessions_table')
+@mock.patch('app.get_users_table')
+def test_login_rehashes_stored_password(mock_users_table, mock_sessions_table):
+    old_hash = generate_password_hash('secret', method='pbkdf2:sha256')
+    mock_users_table.return_value.get_item.return_value = {
+        'Item': {'username': 'alice', 'password': old_hash, 'id': 'alice'}}
+
+    response = app.test_client().post('/login', json={'username': 'alice', 'password': 'secret'})
+
+    assert response.status_code == 200
+    update = mock_users_table.return_value.update_item.call_args.kwargs
+    assert update['ExpressionAttributeValues'][':old'] == old_hash
+    assert update['ExpressionAttributeValues'][':new'].startswith('scrypt:32768:8:1$')
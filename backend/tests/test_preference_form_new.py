@@ -24,9 +24,9 @@ def test_add_user_preferences(mocker):
 
     user_pref_table = MagicMock()
 
-    mocker.patch('src.user_preferences_bp.sessions_table', table)
+    mocker.patch('src.session_cache.get_sessions_table', return_value=table)
 
-    mocker.patch('src.user_preferences_bp.dynamodb.Table', return_value=user_pref_table)
+    mocker.patch('src.user_preferences_bp.get_table', return_value=user_pref_table)
 
     client = create_client()
 
@@ -63,7 +63,7 @@ def test_invalid_input_num(mocker):
 
     table = MagicMock()
     table.get_item.return_value = {'Item': {'userId': '11'}}
-    mocker.patch('src.user_preferences_bp.sessions_table', table)
+    mocker.patch('src.session_cache.get_sessions_table', return_value=table)
     client = create_client()
 
     data = {
@@ -85,12 +85,12 @@ def test_add_user_preferences_server_issue(mocker):
     #500 type error
     table = MagicMock()
     table.get_item.return_value = {'Item': {'userId': '11'}}
-    mocker.patch('src.user_preferences_bp.sessions_table', table)
+    mocker.patch('src.session_cache.get_sessions_table', return_value=table)
 
 
     user_pref_table = MagicMock()
     user_pref_table.put_item.side_effect = Exception("DynamoDB error")
-    mocker.patch('src.user_preferences_bp.dynamodb.Table', return_value=user_pref_table)
+    mocker.patch('src.user_preferences_bp.get_table', return_value=user_pref_table)
 
     client = create_client()
 
@@ -123,9 +123,9 @@ def test_invalid_input(mocker):
 
     user_pref_table = MagicMock()
 
-    mocker.patch('src.user_preferences_bp.sessions_table', table)
+    mocker.patch('src.session_cache.get_sessions_table', return_value=table)
 
-    mocker.patch('src.user_preferences_bp.dynamodb.Table', return_value=user_pref_table)
+    mocker.patch('src.user_preferences_bp.get_table', return_value=user_pref_table)
 
     client = create_client()
 
@@ -0,0 +1,55 @@
+from decimal import Decimal
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.prompt_budget import budget_inputs, compact_form, dedupe_preferences, estimate_tokens, expiry_days
+
+
+def test_form_drops_irrelevant_fields_and_decimals():
+    form = {'user_id': 'bob', 'fitbit_access_token': 'https://secret', 'diet': 'vegan',
+            'number_of_people': Decimal('2'), 'cuisines': ' '}
+
+    assert compact_form(form) == 'diet: vegan; number of people: 2'
+
+
+def test_swipes_are_deduplicated_last_swipe_wins():
+    meals = dedupe_preferences([
+        {'title': 'Pad Thai', 'description': 'Noodles', 'ingredients': ['rice noodles'], 'preference': 'like'},
+        {'title': 'Pad Thai', 'description': 'Noodles', 'swipe': 'swiped right'},
+        {'title': 'Ramen', 'swipe': 'swiped left'},
+        {'title': 'pad thai ', 'swipe': 'swiped left'},
+    ])
+
+    assert meals == [
+        {'title': 'Ramen', 'description': '', 'swipe': 'disliked'},
+        {'title': 'Pad Thai', 'description': 'Noodles', 'swipe': 'disliked'},
+    ]
+
+
+def test_expiry_days():
+    assert expiry_days('2 days') == 2
+    assert expiry_days('1 week') == 7
+    assert expiry_days('3-5 days') == 3
+    assert expiry_days('Today') == 0
+    assert expiry_days('unknown') is None
+
+
+def test_over_budget_trims_feedback_first_and_keeps_soonest_ingredients():
+    foods = [{'name': f'item{i}', 'estimated_expiry': f'{i + 1} days'} for i in range(40)]
+    profile = {'likes': [f'Liked meal {i}' for i in range(20)], 'notes': ['Soup: made it for my mum'] * 5,
+               'complaints': {'too spicy': 3}}
+    swipes = [{'title': f'Meal {i}', 'description': 'A long description of the meal ' * 3, 'preference': 'like'}
+              for i in range(30)]
+
+    full = budget_inputs(swipes, {'diet': 'vegan'}, {'foods': foods}, profile, budget=100000)
+    small = budget_inputs(swipes, {'diet': 'vegan'}, {'foods': list(reversed(foods))}, profile, budget=300)
+
+    assert full.trimmed == []
+    assert small.total_tokens < full.total_tokens
+    assert small.trimmed[0] == 'feedback'
+    assert small['ingredients'].startswith('item0 (expires in 1 days), item1')
+    assert small['form'] == 'diet: vegan'
+
+
+def test_estimate_tokens_is_roughly_chars_over_four():
+    assert 2 <= estimate_tokens('twelve chars') <= 4
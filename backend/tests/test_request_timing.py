@@ -0,0 +1,113 @@
+import json
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import src.tables as tables
+import src.aws_clients as aws_clients
+import src.openai_client as openai_client
+import src.request_timing as request_timing
+from loadtest.events import gateway_event
+
+
+def test_lambda_handler_adds_server_timing_and_emf(capsys, monkeypatch):
+    from app import lambda_handler
+    monkeypatch.setattr(request_timing, 'SERVER_TIMING_HEADER', True)
+    tables.set_backend('memory')
+    try:
+        tables.get_table('UserSessions', 'eu-west-1').put_item(
+            Item={'sessionId': 's1', 'userId': 'bob', 'ttl': 4102444800})
+        response = lambda_handler(gateway_event('POST', '/submit-feedback', {
+            'sessionId': 's1', 'recipeTitle': 'Chili', 'feedback': 'too spicy'}),
+            SimpleNamespace(aws_request_id='req-1'))
+    finally:
+        tables.set_backend('dynamodb')
+
+    header = response['headers']['Server-Timing']
+    for stage in ('json_parse', 'json_serialize', 'app', 'awsgi', 'total'):
+        assert f'{stage};dur=' in header
+    # table names and counts stay out of what clients see, the EMF line has them
+    assert 'dynamodb.' not in header and 'desc=' not in header
+    # application logs share stdout, the metrics line is the one with an _aws key
+    record = next(json.loads(line) for line in capsys.readouterr().out.splitlines() if '"_aws"' in line)
+    assert record['Route'] == 'POST /submit-feedback'
+    assert record['RequestId'] == 'req-1'
+    assert record['StatusCode'] == 200
+    assert record['_aws']['CloudWatchMetrics'][0]['Dimensions'] == [['Route']]
+    assert {'Name': 'total', 'Unit': 'Milliseconds'} in record['_aws']['CloudWatchMetrics'][0]['Metrics']
+    assert request_timing.current() is None
+
+
+def test_dynamodb_calls_are_timed_by_table_and_region():
+    client = aws_clients.get_client('dynamodb', 'eu-west-1')
+    http_response = mock.Mock(status_code=200, headers={}, content=b'{}')
+    http_response.raw = mock.Mock()
+    timing = request_timing.start()
+    try:
+        with mock.patch.object(client._endpoint, 'make_request', return_value=(http_response, {})):
+            client.get_item(TableName='Users', Key={'username': {'S': 'bob'}})
+            client.batch_get_item(RequestItems={'Users': {'Keys': [{'username': {'S': 'bob'}}]},
+                                                'RecipeFeedback': {'Keys': [{'user_id': {'S': 'bob'}, 'sk': {'S': 'PROFILE'}}]}})
+    finally:
+        request_timing.stop()
+
+    assert timing.counts['dynamodb_calls'] == 2
+    assert set(timing.tables) == {'Users:eu-west-1', 'RecipeFeedback+Users:eu-west-1'}
+    assert 'dynamodb.RecipeFeedback+Users;dur=' in timing.finish().server_timing(detail=True)
+
+
+def test_openai_calls_record_tokens():
+    completion = SimpleNamespace(usage=SimpleNamespace(prompt_tokens=800, completion_tokens=1200))
+    provider = openai_client.provider
+    openai_client.provider = openai_client.OpenAIClientProvider(fetch_secret=lambda: 'key',
+                                                                client_factory=lambda api_key: object())
+    timing = request_timing.start()
+    try:
+        openai_client.call(lambda client: completion)
+    finally:
+        request_timing.stop()
+        openai_client.provider = provider
+
+    assert 'openai' in timing.stages
+    assert timing.counts == {'openai_prompt_tokens': 800, 'openai_completion_tokens': 1200}
+    assert 'desc="800 prompt + 1200 completion tokens"' in timing.server_timing(detail=True)
+
+
+def test_bind_carries_the_timing_into_executor_threads():
+    timing = request_timing.start()
+    try:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(request_timing.bind(request_timing.record), 'fitbit', 5.0) for _ in range(2)]
+            [f.result() for f in futures]
+            executor.submit(request_timing.record, 'fitbit', 5.0).result()
+    finally:
+        request_timing.stop()
+
+    assert timing.stages == {'fitbit': 10.0}
+
+
+def test_nothing_is_recorded_outside_a_request():
+    with request_timing.measure('openai'):
+        pass
+    request_timing.record('dynamodb', 1.0, table='Users')
+    assert request_timing.current() is None
+
+
+def test_compression_is_recorded_as_its_own_stage():
+    import awsgi
+    timing = request_timing.start('req-2')
+    try:
+        sr = awsgi.StartResponse(compression=awsgi.Compression(on_compress=request_timing.record_compression),
+                                 accept_encoding='gzip')
+        sr('200 OK', [('Content-Type', 'text/plain')])
+        response = sr.response([b'meal plan ' * 1000])
+    finally:
+        request_timing.stop()
+    timing.finish()
+
+    assert response['headers']['Content-Encoding'] == 'gzip'
+    assert 'compress' in timing.stages
+    assert timing.counts['response_bytes'] == 10000
+    assert timing.counts['compressed_bytes'] < 1000
+    record = timing.emf()
+    assert record['content_encoding'] == 'gzip' and record['compression_ratio'] > 10
+    assert {'Name': 'compressed_bytes', 'Unit': 'Bytes'} in record['_aws']['CloudWatchMetrics'][0]['Metrics']
@@ -0,0 +1,67 @@
+import time
+from unittest import mock
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.session_cache as session_cache
+
+
+def test_resolve_caches_session():
+    table = mock.Mock()
+    table.get_item.return_value = {'Item': {'userId': 'bob', 'ttl': int(time.time()) + 600}}
+
+    with mock.patch('src.session_cache.get_sessions_table', return_value=table):
+        assert session_cache.resolve_user_id('s1') == 'bob'
+        assert session_cache.resolve_user_id('s1') == 'bob'
+
+    table.get_item.assert_called_once_with(Key={'sessionId': 's1'})
+    stats = session_cache.stats()
+    assert stats['hits'] == 1
+    assert stats['dynamodb_reads'] == 1
+
+
+def test_unknown_session_is_negatively_cached():
+    table = mock.Mock()
+    table.get_item.return_value = {}
+
+    with mock.patch('src.session_cache.get_sessions_table', return_value=table):
+        assert session_cache.resolve_user_id('nope') is None
+        assert session_cache.resolve_user_id('nope') is None
+
+    table.get_item.assert_called_once()
+    assert session_cache.stats()['negative_hits'] == 1
+
+
+def test_expired_ttl_attribute_is_rejected():
+    #dynamodb has not deleted the item yet but its ttl has passed
+    table = mock.Mock()
+    table.get_item.return_value = {'Item': {'userId': 'bob', 'ttl': int(time.time()) - 5}}
+
+    with mock.patch('src.session_cache.get_sessions_table', return_value=table):
+        assert session_cache.resolve_user_id('old') is None
+
+    assert session_cache.stats()['expired_rejections'] == 1
+
+
+def test_invalidate_forces_reload():
+    table = mock.Mock()
+    table.get_item.return_value = {'Item': {'userId': 'bob'}}
+
+    with mock.patch('src.session_cache.get_sessions_table', return_value=table):
+        session_cache.remember_session('s2', 'bob', int(time.time()) + 600)
+        assert session_cache.resolve_user_id('s2') == 'bob'
+        table.get_item.assert_not_called()
+
+        session_cache.invalidate('s2')
+        table.get_item.return_value = {}
+        assert session_cache.resolve_user_id('s2') is None
+
+
+def test_stats_count_every_lookup_across_threads():
+    from concurrent.futures import ThreadPoolExecutor
+    session_cache.remember_session('s1', 'bob')
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert set(pool.map(lambda _: session_cache.resolve_user_id('s1'), range(2000))) == {'bob'}
+
+    assert session_cache.stats()['lookups'] == 2000
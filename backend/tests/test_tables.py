@@ -0,0 +1,119 @@
+from decimal import Decimal
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+import src.tables as tables
+from src.tables import LocalResource, SQLiteStorage
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def resource(request, tmp_path):
+    path = ':memory:' if request.param == 'memory' else str(tmp_path / 'tables.db')
+    return LocalResource(SQLiteStorage(path))
+
+
+def test_put_get_and_conditions(resource):
+    table = resource.Table('Users')
+    table.put_item(Item={'username': 'bob', 'id': 'bob', 'age': 30})
+
+    assert table.get_item(Key={'username': 'bob'})['Item'] == {'username': 'bob', 'id': 'bob', 'age': Decimal(30)}
+    assert table.get_item(Key={'username': 'ghost'}) == {}
+    with pytest.raises(ClientError) as e:
+        table.put_item(Item={'username': 'bob'}, ConditionExpression='attribute_not_exists(username)')
+    assert e.value.response['Error']['Code'] == 'ConditionalCheckFailedException'
+    with pytest.raises(TypeError):
+        table.put_item(Item={'username': 'amy', 'score': 1.5})
+
+
+def test_update_expressions(resource):
+    table = resource.Table('Users')
+    table.update_item(
+        Key={'username': 'bob'},
+        UpdateExpression="SET feedbacks = list_append(if_not_exists(feedbacks, :empty), :new), #n = :name ADD logins :one",
+        ExpressionAttributeNames={'#n': 'name'},
+        ExpressionAttributeValues={':empty': [], ':new': [{'feedback': 'liked'}], ':name': 'Bob', ':one': 1},
+    )
+    result = table.update_item(
+        Key={'username': 'bob'},
+        UpdateExpression="SET feedbacks = list_append(feedbacks, :new) ADD logins :one REMOVE #n",
+        ConditionExpression="logins = :one",
+        ExpressionAttributeNames={'#n': 'name'},
+        ExpressionAttributeValues={':new': [{'feedback': 'too spicy'}], ':one': 1},
+        ReturnValues='ALL_NEW',
+    )
+
+    assert result['Attributes'] == {
+        'username': 'bob',
+        'feedbacks': [{'feedback': 'liked'}, {'feedback': 'too spicy'}],
+        'logins': Decimal(2),
+    }
+
+
+def test_query_index_order_and_paging(resource):
+    table = resource.Table('UserInventory')
+    for name, expires_at in (('milk', 300), ('eggs', 100), ('kale', 200)):
+        table.put_item(Item={'user_id': 'bob', 'item_name': name, 'expires_at': expires_at})
+    table.put_item(Item={'user_id': 'bob', 'item_name': 'salt'})
+    table.put_item(Item={'user_id': 'amy', 'item_name': 'rice', 'expires_at': 50})
+
+    first = table.query(IndexName='expires_at-index', Limit=2,
+                        KeyConditionExpression=Key('user_id').eq('bob') & Key('expires_at').gte(0))
+    second = table.query(IndexName='expires_at-index', Limit=2, ExclusiveStartKey=first['LastEvaluatedKey'],
+                         KeyConditionExpression=Key('user_id').eq('bob') & Key('expires_at').gte(0))
+
+    assert [i['item_name'] for i in first['Items']] == ['eggs', 'kale']
+    assert [i['item_name'] for i in second['Items']] == ['milk']
+    assert 'LastEvaluatedKey' not in second
+    newest = table.query(KeyConditionExpression=Key('user_id').eq('bob') & Key('item_name').begins_with('m'),
+                         ScanIndexForward=False)
+    assert [i['item_name'] for i in newest['Items']] == ['milk']
+
+
+def test_scan_segments_cover_table_once(resource):
+    table = resource.Table('Users')
+    with table.batch_writer() as batch:
+        for i in range(20):
+            batch.put_item(Item={'username': f'user{i}', 'password': 'hash'})
+
+    seen = []
+    for segment in range(3):
+        scan = {'Segment': segment, 'TotalSegments': 3, 'Limit': 4, 'ProjectionExpression': 'username'}
+        while True:
+            page = table.scan(**scan)
+            seen += [item['username'] for item in page['Items']]
+            assert all('password' not in item for item in page['Items'])
+            if 'LastEvaluatedKey' not in page:
+                break
+            scan['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+    assert sorted(seen) == sorted(f'user{i}' for i in range(20))
+
+
+def test_batch_get_item_projects(resource):
+    resource.Table('Users').put_item(Item={'username': 'bob', 'password': 'hash', 'ingredients': {'foods': []}})
+
+    response = resource.batch_get_item(RequestItems={'Users': {
+        'Keys': [{'username': 'bob'}, {'username': 'ghost'}],
+        'ProjectionExpression': '#i', 'ExpressionAttributeNames': {'#i': 'ingredients'}}})
+
+    assert response['Responses'] == {'Users': [{'ingredients': {'foods': []}}]}
+
+
+def test_app_runs_against_memory_backend():
+    from app import app
+    tables.set_backend('memory')
+    try:
+        tables.get_table('UserSessions', 'eu-west-1').put_item(
+            Item={'sessionId': 's1', 'userId': 'bob', 'ttl': 4102444800})
+        client = app.test_client()
+
+        response = client.post('/submit-feedback', json={'sessionId': 's1', 'recipeTitle': 'Chili', 'feedback': 'too spicy'})
+        listing = client.get('/feedback?sessionId=s1')
+    finally:
+        tables.set_backend('dynamodb')
+
+    assert response.status_code == 200
+    assert listing.json['feedback'][0]['recipeTitle'] == 'Chili'
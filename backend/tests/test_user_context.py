@@ -0,0 +1,67 @@
+from unittest import mock
+from flask import Flask
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.user_context as user_context
+
+
+def fake_resource(table_name, item):
+    resource = mock.Mock()
+    resource.batch_get_item.return_value = {'Responses': {table_name: [item] if item else []}}
+    return resource
+
+
+def test_load_user_context_one_batch_per_region():
+    users = fake_resource('Users', {'ingredients': {'foods': []}, 'feedbacks': [{'feedback': 'liked'}]})
+    prefs = fake_resource('user_preferences', {'user_id': 'bob', 'diet': 'vegan', 'fitbit_access_token': 'url'})
+
+    regions = {'eu-west-1': users, 'eu-north-1': prefs}
+    with mock.patch('src.user_context.tables.get_resource', side_effect=lambda region: regions[region]), \
+            mock.patch('src.user_context.inventory.soonest', return_value=[]):
+        context = user_context.load_user_context('bob')
+
+    users.batch_get_item.assert_called_once()
+    prefs.batch_get_item.assert_called_once()
+    assert context.ingredients == {'foods': []}
+    assert context.feedback == [{'feedback': 'liked'}]
+    assert context.preferences_form['diet'] == 'vegan'
+    assert context.fitbit_access_token == 'url'
+
+
+def test_missing_items_use_old_defaults():
+    regions = {'eu-west-1': fake_resource('Users', None), 'eu-north-1': fake_resource('user_preferences', None)}
+    with mock.patch('src.user_context.tables.get_resource', side_effect=lambda region: regions[region]), \
+            mock.patch('src.user_context.inventory.soonest', return_value=[]):
+        context = user_context.load_user_context('ghost')
+
+    assert context.ingredients == []
+    assert context.feedback == []
+    assert context.preferences_form == []
+    assert context.fitbit_access_token == ""
+
+
+def test_unprocessed_keys_are_retried():
+    resource = mock.Mock()
+    keys = {'Users': {'Keys': [{'username': 'bob'}]}}
+    resource.batch_get_item.side_effect = [
+        {'Responses': {}, 'UnprocessedKeys': keys},
+        {'Responses': {'Users': [{'username': 'bob'}]}},
+    ]
+
+    with mock.patch('src.user_context.time.sleep'):
+        results = user_context.batch_get(resource, keys)
+
+    assert results == {'Users': [{'username': 'bob'}]}
+    assert resource.batch_get_item.call_count == 2
+
+
+def test_context_is_reused_within_a_request():
+    app = Flask(__name__)
+    with app.test_request_context(), \
+            mock.patch('src.user_context.load_user_context', return_value=user_context.UserContext('bob')) as load:
+        first = user_context.get_user_context('bob')
+        second = user_context.get_user_context('bob')
+
+    assert first is second
+    load.assert_called_once_with('bob')
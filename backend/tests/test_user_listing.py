@@ -0,0 +1,67 @@
+import json
+from unittest import mock
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.user_listing as user_listing
+from src.pagination import encode_cursor
+from app import app
+
+
+def test_page_is_projected_and_returns_cursor():
+    table = mock.Mock()
+    table.scan.return_value = {'Items': [{'username': 'bob', 'id': 'bob'}], 'LastEvaluatedKey': {'username': 'bob'}}
+
+    with mock.patch('app.get_users_table', return_value=table):
+        response = app.test_client().get('/users?limit=1')
+
+    assert response.status_code == 200
+    assert response.json == {'users': [{'username': 'bob', 'id': 'bob'}], 'cursor': encode_cursor({'username': 'bob'})}
+    kwargs = table.scan.call_args.kwargs
+    assert 'password' not in kwargs['ExpressionAttributeNames'].values()
+    assert kwargs['Limit'] == 1
+
+    with mock.patch('app.get_users_table', return_value=table):
+        app.test_client().get(f"/users?cursor={response.json['cursor']}")
+    assert table.scan.call_args.kwargs['ExclusiveStartKey'] == {'username': 'bob'}
+
+
+def test_bad_cursor_is_rejected():
+    with mock.patch('app.get_users_table'):
+        assert app.test_client().get('/users?cursor=not-a-cursor').status_code == 400
+
+
+def test_export_scans_every_segment_and_pages():
+    pages = {
+        (0, None): {'Items': [{'username': 'a', 'password': 'hash'}], 'LastEvaluatedKey': {'username': 'a'}},
+        (0, 'a'): {'Items': [{'username': 'b'}]},
+        (1, None): {'Items': [{'username': 'c'}]},
+    }
+    table = mock.Mock()
+    table.scan.side_effect = lambda **kw: pages[(kw['Segment'], kw.get('ExclusiveStartKey', {}).get('username'))]
+
+    lines = list(user_listing.export_lines(table, segments=2))
+
+    assert sorted(json.loads(line)['username'] for line in lines) == ['a', 'b', 'c']
+    assert all('password' not in json.loads(line) for line in lines)
+
+
+def test_export_needs_admin_token():
+    with mock.patch('src.user_listing.ADMIN_EXPORT_TOKEN', 'secret'), mock.patch('app.get_users_table') as get_table:
+        get_table.return_value.scan.return_value = {'Items': [{'username': 'a'}]}
+        assert app.test_client().get('/users/export', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+        response = app.test_client().get('/users/export?segments=1', headers={'X-Admin-Token': 'secret'})
+
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.get_data(as_text=True) == '{"username": "a"}\n'
+
+
+def test_stats_needs_admin_token():
+    with mock.patch('src.user_listing.ADMIN_EXPORT_TOKEN', 'secret'):
+        assert app.test_client().get('/stats').status_code == 403
+        assert app.test_client().get('/stats', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+        response = app.test_client().get('/stats', headers={'X-Admin-Token': 'secret'})
+    assert response.status_code == 200
+    assert 'password_policy' in response.json
+    with mock.patch('src.user_listing.ADMIN_EXPORT_TOKEN', None):
+        assert app.test_client().get('/stats', headers={'X-Admin-Token': ''}).status_code == 403
@@ -1,8 +1,15 @@
-from base64 import b64encode, b64decode
-from io import BytesIO
-import itertools
+from base64 import b64encode
+from binascii import a2b_base64
 import collections
+import itertools
+import json
 import sys
+import time
+import zlib
+try:
+    import brotli
+except ImportError:
+    brotli = None
 try:
     # Python 3
     from urllib.parse import urlencode
@@ -28,26 +35,172 @@ except ImportError:
         return b.encode('utf-8', errors='strict') if (
             isinstance(b, (str, unicode))) else b
 
-__all__ = 'response',
+__all__ = 'response', 'stream', 'Compression', 'MemoryResponseStream'
+
+# Lambda response streaming: the HTTP integration content type, and the
+# delimiter between the JSON prelude (status, headers) and the body
+STREAMING_CONTENT_TYPE = 'application/vnd.awslambda.http-integration-response'
+PRELUDE_DELIMITER = b'\x00' * 8
 
 
 def convert_b46(s):
     return b64encode(s).decode('ascii')
 
 
+# CPU time of this thread only, so work on other threads is not counted
+_cpu_time = getattr(time, 'thread_time', time.time)
+
+
+def accepted_encodings(header):
+    '''
+    {coding: q} from an Accept-Encoding header, e.g.
+    'gzip, br;q=0.8' -> {'gzip': 1.0, 'br': 0.8}
+    '''
+    accepted = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+class Compression(object):
+    '''
+    Opt-in response compression, negotiated from the request's
+    Accept-Encoding. Only bodies of at least `min_size` bytes with an
+    allowed Content-Type are compressed, and never ones the app already
+    encoded. Compressed bodies are returned base64 encoded; HTTP APIs,
+    Function URLs and ALBs decode them, REST APIs need a binary media type
+    that covers the content type (e.g. */*).
+    '''
+    CONTENT_TYPES = frozenset([
+        'application/json', 'application/x-ndjson', 'application/javascript',
+        'application/xml', 'image/svg+xml', 'text/css', 'text/csv',
+        'text/event-stream', 'text/html', 'text/javascript', 'text/plain',
+        'text/xml',
+    ])
+
+    def __init__(self, min_size=1024, content_types=None, level=6,
+                 brotli_quality=5, on_compress=None):
+        '''
+        Args:
+            min_size (int): Smallest body, in bytes, worth compressing.
+            content_types (set): Content-Types that may be compressed,
+            defaults to CONTENT_TYPES.
+            level (int): zlib level for gzip and deflate.
+            brotli_quality (int): Quality for br, used when the brotli
+            package is installed.
+            on_compress (callable): Called with the stats of every
+            compressed response: encoding, original and compressed
+            bytes, ratio and CPU milliseconds.
+        '''
+        self.min_size = min_size
+        self.content_types = frozenset(content_types or self.CONTENT_TYPES)
+        self.level = level
+        self.brotli_quality = brotli_quality
+        self.on_compress = on_compress
+
+    def encodings(self):
+        # in order of preference when the client accepts several equally
+        return (('br',) if brotli is not None else ()) + ('gzip', 'deflate')
+
+    def choose(self, accept_encoding):
+        accepted = accepted_encodings(accept_encoding)
+        best, best_q = None, 0.0
+        for coding in self.encodings():
+            q = accepted.get(coding, accepted.get('*', 0.0))
+            if q > best_q:
+                best, best_q = coding, q
+        return best
+
+    def compress(self, body, coding):
+        if coding == 'br':
+            return brotli.compress(bytes(body), quality=self.brotli_quality)
+        # wbits 31 is the gzip container, 15 the zlib one HTTP calls deflate
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31 if coding == 'gzip' else 15)
+        return compressor.compress(body) + compressor.flush()
+
+
+class BodyInput(object):
+    '''
+    wsgi.input over a request body that is already fully in memory.
+
+    Reads are served from a memoryview, so slicing does not copy the rest of
+    the body, and reading everything from the start hands back the body
+    object itself. Because the body is complete, environ marks the input as
+    terminated and Werkzeug reads it directly instead of through a
+    LimitedStream, which would build the body up again chunk by chunk.
+    '''
+    def __init__(self, body):
+        self._body = body
+        self._view = memoryview(body)
+        self._pos = 0
+
+    def __len__(self):
+        return len(self._body)
+
+    def read(self, size=-1):
+        start = self._pos
+        end = len(self._body) if size is None or size < 0 else min(start + size, len(self._body))
+        self._pos = end
+        if start == 0 and end == len(self._body) and isinstance(self._body, bytes):
+            return self._body
+        return self._view[start:end].tobytes()
+
+    def readinto(self, buffer):
+        data = self._view[self._pos:self._pos + len(buffer)]
+        n = len(data)
+        memoryview(buffer)[:n] = data
+        self._pos += n
+        return n
+
+    def readline(self, size=-1):
+        end = self._body.find(b'\n', self._pos)
+        end = len(self._body) if end < 0 else end + 1
+        if size is not None and size >= 0:
+            end = min(end, self._pos + size)
+        return self.read(end - self._pos)
+
+    def readlines(self, hint=-1):
+        return list(iter(self.readline, b''))
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def close(self):
+        self._view.release()
+
+
 class StartResponse(object):
-    def __init__(self, base64_content_types=None):
+    def __init__(self, base64_content_types=None, compression=None,
+                 accept_encoding=None):
         '''
         Args:
             base64_content_types (set): Set of HTTP Content-Types which should
             return a base64 encoded body. Enables returning binary content from
             API Gateway.
+            compression (Compression): Compress bodies the client accepts
+            compressed. Off when None.
+            accept_encoding (str): The request's Accept-Encoding header.
         '''
         self.status = 500
         self.status_line = '500 Internal Server Error'
         self.headers = []
         self.chunks = collections.deque()
         self.base64_content_types = set(base64_content_types or []) or set()
+        self.compression = compression
+        self.accept_encoding = accept_encoding
+        self.compression_stats = None
 
     def __call__(self, status, headers, exc_info=None):
         self.status_line = status
@@ -62,17 +215,93 @@ class StartResponse(object):
             content_type = content_type.split(';')[0]
         return content_type in self.base64_content_types
 
+    def collect(self, output):
+        '''
+        The whole response body. A single chunk (the usual Flask response)
+        is used as is; several are joined into one buffer sized from their
+        total length. The WSGI iterable is closed and the chunks released
+        as soon as the body exists.
+        '''
+        try:
+            chunks = list(self.chunks)
+            chunks.extend(output)
+        finally:
+            if hasattr(output, 'close'):
+                output.close()
+        self.chunks.clear()
+
+        if len(chunks) == 1 and isinstance(chunks[0], bytes):
+            return chunks[0]
+        body = bytearray(sum(len(chunk) for chunk in chunks))
+        view = memoryview(body)
+        pos = 0
+        for chunk in chunks:
+            view[pos:pos + len(chunk)] = chunk
+            pos += len(chunk)
+        view.release()
+        return body
+
+    def compress(self, headers, body):
+        '''
+        The body compressed for the client, or None when it is left as is.
+        Content-Encoding, Content-Length and Vary in `headers` are updated
+        to match.
+        '''
+        compression = self.compression
+        if compression is None or len(body) < compression.min_size:
+            return None
+        if self.status in (204, 206, 304) or header_key(headers, 'Content-Encoding'):
+            return None
+        content_type = (headers.get('Content-Type') or '').split(';')[0].strip().lower()
+        if content_type not in compression.content_types:
+            return None
+
+        # the response depends on Accept-Encoding even when it is not compressed
+        vary = header_key(headers, 'Vary')
+        if vary is None:
+            headers['Vary'] = 'Accept-Encoding'
+        elif 'accept-encoding' not in headers[vary].lower():
+            headers[vary] = headers[vary] + ', Accept-Encoding'
+
+        coding = compression.choose(self.accept_encoding)
+        if coding is None:
+            return None
+        started = _cpu_time()
+        compressed = compression.compress(body, coding)
+        cpu_ms = (_cpu_time() - started) * 1000
+        if len(compressed) >= len(body):
+            return None
+
+        headers['Content-Encoding'] = coding
+        length = header_key(headers, 'Content-Length')
+        if length is not None:
+            headers[length] = str(len(compressed))
+        self.compression_stats = {
+            'encoding': coding,
+            'content_type': content_type,
+            'original_bytes': len(body),
+            'compressed_bytes': len(compressed),
+            'ratio': round(float(len(body)) / len(compressed), 2),
+            'cpu_ms': round(cpu_ms, 3),
+        }
+        if compression.on_compress is not None:
+            compression.on_compress(self.compression_stats)
+        return compressed
+
     def build_body(self, headers, output):
-        totalbody = b''.join(itertools.chain(
-            self.chunks, output,
-        ))
+        totalbody = self.collect(output)
+
+        compressed = self.compress(headers, totalbody)
+        if compressed is not None:
+            totalbody = compressed
 
-        is_b64 = self.use_binary_response(headers, totalbody)
+        is_b64 = compressed is not None or self.use_binary_response(headers, totalbody)
 
         if is_b64:
             converted_output = convert_b46(totalbody)
         else:
-            converted_output = convert_str(totalbody)
+            converted_output = totalbody.decode('utf-8')
+        del totalbody
 
         return {
             'isBase64Encoded': is_b64,
@@ -99,23 +328,129 @@ class StartResponse_GW(StartResponse):
         return rv
 
 
+class StartResponse_HTTPv2(StartResponse):
+    '''
+    Responses for API Gateway HTTP APIs (payload format 2.0) and Lambda
+    Function URLs. Set-Cookie headers go in the separate `cookies` list,
+    other repeated headers are comma-joined.
+    '''
+    def metadata(self):
+        '''
+        Status code, headers and cookies; also the prelude of a streamed
+        response.
+        '''
+        headers = {}
+        cookies = []
+        for key, value in self.headers:
+            if key.lower() == 'set-cookie':
+                cookies.append(value)
+            elif key in headers:
+                headers[key] = headers[key] + ',' + value
+            else:
+                headers[key] = value
+
+        rv = {
+            'statusCode': int(self.status),
+            'headers': headers,
+        }
+        if cookies:
+            rv['cookies'] = cookies
+        return rv
+
+    def response(self, output):
+        rv = self.metadata()
+        rv.update(self.build_body(rv['headers'], output))
+        return rv
+
+
 class StartResponse_ELB(StartResponse):
+    '''
+    Responses for Application Load Balancers. A target group with
+    multi-value headers enabled sends multiValueHeaders in the event and
+    expects them in the response too, otherwise the ALB answers 502.
+    '''
+    multi_value_headers = False
+
     def response(self, output):
         rv = super(StartResponse_ELB, self).response(output)
 
         rv['statusCode'] = int(rv['statusCode'])
         rv['statusDescription'] = self.status_line
 
+        if self.multi_value_headers:
+            headers = dict((k, [v]) for k, v in rv.pop('headers').items())
+            repeated = {}
+            for key, value in self.headers:
+                repeated.setdefault(key, []).append(value)
+            # keep every value of repeated headers (Set-Cookie) unless build_body replaced it
+            for key, values in repeated.items():
+                if len(values) > 1 and headers.get(key) == [values[-1]]:
+                    headers[key] = values
+            rv['multiValueHeaders'] = headers
+
         return rv
 
 
-def environ(event, context):
+def header_key(headers, name):
+    '''
+    The key `name` is stored under in `headers`, matched case-insensitively.
+    '''
+    name = name.lower()
+    for key in headers:
+        if key.lower() == name:
+            return key
+    return None
+
+
+def event_body(event):
     body = event.get('body', '') or ''
 
     if event.get('isBase64Encoded', False):
-        body = b64decode(body)
+        # a2b_base64 reads an ASCII str in place, b64decode would encode a copy first
+        body = a2b_base64(body)
     # FIXME: Flag the encoding in the headers
-    body = convert_byte(body)
+    return convert_byte(body)
+
+
+def event_headers(event):
+    '''
+    Request headers as one str per name; repeated headers from
+    multiValueHeaders are comma-joined as HTTP allows.
+    '''
+    headers = dict(event.get('headers') or {})
+    for k, values in (event.get('multiValueHeaders') or {}).items():
+        if values:
+            headers[k] = ','.join(values)
+    return headers
+
+
+def add_headers(environ, headers):
+    for k, v in headers.items():
+        k = k.upper().replace('-', '_')
+
+        if k == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = v
+        elif k == 'HOST':
+            environ['SERVER_NAME'] = v
+        elif k == 'X_FORWARDED_FOR':
+            environ['REMOTE_ADDR'] = v.split(', ')[0]
+        elif k == 'X_FORWARDED_PROTO':
+            environ['wsgi.url_scheme'] = v
+        elif k == 'X_FORWARDED_PORT':
+            environ['SERVER_PORT'] = v
+
+        environ['HTTP_' + k] = v
+    return environ
+
+
+def environ(event, context):
+    body = event_body(event)
+
+    multi_query = event.get('multiValueQueryStringParameters')
+    if multi_query:
+        query = urlencode(multi_query, doseq=True)
+    else:
+        query = urlencode(event.get('queryStringParameters') or {})
 
     environ = {
         'REQUEST_METHOD': event['httpMethod'],
@@ -123,13 +458,14 @@ def environ(event, context):
         'SERVER_NAME': '',
         'SERVER_PORT': '',
         'PATH_INFO': event['path'],
-        'QUERY_STRING': urlencode(event['queryStringParameters'] or {}),
+        'QUERY_STRING': query,
         'REMOTE_ADDR': '127.0.0.1',
         'CONTENT_LENGTH': str(len(body)),
         'HTTP': 'on',
         'SERVER_PROTOCOL': 'HTTP/1.1',
         'wsgi.version': (1, 0),
-        'wsgi.input': BytesIO(body),
+        'wsgi.input': BodyInput(body),
+        'wsgi.input_terminated': True,
         'wsgi.errors': sys.stderr,
         'wsgi.multithread': False,
         'wsgi.multiprocess': False,
@@ -137,37 +473,168 @@ def environ(event, context):
         'wsgi.url_scheme': '',
         'awsgi.event': event,
         'awsgi.context': context,
+        'awsgi.event_source': event_source(event),
     }
-    headers = event.get('headers', {}) or {}
-    for k, v in headers.items():
-        k = k.upper().replace('-', '_')
-
-        if k == 'CONTENT_TYPE':
-            environ['CONTENT_TYPE'] = v
-        elif k == 'HOST':
-            environ['SERVER_NAME'] = v
-        elif k == 'X_FORWARDED_FOR':
-            environ['REMOTE_ADDR'] = v.split(', ')[0]
-        elif k == 'X_FORWARDED_PROTO':
-            environ['wsgi.url_scheme'] = v
-        elif k == 'X_FORWARDED_PORT':
-            environ['SERVER_PORT'] = v
+    return add_headers(environ, event_headers(event))
+
+
+def environ_v2(event, context):
+    '''
+    WSGI environ for payload format 2.0, used by HTTP APIs and Function URLs.
+    Headers arrive lowercased with repeated values comma-joined, cookies
+    arrive as a separate list and the query string arrives raw.
+    '''
+    body = event_body(event)
+    request_context = event.get('requestContext') or {}
+    http = request_context.get('http') or {}
+
+    path = http.get('path') or event.get('rawPath') or '/'
+    script_name = ''
+    # a named stage prefixes the path, WSGI wants it in SCRIPT_NAME
+    stage = request_context.get('stage')
+    if stage and stage != '$default' and (path == '/' + stage or path.startswith('/' + stage + '/')):
+        script_name = '/' + stage
+        path = path[len(script_name):] or '/'
 
-        environ['HTTP_' + k] = v
-
-    return environ
+    environ = {
+        'REQUEST_METHOD': http.get('method', 'GET'),
+        'SCRIPT_NAME': script_name,
+        'SERVER_NAME': request_context.get('domainName', ''),
+        'SERVER_PORT': '443',
+        'PATH_INFO': path,
+        'QUERY_STRING': event.get('rawQueryString') or '',
+        'REMOTE_ADDR': http.get('sourceIp', '127.0.0.1'),
+        'CONTENT_LENGTH': str(len(body)),
+        'HTTP': 'on',
+        'SERVER_PROTOCOL': http.get('protocol', 'HTTP/1.1'),
+        'wsgi.version': (1, 0),
+        'wsgi.input': BodyInput(body),
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'wsgi.url_scheme': 'https',
+        'awsgi.event': event,
+        'awsgi.context': context,
+        'awsgi.event_source': event_source(event),
+    }
+    headers = dict(event.get('headers') or {})
+    if event.get('cookies'):
+        headers['cookie'] = '; '.join(event['cookies'])
+    return add_headers(environ, headers)
+
+
+def event_source(event):
+    '''
+    One of 'function-url', 'http-api', 'elb' or 'rest-api'.
+    '''
+    request_context = event.get('requestContext') or {}
+    if event.get('version') == '2.0':
+        if '.lambda-url.' in request_context.get('domainName', ''):
+            return 'function-url'
+        return 'http-api'
+    if 'elb' in request_context:
+        return 'elb'
+    return 'rest-api'
 
 
 def select_impl(event, context):
-    if 'elb' in event.get('requestContext', {}):
+    source = event_source(event)
+    if source in ('http-api', 'function-url'):
+        return environ_v2, StartResponse_HTTPv2
+    elif source == 'elb':
         return environ, StartResponse_ELB
     else:
         return environ, StartResponse_GW
 
 
-def response(app, event, context, base64_content_types=None):
+def response(app, event, context, base64_content_types=None, compression=None):
     environ, StartResponse = select_impl(event, context)
 
-    sr = StartResponse(base64_content_types=base64_content_types)
-    output = app(environ(event, context), sr)
+    wsgi_environ = environ(event, context)
+    sr = StartResponse(base64_content_types=base64_content_types,
+                       compression=compression,
+                       accept_encoding=wsgi_environ.get('HTTP_ACCEPT_ENCODING'))
+    sr.multi_value_headers = 'multiValueHeaders' in event
+    output = app(wsgi_environ, sr)
     return sr.response(output)
+
+
+def stream(app, event, context, response_stream):
+    '''
+    Run the app for a Lambda response streaming invocation. The JSON
+    prelude (status code, headers, cookies) is written first, then each
+    WSGI chunk as the app produces it, so generator responses reach the
+    client incrementally instead of being buffered into one body.
+
+    Args:
+        response_stream: Writable binary stream from the runtime (or a
+            MemoryResponseStream). It is given the HTTP integration content
+            type if it has a `content_type` attribute, flushed after every
+            chunk if it has `flush`, and closed at the end.
+    '''
+    environ, _ = select_impl(event, context)
+
+    # streamed responses always use the HTTP integration prelude, whatever the event source
+    sr = StartResponse_HTTPv2()
+    output = app(environ(event, context), sr)
+    try:
+        chunks = iter(output)
+        # start_response may be deferred until the first chunk is produced
+        first = next(chunks, b'')
+
+        if hasattr(response_stream, 'content_type'):
+            response_stream.content_type = STREAMING_CONTENT_TYPE
+        response_stream.write(convert_byte(json.dumps(sr.metadata())))
+        response_stream.write(PRELUDE_DELIMITER)
+
+        # chunks given to start_response's write() callable come first
+        pending = list(sr.chunks)
+        sr.chunks.clear()
+        written = 0
+        for chunk in itertools.chain(pending, [first], chunks):
+            # an empty write can end the stream on some runtimes
+            if chunk:
+                response_stream.write(chunk)
+                if hasattr(response_stream, 'flush'):
+                    response_stream.flush()
+                written += len(chunk)
+    finally:
+        if hasattr(output, 'close'):
+            output.close()
+        response_stream.close()
+    return written
+
+
+class MemoryResponseStream(object):
+    '''
+    In-memory stand-in for Lambda's response stream, for running stream()
+    locally and in tests. Every write is kept, in order.
+    '''
+    def __init__(self):
+        self.content_type = None
+        self.writes = []
+        self.flushes = 0
+        self.closed = False
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError('write to closed stream')
+        self.writes.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        self.flushes += 1
+
+    def close(self):
+        self.closed = True
+
+    def getvalue(self):
+        return b''.join(self.writes)
+
+    def prelude(self):
+        return json.loads(convert_str(self.getvalue().split(PRELUDE_DELIMITER, 1)[0]))
+
+    def body(self):
+        return self.getvalue().split(PRELUDE_DELIMITER, 1)[1]